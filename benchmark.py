@@ -0,0 +1,678 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DOSSIER_PROJET = os.path.dirname(os.path.abspath(__file__))
+
+VOCABULAIRE = [
+    "contrat", "bail", "commercial", "locataire", "bailleur", "résiliation", "clause", "pénale",
+    "licenciement", "salarié", "employeur", "indemnité", "préavis", "jugement", "appel", "cour",
+    "tribunal", "audience", "conclusions", "assignation", "demandeur", "défendeur", "créance",
+    "société", "cession", "parts", "associés", "garantie", "responsabilité", "préjudice",
+    "dommages", "intérêts", "expertise", "succession", "divorce", "pension", "alimentaire",
+    "propriété", "servitude", "copropriété", "syndic", "facture", "paiement", "délai", "mise",
+    "demeure", "procédure", "pourvoi", "cassation", "arrêt", "motifs", "dispositif", "article",
+    "code", "civil", "travail", "pénal", "commerce", "fiscal", "administratif", "urbanisme"
+]
+
+REQUETES = [
+    "contrat",
+    "bail commercial",
+    "licenciement indemnité préavis",
+    '"mise en demeure"',
+    'avocat:"Maître Martin" contrat',
+    "cassation -divorce",
+    "succession OR donation",
+    "titre:bail specialite:commercial",
+    "Saint-Étienne",
+]
+
+MOTS_PAR_PAGE = 350
+LIGNES_PAR_PAGE_SCANNEE = 60
+REGLAGES_OCR_REFERENCE = {
+    "ocr_dpi_adaptatif": False,
+    "ocr_dpi": 200,
+    "ocr_detection_langue": False,
+    "ocr_langues": "fra+eng",
+    "ocr_oem": 3,
+    "ocr_psm": 3,
+    "ocr_niveaux_gris": False,
+    "ocr_binarisation": False,
+    "ocr_redressement": False,
+    "ocr_recadrage": False,
+}
+EXTENSIONS_PAGINEES = {'.pdf'}
+
+
+def generer_texte(generateur, nombre_mots):
+    mots = [generateur.choice(VOCABULAIRE) for _ in range(nombre_mots)]
+    lignes = []
+    for i in range(0, len(mots), 12):
+        lignes.append(' '.join(mots[i:i + 12]))
+    return lignes
+
+
+def echapper_pdf(texte):
+    return texte.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def ecrire_pdf_texte(chemin, pages):
+    objets = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    references_pages = []
+
+    for lignes in pages:
+        flux = ["BT /F1 10 Tf 50 800 Td 12 TL"]
+        for ligne in lignes[:64]:
+            flux.append(f"({echapper_pdf(ligne)}) '")
+        flux.append("ET")
+        contenu = '\n'.join(flux).encode('cp1252', errors='replace')
+        objets.append(b"<< /Length " + str(len(contenu)).encode() + b" >>\nstream\n" + contenu + b"\nendstream")
+        numero_contenu = len(objets)
+        objets.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents "
+            + str(numero_contenu).encode() + b" 0 R >>"
+        )
+        references_pages.append(f"{len(objets)} 0 R")
+
+    objets[1] = f"<< /Type /Pages /Kids [{' '.join(references_pages)}] /Count {len(references_pages)} >>".encode()
+
+    sortie = bytearray(b"%PDF-1.4\n")
+    positions = []
+    for numero, objet in enumerate(objets, start=1):
+        positions.append(len(sortie))
+        sortie += f"{numero} 0 obj\n".encode() + objet + b"\nendobj\n"
+
+    debut_xref = len(sortie)
+    sortie += f"xref\n0 {len(objets) + 1}\n0000000000 65535 f \n".encode()
+    for position in positions:
+        sortie += f"{position:010d} 00000 n \n".encode()
+    sortie += f"trailer\n<< /Size {len(objets) + 1} /Root 1 0 R >>\nstartxref\n{debut_xref}\n%%EOF\n".encode()
+
+    with open(chemin, 'wb') as f:
+        f.write(sortie)
+
+
+def ecrire_pdf_scanne(chemin, pages):
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        police = ImageFont.truetype("DejaVuSans.ttf", 22)
+    except OSError:
+        police = ImageFont.load_default()
+
+    generateur = random.Random(os.path.basename(chemin))
+    images = []
+    for lignes in pages:
+        image = Image.new('L', (1240, 1754), 255)
+        dessin = ImageDraw.Draw(image)
+        for i, ligne in enumerate(lignes[:LIGNES_PAR_PAGE_SCANNEE]):
+            dessin.text((90, 90 + i * 26), ligne, fill=0, font=police)
+        for _ in range(400):
+            x, y = generateur.randrange(image.width), generateur.randrange(image.height)
+            dessin.point((x, y), fill=generateur.randrange(0, 160))
+        image = image.rotate(generateur.uniform(-2.5, 2.5), resample=Image.BILINEAR, fillcolor=255)
+        fond = Image.new('RGB', image.size, (246, 240, 226))
+        images.append(Image.composite(fond, image.convert('RGB'), image))
+
+    images[0].save(chemin, save_all=True, append_images=images[1:], resolution=150)
+
+
+def ecrire_docx(chemin, pages):
+    import docx
+
+    document = docx.Document()
+    for lignes in pages:
+        for ligne in lignes:
+            document.add_paragraph(ligne)
+    document.save(chemin)
+
+
+def ecrire_txt(chemin, pages):
+    with open(chemin, 'w', encoding='utf-8') as f:
+        for lignes in pages:
+            f.write('\n'.join(lignes) + '\n\n')
+
+
+GENERATEURS = {
+    'pdf_texte': ('.pdf', ecrire_pdf_texte),
+    'pdf_scanne': ('.pdf', ecrire_pdf_scanne),
+    'docx': ('.docx', ecrire_docx),
+    'txt': ('.txt', ecrire_txt),
+}
+
+
+def generer_corpus(dossier, nombres, pages_par_document, graine):
+    generateur = random.Random(graine)
+    manifeste = []
+    os.makedirs(dossier, exist_ok=True)
+
+    for type_document, nombre in nombres.items():
+        extension, ecrire = GENERATEURS[type_document]
+        for i in range(nombre):
+            nombre_pages = generateur.randint(1, pages_par_document)
+            pages = [generer_texte(generateur, MOTS_PAR_PAGE) for _ in range(nombre_pages)]
+            chemin = os.path.join(dossier, f"{type_document}_{i:05d}{extension}")
+            try:
+                ecrire(chemin, pages)
+            except ImportError as e:
+                print(f"  {type_document} ignoré: {e}")
+                break
+            element = {"chemin": chemin, "type": type_document, "pages": nombre_pages}
+            if type_document == 'pdf_scanne':
+                element["texte"] = '\n'.join(ligne for lignes in pages for ligne in lignes[:LIGNES_PAR_PAGE_SCANNEE])
+            manifeste.append(element)
+
+    return manifeste
+
+
+def generer_catalogue(nombre, graine):
+    generateur = random.Random(graine)
+    avocats = ["Maître Dupont", "Maître Martin", "Maître Dubois"]
+    specialites = ["Droit civil", "Droit du travail", "Droit commercial", "Droit de la famille"]
+    catalogue = []
+
+    for i in range(nombre):
+        lignes = generer_texte(generateur, MOTS_PAR_PAGE * generateur.randint(1, 4))
+        nom = ' '.join(generateur.choice(VOCABULAIRE) for _ in range(4))
+        catalogue.append({
+            "id": f"{i:08x}",
+            "nom": nom,
+            "chemin": os.path.join("donnees_cabinet", f"{i:08x}.pdf"),
+            "dossier": "donnees_cabinet",
+            "extension": ".pdf",
+            "taille": generateur.randint(10_000, 5_000_000),
+            "date_modification": datetime.now().isoformat(),
+            "date_indexation": datetime.now().isoformat(),
+            "type_mime": "application/pdf",
+            "mots_cles": nom.split(),
+            "categorie": generateur.choice(["Contrats", "Factures", "Correspondance", "Décisions", "Divers"]),
+            "specialite": generateur.choice(specialites),
+            "avocat": generateur.choice(avocats),
+            "statut": "indexé",
+            "contenu_textuel": '\n'.join(lignes),
+            "type_fichier": "texte"
+        })
+
+    return catalogue
+
+
+class IndicesSimules:
+    def exists(self, index):
+        return True
+
+    def create(self, **kwargs):
+        return {"acknowledged": True}
+
+    def put_mapping(self, **kwargs):
+        return {"acknowledged": True}
+
+
+class ElasticsearchSimule:
+    def __init__(self):
+        self.documents = {}
+        self.postings = {}
+        self.indices = IndicesSimules()
+
+    def ping(self):
+        return True
+
+    def index(self, index, id, body=None, document=None):
+        source = body if body is not None else document
+        self.documents[id] = source
+        for mot in set(re.findall(r'\w+', f"{source.get('nom', '')} {source.get('contenu_textuel', '')}".lower())):
+            self.postings.setdefault(mot, set()).add(id)
+        return {"result": "created"}
+
+    def delete(self, index, id):
+        self.documents.pop(id, None)
+        return {"result": "deleted"}
+
+    def search(self, index, body=None, **kwargs):
+        body = body or kwargs
+        termes = []
+
+        def collecter(noeud):
+            if isinstance(noeud, dict):
+                for cle, valeur in noeud.items():
+                    if cle in ('query', 'match', 'match_phrase') and isinstance(valeur, str):
+                        termes.extend(re.findall(r'\w+', valeur.lower()))
+                    elif cle != 'must_not':
+                        collecter(valeur)
+            elif isinstance(noeud, list):
+                for element in noeud:
+                    collecter(element)
+
+        collecter(body.get('query', {}))
+        ids = None
+        for terme in termes:
+            trouves = self.postings.get(terme, set())
+            ids = set(trouves) if ids is None else ids & trouves
+        if ids is None:
+            ids = set(self.documents)
+
+        taille = body.get('size', 10)
+        hits = [
+            {"_id": doc_id, "_score": 1.0, "_source": dict(self.documents[doc_id]), "highlight": {}}
+            for doc_id in sorted(ids)[:taille]
+        ]
+        return {"hits": {"total": {"value": len(ids)}, "hits": hits}, "aggregations": {}, "suggest": {}}
+
+
+def percentiles(valeurs):
+    valeurs = sorted(valeurs)
+    if not valeurs:
+        return {}
+
+    def rang(p):
+        return valeurs[min(len(valeurs) - 1, int(round(p / 100 * (len(valeurs) - 1))))]
+
+    return {
+        "p50_ms": round(rang(50) * 1000, 3),
+        "p95_ms": round(rang(95) * 1000, 3),
+        "p99_ms": round(rang(99) * 1000, 3),
+        "moyenne_ms": round(statistics.fmean(valeurs) * 1000, 3),
+    }
+
+
+def rss_pic_mo():
+    if resource is None:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+        except Exception:
+            return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return round(pic / (1024 * 1024), 1)
+    return round(pic / 1024, 1)
+
+
+def bench_extraction(server, contexte, parametres):
+    par_type = {}
+    for element in contexte["manifeste"]:
+        debut = time.perf_counter()
+        server.extraire_texte_ocr(element["chemin"])
+        duree = time.perf_counter() - debut
+        stats = par_type.setdefault(element["type"], {"fichiers": 0, "pages": 0, "duree": 0.0})
+        stats["fichiers"] += 1
+        stats["pages"] += element["pages"]
+        stats["duree"] += duree
+
+    return {
+        type_document: {
+            "fichiers_par_seconde": round(stats["fichiers"] / stats["duree"], 2) if stats["duree"] else None,
+            "pages_par_seconde": round(stats["pages"] / stats["duree"], 2) if stats["duree"] else None,
+            "duree_s": round(stats["duree"], 3),
+        }
+        for type_document, stats in par_type.items()
+    }
+
+
+def bench_moteurs_pdf(server, contexte, parametres):
+    documents = [element for element in contexte["manifeste"] if element["type"] == "pdf_texte"]
+    moteur_configure = server.CONFIG["pdf_moteur"]
+    resultats = {}
+    try:
+        for moteur in server.MOTEURS_PDF:
+            server.CONFIG["pdf_moteur"] = moteur
+            debut = time.perf_counter()
+            for element in documents:
+                server.extraire_texte_pdf(element["chemin"])
+            duree = time.perf_counter() - debut
+            pages = sum(element["pages"] for element in documents)
+            resultats[moteur] = {
+                "pages_par_seconde": round(pages / duree, 2) if duree else None,
+                "duree_s": round(duree, 3),
+            }
+    finally:
+        server.CONFIG["pdf_moteur"] = moteur_configure
+    return resultats
+
+
+def rappel_mots(reference, texte):
+    attendus = Counter(re.findall(r"\w+", reference.lower()))
+    trouves = Counter(re.findall(r"\w+", texte.lower()))
+    total = sum(attendus.values())
+    return sum(min(nombre, trouves[mot]) for mot, nombre in attendus.items()) / total if total else 1.0
+
+
+def bench_ocr(server, contexte, parametres):
+    if not (server.OCR_DISPONIBLE and server.PDF2IMAGE_DISPONIBLE):
+        print("  OCR indisponible, scénario ignoré")
+        return {}
+
+    documents = [element for element in contexte["manifeste"] if element["type"] == "pdf_scanne"]
+    pages = sum(element["pages"] for element in documents)
+    resultats = {}
+    for nom, reglages in (("reference", REGLAGES_OCR_REFERENCE), ("pretraitement", {})):
+        sauvegarde = {cle: server.CONFIG[cle] for cle in reglages}
+        server.CONFIG.update(reglages)
+        try:
+            rappels = []
+            debut = time.perf_counter()
+            for element in documents:
+                rappels.append(rappel_mots(element["texte"], server.extraire_texte_ocr(element["chemin"])))
+            duree = time.perf_counter() - debut
+        finally:
+            server.CONFIG.update(sauvegarde)
+        resultats[nom] = {
+            "pages_par_seconde": round(pages / duree, 3) if duree else None,
+            "duree_s": round(duree, 3),
+            "rappel_mots": round(statistics.fmean(rappels), 4) if rappels else None,
+        }
+    return resultats
+
+
+def bench_indexation(server, contexte, parametres):
+    server.es = ElasticsearchSimule() if parametres.moteur == 'simule' else None
+    debut = time.perf_counter()
+    total = 0
+    for fichier_info in server.indexer_fichiers(contexte["dossier_corpus"]):
+        server.indexer_dans_elasticsearch(fichier_info)
+        total += 1
+    duree = time.perf_counter() - debut
+    pages = sum(element["pages"] for element in contexte["manifeste"])
+
+    return {
+        "fichiers": total,
+        "duree_s": round(duree, 3),
+        "fichiers_par_seconde": round(total / duree, 2) if duree else None,
+        "pages_par_seconde": round(pages / duree, 2) if duree else None,
+    }
+
+
+def bench_analyse_requetes(server, contexte, parametres):
+    iterations = parametres.iterations * 20
+    resultats = {}
+    for requete in REQUETES:
+        debut = time.perf_counter()
+        for _ in range(iterations):
+            server.analyser_requete_avancee(requete)
+        resultats[requete] = round((time.perf_counter() - debut) / iterations * 1_000_000, 2)
+
+    sans_cache = {}
+    for requete in REQUETES:
+        debut = time.perf_counter()
+        for _ in range(iterations):
+            server.compiler_requete_elasticsearch(server.analyser_requete(requete))
+        sans_cache[requete] = round((time.perf_counter() - debut) / iterations * 1_000_000, 2)
+
+    return {
+        "par_requete_us": resultats,
+        "moyenne_us": round(statistics.fmean(resultats.values()), 2),
+        "sans_cache_moyenne_us": round(statistics.fmean(sans_cache.values()), 2),
+    }
+
+
+def mesurer_recherche(client, parametres):
+    latences = []
+    for _ in range(parametres.iterations):
+        for requete in REQUETES:
+            debut = time.perf_counter()
+            reponse = client.get('/recherche/avancee', query_string={'q': requete})
+            latences.append(time.perf_counter() - debut)
+            if reponse.status_code != 200:
+                raise RuntimeError(f"Recherche '{requete}' en erreur: {reponse.status_code}")
+    return percentiles(latences)
+
+
+def bench_recherche(server, contexte, parametres):
+    server.sauvegarder_donnees(server.FICHIER_INDEX, contexte["catalogue"])
+    client = server.app.test_client()
+    resultats = {}
+
+    server.es = None
+    resultats["basique"] = mesurer_recherche(client, parametres)
+
+    es_simule = ElasticsearchSimule()
+    for doc in contexte["catalogue"]:
+        es_simule.index(index="bench", id=doc["id"], body=doc)
+    server.es = es_simule
+    resultats["elasticsearch_simule"] = mesurer_recherche(client, parametres)
+    server.es = None
+
+    debut = time.perf_counter()
+    for _ in range(parametres.iterations):
+        for requete in REQUETES:
+            server.rechercher_localement(contexte["catalogue"], requete)
+    duree = time.perf_counter() - debut
+    resultats["boucle_locale"] = {
+        "requetes_par_seconde": round(parametres.iterations * len(REQUETES) / duree, 2),
+        "documents_par_seconde": round(parametres.iterations * len(REQUETES) * len(contexte["catalogue"]) / duree),
+    }
+
+    return resultats
+
+
+def bench_json(server, contexte, parametres):
+    chemin = os.path.join(contexte["dossier_travail"], "bench_index.json")
+    sauvegardes, chargements = [], []
+
+    for _ in range(max(1, parametres.iterations // 5)):
+        debut = time.perf_counter()
+        server.sauvegarder_donnees(chemin, contexte["catalogue"])
+        sauvegardes.append(time.perf_counter() - debut)
+
+        debut = time.perf_counter()
+        server.charger_donnees(chemin)
+        chargements.append(time.perf_counter() - debut)
+
+    chemin_binaire = os.path.join(contexte["dossier_travail"], "bench_index.cat")
+    debut = time.perf_counter()
+    with open(chemin_binaire, 'wb') as f:
+        f.write(server.encoder_catalogue(contexte["catalogue"], 1))
+    sauvegarde_binaire = time.perf_counter() - debut
+
+    ouvertures, colonnes, chargements_binaires = [], [], []
+    for _ in range(max(1, parametres.iterations // 5)):
+        debut = time.perf_counter()
+        catalogue_binaire = server.CatalogueBinaire(chemin_binaire)
+        ouvertures.append(time.perf_counter() - debut)
+
+        debut = time.perf_counter()
+        catalogue_binaire.colonne('taille', 0)
+        catalogue_binaire.colonne('extension')
+        colonnes.append(time.perf_counter() - debut)
+
+        debut = time.perf_counter()
+        catalogue_binaire.enregistrements()
+        chargements_binaires.append(time.perf_counter() - debut)
+        catalogue_binaire.fermer()
+
+    catalogue = [dict(doc) for doc in contexte["catalogue"]]
+    server.sauvegarder_donnees(server.FICHIER_INDEX, catalogue)
+    journalisees = []
+    for iteration in range(parametres.iterations):
+        catalogue[iteration % len(catalogue)]["commentaire"] = f"modification {iteration}"
+        debut = time.perf_counter()
+        server.sauvegarder_donnees(server.FICHIER_INDEX, catalogue)
+        journalisees.append(time.perf_counter() - debut)
+
+    return {
+        "documents": len(contexte["catalogue"]),
+        "taille_mo": round(os.path.getsize(chemin) / (1024 * 1024), 2),
+        "sauvegarde_ms": round(statistics.median(sauvegardes) * 1000, 2),
+        "sauvegarde_journal_ms": round(statistics.median(journalisees) * 1000, 2),
+        "chargement_ms": round(statistics.median(chargements) * 1000, 2),
+        "binaire_taille_mo": round(os.path.getsize(chemin_binaire) / (1024 * 1024), 2),
+        "binaire_sauvegarde_ms": round(sauvegarde_binaire * 1000, 2),
+        "binaire_ouverture_ms": round(statistics.median(ouvertures) * 1000, 2),
+        "binaire_colonnes_ms": round(statistics.median(colonnes) * 1000, 2),
+        "binaire_chargement_ms": round(statistics.median(chargements_binaires) * 1000, 2),
+    }
+
+
+SCENARIOS = {
+    "extraction": bench_extraction,
+    "moteurs_pdf": bench_moteurs_pdf,
+    "ocr": bench_ocr,
+    "indexation": bench_indexation,
+    "analyse_requetes": bench_analyse_requetes,
+    "recherche": bench_recherche,
+    "json": bench_json,
+}
+
+
+def aplatir(mesures, prefixe=''):
+    valeurs = {}
+    for cle, valeur in mesures.items():
+        chemin = f"{prefixe}.{cle}" if prefixe else cle
+        if isinstance(valeur, dict):
+            valeurs.update(aplatir(valeur, chemin))
+        elif isinstance(valeur, (int, float)) and not isinstance(valeur, bool):
+            valeurs[chemin] = valeur
+    return valeurs
+
+
+def sens_amelioration(metrique):
+    nom = metrique.rsplit('.', 1)[-1]
+    if '_par_seconde' in nom or nom.startswith('rappel_'):
+        return 1
+    if nom.endswith(('_ms', '_s', '_us', '_mo')):
+        return -1
+    return 0
+
+
+def comparer(actuel, reference, seuil):
+    valeurs_actuelles = aplatir(actuel["mesures"])
+    valeurs_reference = aplatir(reference["mesures"])
+    regressions = []
+
+    print(f"\nComparaison avec '{reference.get('etiquette')}' ({reference.get('commit') or 'commit inconnu'})")
+    for metrique in sorted(set(valeurs_actuelles) & set(valeurs_reference)):
+        sens = sens_amelioration(metrique)
+        ancienne, nouvelle = valeurs_reference[metrique], valeurs_actuelles[metrique]
+        if sens == 0 or not ancienne:
+            continue
+        variation = (nouvelle - ancienne) / abs(ancienne) * 100
+        regression = variation * sens < -seuil
+        if regression:
+            regressions.append(metrique)
+        print(f"  {'REGRESSION' if regression else '          '} {metrique:<60} {ancienne:>12} -> {nouvelle:>12} ({variation:+.1f}%)")
+
+    return regressions
+
+
+def commit_courant():
+    try:
+        resultat = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DOSSIER_PROJET, capture_output=True, text=True, timeout=10)
+        return resultat.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def lire_arguments():
+    parser = argparse.ArgumentParser(description="Benchmarks de l'indexation, de l'extraction et de la recherche")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="Scénarios à exécuter, séparés par des virgules")
+    parser.add_argument('--pdf-texte', type=int, default=10, help="Nombre de PDF texte générés")
+    parser.add_argument('--pdf-scanne', type=int, default=3, help="Nombre de PDF scannés (images) générés")
+    parser.add_argument('--docx', type=int, default=10, help="Nombre de documents Word générés")
+    parser.add_argument('--txt', type=int, default=10, help="Nombre de fichiers texte générés")
+    parser.add_argument('--pages', type=int, default=5, help="Nombre maximal de pages par document")
+    parser.add_argument('--documents', type=int, default=2000, help="Taille du catalogue synthétique pour la recherche et le JSON")
+    parser.add_argument('--iterations', type=int, default=20, help="Répétitions par mesure")
+    parser.add_argument('--moteur', choices=['basique', 'simule'], default='simule', help="Client Elasticsearch utilisé pendant l'indexation")
+    parser.add_argument('--graine', type=int, default=42)
+    parser.add_argument('--etiquette', default=None, help="Nom du jeu de résultats (par défaut: commit courant)")
+    parser.add_argument('--sortie', default=os.path.join(DOSSIER_PROJET, 'benchmarks'), help="Dossier des résultats JSON")
+    parser.add_argument('--comparer', default=None, help="Fichier de résultats de référence à comparer")
+    parser.add_argument('--seuil', type=float, default=10.0, help="Dégradation tolérée en pourcentage avant de signaler une régression")
+    return parser.parse_args()
+
+
+def main():
+    parametres = lire_arguments()
+    scenarios = [nom.strip() for nom in parametres.scenarios.split(',') if nom.strip()]
+    inconnus = [nom for nom in scenarios if nom not in SCENARIOS]
+    if inconnus:
+        print(f"Scénarios inconnus: {', '.join(inconnus)}. Disponibles: {', '.join(SCENARIOS)}")
+        return 2
+
+    dossier_travail = tempfile.mkdtemp(prefix='bench_cabinet_')
+    dossier_initial = os.getcwd()
+    os.chdir(dossier_travail)
+    sys.path.insert(0, DOSSIER_PROJET)
+
+    try:
+        import logging
+        logging.disable(logging.WARNING)
+        import server
+        server.es = None
+
+        print(f"Génération du corpus dans {dossier_travail}...")
+        dossier_corpus = os.path.join(dossier_travail, 'corpus')
+        manifeste = generer_corpus(dossier_corpus, {
+            'pdf_texte': parametres.pdf_texte,
+            'pdf_scanne': parametres.pdf_scanne,
+            'docx': parametres.docx,
+            'txt': parametres.txt,
+        }, parametres.pages, parametres.graine)
+        contexte = {
+            "dossier_travail": dossier_travail,
+            "dossier_corpus": dossier_corpus,
+            "manifeste": manifeste,
+            "catalogue": generer_catalogue(parametres.documents, parametres.graine),
+        }
+
+        mesures = {}
+        for nom in scenarios:
+            print(f"Scénario {nom}...")
+            debut = time.perf_counter()
+            mesures[nom] = SCENARIOS[nom](server, contexte, parametres)
+            mesures[nom]["rss_pic_mo"] = rss_pic_mo()
+            print(f"  terminé en {time.perf_counter() - debut:.1f} s")
+    finally:
+        os.chdir(dossier_initial)
+        shutil.rmtree(dossier_travail, ignore_errors=True)
+
+    commit = commit_courant()
+    resultats = {
+        "etiquette": parametres.etiquette or commit or datetime.now().strftime('%Y%m%d-%H%M%S'),
+        "date": datetime.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plateforme": platform.platform(),
+        "ocr": server.OCR_MESSAGE,
+        "parametres": {cle: valeur for cle, valeur in vars(parametres).items() if cle not in ('sortie', 'comparer')},
+        "mesures": mesures,
+    }
+
+    print(json.dumps(mesures, ensure_ascii=False, indent=2))
+
+    os.makedirs(parametres.sortie, exist_ok=True)
+    chemin_resultats = os.path.join(parametres.sortie, f"{resultats['etiquette']}.json")
+    with open(chemin_resultats, 'w', encoding='utf-8') as f:
+        json.dump(resultats, f, ensure_ascii=False, indent=2)
+    print(f"Résultats enregistrés dans {chemin_resultats}")
+
+    if parametres.comparer:
+        with open(parametres.comparer, 'r', encoding='utf-8') as f:
+            reference = json.load(f)
+        if comparer(resultats, reference, parametres.seuil):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import io
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from importlib.util import find_spec
+
+MODULES_MOTEURS = {
+    "pypdfium2": "pypdfium2",
+    "pdfminer": "pdfminer",
+    "pypdf2": "PyPDF2"
+}
+
+def moteurs_disponibles():
+    return [moteur for moteur, module in MODULES_MOTEURS.items() if find_spec(module) is not None]
+
+def pages_pypdf2(chemin, depart):
+    import PyPDF2
+    with open(chemin, 'rb') as fichier:
+        lecteur = PyPDF2.PdfReader(fichier)
+        for numero in range(depart, len(lecteur.pages)):
+            yield numero, lecteur.pages[numero].extract_text()
+
+def pages_pdfminer(chemin, depart):
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+    ressources = PDFResourceManager(caching=True)
+    parametres = LAParams()
+    with open(chemin, 'rb') as fichier:
+        for numero, page in enumerate(PDFPage.get_pages(fichier)):
+            if numero < depart:
+                continue
+            tampon = io.StringIO()
+            convertisseur = TextConverter(ressources, tampon, laparams=parametres)
+            try:
+                PDFPageInterpreter(ressources, convertisseur).process_page(page)
+            finally:
+                convertisseur.close()
+            yield numero, tampon.getvalue()
+
+def pages_pypdfium2(chemin, depart):
+    import pypdfium2
+    document = pypdfium2.PdfDocument(chemin)
+    try:
+        for numero in range(depart, len(document)):
+            page = document[numero]
+            texte_page = page.get_textpage()
+            try:
+                yield numero, texte_page.get_text_range().replace('\r\n', '\n')
+            finally:
+                texte_page.close()
+                page.close()
+    finally:
+        document.close()
+
+MOTEURS = {
+    "pypdfium2": pages_pypdfium2,
+    "pdfminer": pages_pdfminer,
+    "pypdf2": pages_pypdf2
+}
+
+def iterer_pages(moteur, chemin, depart=0):
+    pages = MOTEURS[moteur](chemin, depart)
+    attendu = depart
+    while True:
+        debut = time.perf_counter()
+        try:
+            numero, texte = next(pages)
+        except StopIteration:
+            return
+        except Exception as e:
+            if attendu == 0:
+                raise
+            yield {"type": "erreur_page", "numero": attendu, "erreur": str(e), "duree": time.perf_counter() - debut}
+            return
+        attendu = numero + 1
+        yield {"type": "page", "numero": numero, "texte": texte or '', "duree": time.perf_counter() - debut}
+
+def boucle_travailleur(entree, sortie):
+    for ligne in entree:
+        if not ligne.strip():
+            continue
+        tache = json.loads(ligne)
+        try:
+            for message in iterer_pages(tache["moteur"], tache["chemin"], tache["depart"]):
+                sortie.write(json.dumps(message) + '\n')
+                sortie.flush()
+            sortie.write(json.dumps({"type": "fin"}) + '\n')
+        except Exception as e:
+            sortie.write(json.dumps({"type": "erreur", "erreur": str(e)}) + '\n')
+        sortie.flush()
+
+class DelaiPageDepasse(Exception):
+    pass
+
+class TravailleurPdf:
+    def __init__(self):
+        self.processus = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding='utf-8',
+            bufsize=1
+        )
+        self.messages = queue.Queue()
+        threading.Thread(target=self.lire, daemon=True).start()
+
+    def lire(self):
+        try:
+            for ligne in self.processus.stdout:
+                self.messages.put(json.loads(ligne))
+        except Exception:
+            pass
+        self.messages.put(None)
+
+    def envoyer(self, tache):
+        self.processus.stdin.write(json.dumps(tache) + '\n')
+        self.processus.stdin.flush()
+
+    def recevoir(self, delai):
+        try:
+            return self.messages.get(timeout=max(delai, 0))
+        except queue.Empty:
+            raise DelaiPageDepasse()
+
+    def vivant(self):
+        return self.processus.poll() is None
+
+    def arreter(self):
+        try:
+            self.processus.kill()
+            self.processus.wait(timeout=5)
+        except Exception:
+            pass
+
+class ReserveTravailleurs:
+    def __init__(self, taille):
+        self.taille = taille
+        self.libres = queue.LifoQueue()
+
+    def obtenir(self):
+        while True:
+            try:
+                travailleur = self.libres.get_nowait()
+            except queue.Empty:
+                return TravailleurPdf()
+            if travailleur.vivant():
+                return travailleur
+
+    def rendre(self, travailleur):
+        if travailleur.vivant() and self.libres.qsize() < self.taille:
+            self.libres.put(travailleur)
+        else:
+            travailleur.arreter()
+
+def extraire_pages_isolees(reserve, moteur, chemin, delai_page, delai_total=None, incidents_max=5):
+    chemin = os.path.abspath(chemin)
+    echeance = time.monotonic() + delai_total if delai_total else None
+    pages = []
+    incidents = []
+    depart = 0
+    while depart is not None:
+        travailleur = reserve.obtenir()
+        attendu = depart
+        depart = None
+        try:
+            travailleur.envoyer({"moteur": moteur, "chemin": chemin, "depart": attendu})
+            while True:
+                delai = delai_page
+                if echeance is not None:
+                    delai = min(delai, echeance - time.monotonic())
+                    if delai <= 0:
+                        travailleur.arreter()
+                        incidents.append({"numero": attendu, "motif": "delai_total"})
+                        return pages, incidents
+                message = travailleur.recevoir(delai)
+                if message is None:
+                    raise DelaiPageDepasse()
+                if message["type"] == "page":
+                    pages.append(message)
+                    attendu = message["numero"] + 1
+                elif message["type"] == "erreur_page":
+                    incidents.append({"numero": message["numero"], "motif": "erreur", "erreur": message["erreur"]})
+                    if len(incidents) < incidents_max:
+                        depart = message["numero"] + 1
+                elif message["type"] == "fin":
+                    reserve.rendre(travailleur)
+                    break
+                else:
+                    reserve.rendre(travailleur)
+                    raise RuntimeError(message["erreur"])
+        except DelaiPageDepasse:
+            travailleur.arreter()
+            incidents.append({"numero": attendu, "motif": "delai_page"})
+            if len(incidents) < incidents_max:
+                depart = attendu + 1
+        except (BrokenPipeError, OSError):
+            travailleur.arreter()
+            raise
+    return pages, incidents
+
+if __name__ == '__main__':
+    boucle_travailleur(sys.stdin, sys.stdout)
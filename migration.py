@@ -0,0 +1,330 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from collections import Counter, deque
+from datetime import datetime
+
+DOSSIER_PROJET = os.path.dirname(os.path.abspath(__file__))
+FORMAT_ARCHIVE = 1
+EXTENSIONS_COMPRESSEES = {'.pdf', '.docx', '.odt', '.png', '.jpg', '.jpeg', '.zip'}
+
+
+def lire_manifeste(chemin):
+    base = os.path.dirname(os.path.abspath(chemin))
+    with open(chemin, 'r', encoding='utf-8-sig', newline='') as f:
+        if chemin.lower().endswith(('.ndjson', '.jsonl')):
+            lignes = ((numero, json.loads(ligne)) for numero, ligne in enumerate(f, 1) if ligne.strip())
+        else:
+            echantillon = f.read(8192)
+            f.seek(0)
+            try:
+                dialecte = csv.Sniffer().sniff(echantillon, delimiters=',;\t')
+            except csv.Error:
+                dialecte = csv.excel
+            lignes = (
+                (numero, {cle.strip().lower(): (valeur or '').strip() for cle, valeur in ligne.items() if cle})
+                for numero, ligne in enumerate(csv.DictReader(f, dialect=dialecte), 2)
+            )
+        for numero, entree in lignes:
+            if entree.get('chemin'):
+                entree['chemin'] = os.path.normpath(os.path.join(base, entree['chemin']))
+            yield numero, entree, base
+
+
+class Reprise:
+    def __init__(self, chemin, reessayer_erreurs=False):
+        self.traitees = set()
+        if os.path.exists(chemin):
+            with open(chemin, 'r', encoding='utf-8') as f:
+                for ligne in f:
+                    try:
+                        resultat = json.loads(ligne)
+                    except ValueError:
+                        continue
+                    if not (reessayer_erreurs and resultat["statut"] == "erreur"):
+                        self.traitees.add(resultat["ligne"])
+        self.fichier = open(chemin, 'a', encoding='utf-8')
+
+    def enregistrer(self, resultats):
+        if not resultats:
+            return
+        for resultat in resultats:
+            self.fichier.write(json.dumps(resultat, ensure_ascii=False) + '\n')
+        self.fichier.flush()
+        os.fsync(self.fichier.fileno())
+
+    def fermer(self):
+        self.fichier.close()
+
+
+def chemin_cible(server, parametres, chemin, base, numero):
+    if not parametres.copier:
+        return chemin
+    relatif = os.path.relpath(chemin, base)
+    if relatif.startswith('..') or os.path.isabs(relatif):
+        relatif = f"{numero}_{os.path.basename(chemin)}"
+    return os.path.join(server.CONFIG["dossier_donnees"], parametres.sous_dossier, relatif)
+
+
+def copier_et_extraire(server, source, cible, extension, documents_connus):
+    if cible != source:
+        os.makedirs(os.path.dirname(cible), exist_ok=True)
+        shutil.copy2(source, cible)
+    return server.extraire_contenu_fichier(cible, extension, documents_connus)
+
+
+def extraire_archive(server, archive, destination):
+    destination = destination or os.path.join(server.CONFIG["dossier_donnees"], os.path.splitext(os.path.basename(archive))[0])
+    with zipfile.ZipFile(archive) as source:
+        description = json.loads(source.read('export.json'))
+        if description.get("format") != FORMAT_ARCHIVE:
+            raise ValueError(f"Format d'archive non pris en charge: {description.get('format')}")
+        print(f"Extraction de {description['documents']} document(s) dans {destination}...")
+        source.extractall(destination)
+
+    for fichier, charger, sauvegarder in (
+        ('specialites.json', server.charger_specialites, server.sauvegarder_specialites),
+        ('avocats.json', server.charger_avocats, server.sauvegarder_avocats),
+    ):
+        chemin = os.path.join(destination, fichier)
+        if os.path.exists(chemin):
+            with open(chemin, 'r', encoding='utf-8') as f:
+                importes = json.load(f)
+            existants = charger()
+            nouveaux = [valeur for valeur in importes if valeur not in existants]
+            if nouveaux:
+                sauvegarder(existants + nouveaux)
+    return os.path.join(destination, 'catalogue.ndjson')
+
+
+def importer(server, parametres):
+    manifeste = parametres.source
+    if manifeste.lower().endswith('.zip'):
+        manifeste = extraire_archive(server, manifeste, parametres.destination)
+
+    index = server.charger_donnees(server.FICHIER_INDEX)
+    chemins_connus = {doc.get('chemin') for doc in index}
+    ids_connus = {doc['id'] for doc in index}
+    documents_connus = server.index_par_empreinte(index)
+    reprise = None if parametres.simulation else Reprise(parametres.reprise or manifeste + '.reprise', parametres.reessayer_erreurs)
+    server.ORDONNANCEUR = server.OrdonnanceurExtraction(parametres.travailleurs, 0)
+
+    statistiques = Counter()
+    lot, resultats = [], []
+    en_cours = deque()
+    debut = time.perf_counter()
+
+    def noter(numero, statut, **details):
+        statistiques[statut] += 1
+        resultats.append({"ligne": numero, "statut": statut, **details})
+
+    def enregistrer_lot():
+        if lot:
+            index.extend(lot)
+            server.sauvegarder_donnees(server.FICHIER_INDEX, index)
+            elasticsearch = server.indexer_elasticsearch_en_masse(lot)
+            statistiques["erreurs_elasticsearch"] += elasticsearch["erreurs"]
+            lot.clear()
+        if reprise:
+            reprise.enregistrer(resultats)
+        resultats.clear()
+        duree = time.perf_counter() - debut
+        print(
+            f"  {statistiques['importé']} importé(s), {statistiques['ignoré']} ignoré(s), {statistiques['erreur']} erreur(s)"
+            f" - {statistiques['importé'] / duree:.1f} fichiers/s, {statistiques['octets'] / duree / (1024 * 1024):.1f} Mo/s"
+        )
+
+    def terminer(numero, entree, chemin, futur):
+        try:
+            contenu = futur.result()
+        except Exception as e:
+            noter(numero, "erreur", chemin=chemin, erreur=str(e))
+            return
+        doc = server.decrire_fichier(
+            chemin, contenu,
+            entree.get('specialite') or parametres.specialite,
+            entree.get('avocat') or parametres.avocat,
+            statut="importé",
+            dossier=None if parametres.copier else entree.get('dossier') or None
+        )
+        if entree.get('titre'):
+            doc['nom'] = entree['titre']
+        if entree.get('categorie'):
+            doc['categorie'] = entree['categorie']
+        if isinstance(entree.get('acces'), str):
+            entree['acces'] = [principal for principal in entree['acces'].split('|') if principal.strip()]
+        if 'acces' in entree:
+            try:
+                doc['acces'] = server.lire_liste_acces(entree['acces'])
+            except ValueError as e:
+                noter(numero, "erreur", chemin=chemin, erreur=str(e))
+                return
+        if 'acces' in entree or entree.get('dossier'):
+            origine, importe = server.acl_document(entree), server.acl_document(doc)
+            if "tous" in importe and "tous" not in origine:
+                noter(numero, "erreur", chemin=chemin, erreur="Accès non conservés : le document deviendrait visible par tous")
+                return
+            perdus = [principal for principal in origine if principal not in importe]
+            if perdus:
+                statistiques["accès modifiés"] += 1
+                logging.warning(f"Ligne {numero} : accès non conservés ({', '.join(perdus)})")
+        if entree.get('id') and entree['id'] not in ids_connus:
+            doc['id'] = entree['id']
+        ids_connus.add(doc['id'])
+        if doc['contenu_textuel']:
+            documents_connus.setdefault(doc['empreinte'], doc)
+        statistiques["octets"] += doc['taille']
+        lot.append(doc)
+        noter(numero, "importé", id=doc['id'])
+        if len(lot) >= parametres.lot:
+            enregistrer_lot()
+
+    try:
+        with server.ORDONNANCEUR.travail(f"import {os.path.basename(manifeste)}", quota=parametres.travailleurs) as travail:
+            for numero, entree, base in lire_manifeste(manifeste):
+                if reprise and numero in reprise.traitees:
+                    statistiques["déjà traité"] += 1
+                    continue
+                source = entree.get('chemin')
+                extension = os.path.splitext(source or '')[1].lower()
+                if not source or not os.path.isfile(source):
+                    noter(numero, "erreur", chemin=source, erreur="Fichier introuvable")
+                    continue
+                if extension not in server.CONFIG["extensions_autorisees"]:
+                    noter(numero, "ignoré", chemin=source, motif=f"Extension non autorisée: {extension}")
+                    continue
+                cible = chemin_cible(server, parametres, source, base, numero)
+                if cible in chemins_connus:
+                    noter(numero, "ignoré", chemin=source, motif="Déjà au catalogue")
+                    continue
+                chemins_connus.add(cible)
+                if parametres.simulation:
+                    noter(numero, "importé", chemin=source)
+                    continue
+
+                if entree.get('empreinte') and entree.get('contenu_textuel'):
+                    documents_connus.setdefault(entree['empreinte'], entree)
+                futur = travail.soumettre(copier_et_extraire, server, source, cible, extension, documents_connus)
+                en_cours.append((numero, entree, cible, futur))
+                while en_cours and en_cours[0][-1].done():
+                    terminer(*en_cours.popleft())
+
+        while en_cours:
+            terminer(*en_cours.popleft())
+    finally:
+        if not parametres.simulation:
+            enregistrer_lot()
+            reprise.fermer()
+
+    duree = time.perf_counter() - debut
+    print(
+        f"Import terminé en {duree:.1f} s : {statistiques['importé']} importé(s), {statistiques['ignoré']} ignoré(s), "
+        f"{statistiques['erreur']} erreur(s), {statistiques['déjà traité']} déjà traité(s) lors d'une exécution précédente"
+        + (" (simulation)" if parametres.simulation else "")
+    )
+    if statistiques["accès modifiés"]:
+        print(f"{statistiques['accès modifiés']} document(s) importé(s) sans une partie de leurs accès (voir les avertissements)")
+    if statistiques["erreurs_elasticsearch"]:
+        print(f"{statistiques['erreurs_elasticsearch']} erreur(s) d'indexation Elasticsearch")
+    return 1 if statistiques["erreur"] else 0
+
+
+def exporter(server, parametres):
+    filtres = {'specialite': parametres.specialite, 'avocat': parametres.avocat, 'categorie': parametres.categorie}
+    documents = [
+        doc for doc in server.charger_donnees(server.FICHIER_INDEX)
+        if all(not valeur or doc.get(champ) == valeur for champ, valeur in filtres.items())
+    ]
+    print(f"Export de {len(documents)} document(s) vers {parametres.archive}...")
+
+    temporaire = parametres.archive + '.tmp'
+    statistiques = Counter()
+    debut = time.perf_counter()
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as catalogue:
+        with zipfile.ZipFile(temporaire, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            for doc in documents:
+                entree = {**doc, 'titre': doc.get('nom'), 'chemin_origine': doc.get('chemin'), 'chemin': None}
+                chemin = doc.get('chemin')
+                if parametres.sans_fichiers:
+                    pass
+                elif chemin and os.path.isfile(chemin):
+                    entree['chemin'] = f"fichiers/{doc['id']}_{os.path.basename(chemin)}"
+                    compression = zipfile.ZIP_STORED if doc.get('extension') in EXTENSIONS_COMPRESSEES else zipfile.ZIP_DEFLATED
+                    archive.write(chemin, entree['chemin'], compress_type=compression)
+                    statistiques["fichiers"] += 1
+                    statistiques["octets"] += os.path.getsize(chemin)
+                else:
+                    statistiques["manquants"] += 1
+                catalogue.write(json.dumps(entree, ensure_ascii=False) + '\n')
+
+            catalogue.seek(0)
+            with archive.open('catalogue.ndjson', 'w', force_zip64=True) as sortie:
+                shutil.copyfileobj(catalogue.buffer, sortie)
+            archive.writestr('specialites.json', json.dumps(server.charger_specialites(), ensure_ascii=False, indent=2))
+            archive.writestr('avocats.json', json.dumps(server.charger_avocats(), ensure_ascii=False, indent=2))
+            archive.writestr('export.json', json.dumps({
+                "format": FORMAT_ARCHIVE,
+                "date": datetime.now().isoformat(),
+                "documents": len(documents),
+                "fichiers": statistiques["fichiers"],
+                "filtres": {champ: valeur for champ, valeur in filtres.items() if valeur}
+            }, ensure_ascii=False, indent=2))
+    os.replace(temporaire, parametres.archive)
+
+    print(
+        f"Export terminé en {time.perf_counter() - debut:.1f} s : {statistiques['fichiers']} fichier(s), "
+        f"{statistiques['octets'] / (1024 * 1024):.1f} Mo, {statistiques['manquants']} fichier(s) introuvable(s)"
+    )
+    return 0
+
+
+def lire_arguments():
+    parser = argparse.ArgumentParser(description="Import et export en masse du catalogue (à lancer serveur arrêté, depuis le dossier du serveur)")
+    sous_commandes = parser.add_subparsers(dest='commande', required=True)
+
+    parser_import = sous_commandes.add_parser('importer', help="Importer des documents depuis un manifeste CSV/NDJSON ou une archive d'export")
+    parser_import.add_argument('source', help="Manifeste .csv, .ndjson/.jsonl (colonnes chemin, titre, avocat, specialite, categorie, acces, dossier) ou archive .zip")
+    parser_import.add_argument('--travailleurs', type=int, default=os.cpu_count() or 2, help="Extractions simultanées")
+    parser_import.add_argument('--lot', type=int, default=200, help="Documents écrits par lot dans le catalogue et Elasticsearch")
+    parser_import.add_argument('--reprise', default=None, help="Fichier de reprise (par défaut: <manifeste>.reprise)")
+    parser_import.add_argument('--reessayer-erreurs', action='store_true', help="Retraiter les lignes en erreur lors d'une reprise")
+    parser_import.add_argument('--copier', action='store_true', help="Copier les fichiers dans le dossier de données au lieu de les indexer sur place")
+    parser_import.add_argument('--sous-dossier', default=f"import_{datetime.now():%Y%m%d}", help="Sous-dossier du dossier de données utilisé avec --copier")
+    parser_import.add_argument('--destination', default=None, help="Dossier où extraire une archive .zip")
+    parser_import.add_argument('--avocat', default="Non attribué", help="Avocat par défaut")
+    parser_import.add_argument('--specialite', default="Non spécifiée", help="Spécialité par défaut")
+    parser_import.add_argument('--simulation', action='store_true', help="Vérifier le manifeste sans rien importer")
+
+    parser_export = sous_commandes.add_parser('exporter', help="Exporter le catalogue et les fichiers dans une archive .zip")
+    parser_export.add_argument('archive', help="Archive .zip à créer")
+    parser_export.add_argument('--sans-fichiers', action='store_true', help="N'exporter que le catalogue")
+    parser_export.add_argument('--specialite', default=None)
+    parser_export.add_argument('--avocat', default=None)
+    parser_export.add_argument('--categorie', default=None)
+
+    parser.add_argument('--verbeux', action='store_true', help="Afficher les journaux du serveur")
+    return parser.parse_args()
+
+
+def main():
+    parametres = lire_arguments()
+    sys.path.insert(0, DOSSIER_PROJET)
+    logging.basicConfig(level=logging.INFO if parametres.verbeux else logging.WARNING)
+    import server
+    if not parametres.verbeux:
+        server.logger.setLevel(logging.WARNING)
+
+    if parametres.commande == 'importer':
+        return importer(server, parametres)
+    return exporter(server, parametres)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
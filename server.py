@@ -1,17 +1,41 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, send_file, g, Response
 from flask_cors import CORS
 import json
 import os
+import sys
 import uuid
 from datetime import datetime
 import mimetypes
 from pathlib import Path
 import shutil
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, helpers
 import logging
 from werkzeug.utils import secure_filename
 import re
 import subprocess
+import zipfile
+import mmap
+import xml.etree.ElementTree as ET
+import hashlib
+import threading
+import time
+import heapq
+import bisect
+import unicodedata
+import io
+import html
+import zlib
+import difflib
+import hmac
+import struct
+import secrets
+import fnmatch
+from stat import FILE_ATTRIBUTE_HIDDEN
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+import extraction_pdf
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,11 +56,240 @@ CONFIG = {
         "Droit fiscal", "Droit des sociétés", "Droit de la propriété intellectuelle",
         "Droit international", "Droit européen", "Droit des assurances",
         "Droit rural", "Droit de la santé", "Droit de l'environnement"
-    ]
+    ],
+    "suggestions_max": 10,
+    "suggestions_longueur_prefixe_max": 24,
+    "suggestions_debounce_ms": 150,
+    "suggestions_cache_taille": 512,
+    "suggestions_cache_ttl": 30,
+    "similarite_permutations": 128,
+    "similarite_bandes": 16,
+    "similarite_taille_shingle": 5,
+    "similarite_seuil": 0.8,
+    "entites_taille_max_texte": 2000000,
+    "entites_max_par_type": 50,
+    "profilage_intervalle_ms": 5,
+    "profilage_conserves": 20,
+    "extraction_taille_max": 200 * 1024 * 1024,
+    "extraction_taille_decompressee_max": 1024 * 1024 * 1024,
+    "extraction_delai": 120,
+    "extraction_caracteres_max": 5000000,
+    "extraction_limites": {
+        ".xlsx": {"taille_max": 100 * 1024 * 1024, "delai": 60, "caracteres_max": 2000000},
+        ".xls": {"taille_max": 50 * 1024 * 1024, "delai": 60, "caracteres_max": 2000000},
+        ".txt": {"delai": 30},
+        ".rtf": {"delai": 60}
+    },
+    "pdf_moteur": "auto",
+    "pdf_sous_processus": True,
+    "pdf_processus": os.cpu_count() or 2,
+    "pdf_delai_page": 30,
+    "pdf_incidents_max": 5,
+    "pdf_essais_moteur": 3,
+    "pdf_exploration": 25,
+    "ocr_langues": "fra+eng",
+    "ocr_detection_langue": True,
+    "ocr_detection_mots_min": 8,
+    "ocr_psm": 3,
+    "ocr_oem": 1,
+    "ocr_dpi": 200,
+    "ocr_dpi_adaptatif": True,
+    "ocr_largeur_cible": 1700,
+    "ocr_dpi_min": 150,
+    "ocr_dpi_max": 300,
+    "ocr_cote_max_image": 2500,
+    "ocr_niveaux_gris": True,
+    "ocr_binarisation": True,
+    "ocr_redressement": True,
+    "ocr_angle_max": 5,
+    "ocr_recadrage": True,
+    "ocr_marge_recadrage": 20,
+    "ordonnanceur_travailleurs": max(2, os.cpu_count() or 2),
+    "ordonnanceur_reserve_interactive": 1,
+    "ordonnanceur_quota_masse": max(1, (os.cpu_count() or 2) - 1),
+    "ordonnanceur_file_masse": 64,
+    "ordonnanceur_file_interactive": 32,
+    "passages_max": 3,
+    "passages_taille": 160,
+    "extrait_taille": 300,
+    "index_pages": False,
+    "pages_par_document": 5,
+    "pages_selection_max": 50,
+    "apercu_dpi": 110,
+    "semantique_active": False,
+    "semantique_modele": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+    "semantique_prefixe_requete": "",
+    "semantique_prefixe_passage": "",
+    "semantique_mots_segment": 180,
+    "semantique_chevauchement": 30,
+    "semantique_segments_max_document": 400,
+    "semantique_taille_lot": 32,
+    "semantique_documents_par_lot": 16,
+    "semantique_intervalle": 10,
+    "semantique_k": 50,
+    "semantique_mode_defaut": "hybride",
+    "semantique_rrf_k": 60,
+    "semantique_score_min": 0.2,
+    "stockage_compactage_operations": 500,
+    "stockage_compactage_octets": 16 * 1024 * 1024,
+    "versions_actives": True,
+    "versions_bloc_min": 2048,
+    "versions_bloc_moyen": 8192,
+    "versions_bloc_max": 65536,
+    "versions_diff_lignes_max": 2000,
+    "acces_actif": False,
+    "acces_duree_session": 8 * 3600,
+    "acces_iterations_mot_de_passe": 200000,
+    "acces_cache_filtres": 64,
+    "requetes_cache_plans": 512,
+    "catalogue_binaire": True,
+    "catalogue_bloc_octets": 256 * 1024,
+    "catalogue_compression": 3,
+    "catalogue_blocs_en_cache": 16,
+    "indexation_inclure": [],
+    "indexation_exclure": ["~$*", "Thumbs.db", "desktop.ini"],
+    "indexation_taille_max": None,
+    "indexation_fichiers_caches": False,
+    "indexation_suivre_liens": False,
+    "indexation_concurrence_dossier": None,
+    "indexation_lot": 500
 }
 
+SEUILS_DUREE = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+REGISTRE_METRIQUES = []
+
+def formater_etiquettes(noms, valeurs, supplementaires=None):
+    paires = list(zip(noms, valeurs)) + list(supplementaires or [])
+    if not paires:
+        return ''
+    contenu = ','.join(
+        f'{nom}="' + str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for nom, valeur in paires
+    )
+    return '{' + contenu + '}'
+
+class Compteur:
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.valeurs = {}
+        self.verrou = threading.Lock()
+        REGISTRE_METRIQUES.append(self)
+    
+    def inc(self, valeur=1, **etiquettes):
+        cle = tuple(str(etiquettes.get(nom, '')) for nom in self.etiquettes)
+        with self.verrou:
+            self.valeurs[cle] = self.valeurs.get(cle, 0) + valeur
+    
+    def exposer(self):
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} counter"]
+        with self.verrou:
+            for cle, valeur in sorted(self.valeurs.items()):
+                lignes.append(f"{self.nom}{formater_etiquettes(self.etiquettes, cle)} {valeur}")
+        return '\n'.join(lignes)
+
+class Histogramme:
+    def __init__(self, nom, aide, etiquettes=(), seuils=SEUILS_DUREE):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.seuils = tuple(seuils)
+        self.valeurs = {}
+        self.verrou = threading.Lock()
+        REGISTRE_METRIQUES.append(self)
+    
+    def observer(self, valeur, **etiquettes):
+        cle = tuple(str(etiquettes.get(nom, '')) for nom in self.etiquettes)
+        position = bisect.bisect_left(self.seuils, valeur)
+        with self.verrou:
+            serie = self.valeurs.get(cle)
+            if serie is None:
+                serie = self.valeurs[cle] = [[0] * (len(self.seuils) + 1), 0.0, 0]
+            serie[0][position] += 1
+            serie[1] += valeur
+            serie[2] += 1
+    
+    @contextmanager
+    def chronometrer(self, **etiquettes):
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observer(time.perf_counter() - debut, **etiquettes)
+    
+    def exposer(self):
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} histogram"]
+        with self.verrou:
+            for cle, (seaux, somme, total) in sorted(self.valeurs.items()):
+                cumul = 0
+                for seuil, nombre in zip(self.seuils, seaux):
+                    cumul += nombre
+                    lignes.append(f"{self.nom}_bucket{formater_etiquettes(self.etiquettes, cle, [('le', seuil)])} {cumul}")
+                lignes.append(f"{self.nom}_bucket{formater_etiquettes(self.etiquettes, cle, [('le', '+Inf')])} {total}")
+                lignes.append(f"{self.nom}_sum{formater_etiquettes(self.etiquettes, cle)} {somme}")
+                lignes.append(f"{self.nom}_count{formater_etiquettes(self.etiquettes, cle)} {total}")
+        return '\n'.join(lignes)
+
+class Jauge:
+    def __init__(self, nom, aide, etiquettes=(), fonction=None):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.fonction = fonction
+        REGISTRE_METRIQUES.append(self)
+    
+    def exposer(self):
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} gauge"]
+        for cle, valeur in sorted((self.fonction() if self.fonction else {}).items()):
+            lignes.append(f"{self.nom}{formater_etiquettes(self.etiquettes, cle)} {valeur}")
+        return '\n'.join(lignes)
+
+def exposer_metriques():
+    return '\n'.join(metrique.exposer() for metrique in REGISTRE_METRIQUES) + '\n'
+
+METRIQUE_HTTP_DUREE = Histogramme('cabinet_http_requete_duree_secondes', "Durée de traitement des requêtes HTTP", ['route', 'methode', 'statut'])
+METRIQUE_HTTP_TOTAL = Compteur('cabinet_http_requetes_total', "Nombre de requêtes HTTP traitées", ['route', 'methode', 'statut'])
+METRIQUE_EXTRACTION_DUREE = Histogramme('cabinet_extraction_duree_secondes', "Durée d'extraction de texte par document", ['extracteur'])
+METRIQUE_EXTRACTION_PAGE = Histogramme('cabinet_extraction_page_duree_secondes', "Durée d'extraction de texte par page", ['etape'])
+METRIQUE_EXTRACTION_PAGES = Compteur('cabinet_extraction_pages_total', "Nombre de pages traitées par étape d'extraction", ['etape'])
+METRIQUE_EXTRACTION_ERREURS = Compteur('cabinet_extraction_erreurs_total', "Nombre d'erreurs d'extraction", ['extracteur'])
+METRIQUE_EXTRACTION_INTERRUPTIONS = Compteur('cabinet_extraction_interruptions_total', "Extractions interrompues par une limite (taille, délai, caractères)", ['extracteur', 'motif'])
+METRIQUE_ES_DUREE = Histogramme('cabinet_elasticsearch_duree_secondes', "Durée des appels Elasticsearch", ['operation'])
+METRIQUE_ES_ERREURS = Compteur('cabinet_elasticsearch_erreurs_total', "Nombre d'appels Elasticsearch en erreur", ['operation'])
+METRIQUE_STOCKAGE_DUREE = Histogramme('cabinet_stockage_duree_secondes', "Durée des lectures et écritures des fichiers JSON", ['operation', 'fichier'])
+
+class ClientInstrumente:
+    def __init__(self, client, prefixe=''):
+        self._client = client
+        self._prefixe = prefixe
+    
+    def __getattr__(self, nom):
+        attribut = getattr(self._client, nom)
+        
+        if nom == 'options':
+            return lambda *args, **kwargs: ClientInstrumente(attribut(*args, **kwargs), self._prefixe)
+        if nom == 'indices':
+            return ClientInstrumente(attribut, 'indices.')
+        if not callable(attribut):
+            return attribut
+        
+        operation = self._prefixe + nom
+        
+        def appel(*args, **kwargs):
+            debut = time.perf_counter()
+            try:
+                return attribut(*args, **kwargs)
+            except Exception:
+                METRIQUE_ES_ERREURS.inc(operation=operation)
+                raise
+            finally:
+                METRIQUE_ES_DUREE.observer(time.perf_counter() - debut, operation=operation)
+        
+        return appel
+
 try:
-    es = Elasticsearch([CONFIG["elasticsearch_host"]])
+    es = ClientInstrumente(Elasticsearch([CONFIG["elasticsearch_host"]]))
     if not es.ping():
         raise Exception("Elasticsearch non disponible")
     logger.info("Connecté à Elasticsearch")
@@ -93,10 +346,20 @@ OCR_DISPONIBLE, TESSERACT_PATH, OCR_MESSAGE = configurer_tesseract_auto()
 
 if OCR_DISPONIBLE:
     import pytesseract
-    from PIL import Image
+    from PIL import Image, ImageFilter, ImageOps
     pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
     logger.info(f"OCR Tesseract configuré: {TESSERACT_PATH}")
 
+MOTEURS_PDF = extraction_pdf.moteurs_disponibles()
+RESERVE_PDF = extraction_pdf.ReserveTravailleurs(CONFIG["pdf_processus"])
+PERFORMANCES_PDF = {
+    moteur: {"documents": 0, "echecs": 0, "pages": 0, "secondes_par_page": None, "dernier_usage": 0}
+    for moteur in MOTEURS_PDF
+}
+ETAT_PERFORMANCES_PDF = {"documents": 0}
+VERROU_PERFORMANCES_PDF = threading.Lock()
+logger.info(f"Moteurs PDF disponibles: {', '.join(MOTEURS_PDF) or 'aucun'}")
+
 try:
     import PyPDF2
     PYPDF2_DISPONIBLE = True
@@ -104,7 +367,19 @@ except ImportError:
     PYPDF2_DISPONIBLE = False
 
 try:
-    from pdf2image import convert_from_path
+    import numpy as np
+    NUMPY_DISPONIBLE = True
+except ImportError:
+    NUMPY_DISPONIBLE = False
+
+try:
+    import hnswlib
+    HNSWLIB_DISPONIBLE = True
+except ImportError:
+    HNSWLIB_DISPONIBLE = False
+
+try:
+    from pdf2image import convert_from_path, pdfinfo_from_path
     PDF2IMAGE_DISPONIBLE = True
 except ImportError:
     PDF2IMAGE_DISPONIBLE = False
@@ -112,72 +387,1267 @@ except ImportError:
 for dossier in [CONFIG["dossier_donnees"], CONFIG["dossier_index"]]:
     os.makedirs(dossier, exist_ok=True)
 
-FICHIER_INDEX = os.path.join(CONFIG["dossier_index"], "index.json")
+FICHIER_INDEX_JSON = os.path.join(CONFIG["dossier_index"], "index.json")
+FICHIER_INDEX_BINAIRE = os.path.join(CONFIG["dossier_index"], "index.catb")
+FICHIER_INDEX = FICHIER_INDEX_BINAIRE if CONFIG["catalogue_binaire"] else FICHIER_INDEX_JSON
 FICHIER_STATS = os.path.join(CONFIG["dossier_index"], "statistiques.json")
 FICHIER_SPECIALITES = os.path.join(CONFIG["dossier_index"], "specialites.json")
 FICHIER_AVOCATS = os.path.join(CONFIG["dossier_index"], "avocats.json")
+INDEX_PAGES = CONFIG["index_name"] + "_pages"
+INDEX_SEGMENTS = CONFIG["index_name"] + "_segments"
+FICHIER_SEGMENTS = os.path.join(CONFIG["dossier_index"], "segments.json")
+FICHIER_VECTEURS = os.path.join(CONFIG["dossier_index"], "vecteurs.npy")
+DOSSIER_VERSIONS = os.path.join(CONFIG["dossier_index"], "versions")
+FICHIER_UTILISATEURS = os.path.join(CONFIG["dossier_index"], "utilisateurs.json")
+FICHIER_MOT_DE_PASSE_INITIAL = os.path.join(CONFIG["dossier_index"], "mot_de_passe_admin.txt")
 
-def charger_donnees(fichier):
+FICHIERS_JOURNALISES = {FICHIER_INDEX}
+ENTETE_STOCKAGE = b"#stockage 1 "
+ETAT_JOURNAUX = {}
+VERROU_STOCKAGE = threading.RLock()
+
+class ErreurStockage(Exception):
+    pass
+
+class ContenuNonConserve(ErreurStockage):
+    pass
+
+def fichier_journal(fichier):
+    return fichier + ".journal"
+
+def fichier_precedent(fichier):
+    return fichier + ".precedent"
+
+def synchroniser_dossier(dossier):
+    if os.name == 'nt':
+        return
+    descripteur = os.open(dossier or '.', os.O_RDONLY)
     try:
-        with open(fichier, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return []
+        os.fsync(descripteur)
+    finally:
+        os.close(descripteur)
 
-def sauvegarder_donnees(fichier, donnees):
-    with open(fichier, 'w', encoding='utf-8') as f:
-        json.dump(donnees, f, ensure_ascii=False, indent=2)
+def ecrire_fichier_atomique(fichier, contenu, precedent=None):
+    temporaire = f"{fichier}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporaire, 'wb') as f:
+            f.write(contenu)
+            f.flush()
+            os.fsync(f.fileno())
+        if precedent and os.path.exists(fichier):
+            os.replace(fichier, precedent)
+        os.replace(temporaire, fichier)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+    synchroniser_dossier(os.path.dirname(fichier))
 
-def extraire_texte_pdf(chemin_fichier):
-    if not PYPDF2_DISPONIBLE:
-        return "[PyPDF2 non disponible]"
-    
+MAGIC_CATALOGUE = b"CATB"
+VERSION_CATALOGUE = 1
+ENTETE_CATALOGUE = struct.Struct("<4sHHQIQQ32s")
+INDICE_ABSENT = 0xFFFFFFFF
+INDICE_NUL = 0xFFFFFFFE
+ENTIER_ABSENT = -2 ** 63
+ENTIER_NUL = -2 ** 63 + 1
+COLONNES_TEXTE = ('contenu_textuel',)
+ABSENT = object()
+
+def est_catalogue_binaire(fichier):
     try:
-        texte = ""
-        with open(chemin_fichier, 'rb') as fichier:
-            lecteur_pdf = PyPDF2.PdfReader(fichier)
-            for page_num, page in enumerate(lecteur_pdf.pages):
-                try:
-                    texte_page = page.extract_text()
-                    if texte_page and texte_page.strip():
-                        texte += f"--- Page {page_num + 1} ---\n{texte_page}\n\n"
-                except Exception as e:
+        with open(fichier, 'rb') as f:
+            return f.read(len(MAGIC_CATALOGUE)) == MAGIC_CATALOGUE
+    except FileNotFoundError:
+        return False
+
+def tableau_octets(tableau):
+    if sys.byteorder != 'little':
+        tableau = array(tableau.typecode, tableau)
+        tableau.byteswap()
+    return tableau.tobytes()
+
+def type_colonne(nom, valeurs):
+    presentes = [valeur for valeur in valeurs if valeur is not ABSENT and valeur is not None]
+    if presentes and all(type(valeur) is int and ENTIER_NUL < valeur < 2 ** 63 for valeur in presentes):
+        return "entier"
+    if all(isinstance(valeur, str) for valeur in presentes):
+        return "texte" if nom in COLONNES_TEXTE else "chaine"
+    return "json"
+
+def encoder_catalogue(documents, sequence):
+    noms = list(OrderedDict((cle, None) for doc in documents for cle in doc))
+    chaines, textes_chaines = {}, []
+    
+    def interner(valeur):
+        if valeur is ABSENT:
+            return INDICE_ABSENT
+        if valeur is None:
+            return INDICE_NUL
+        indice = chaines.get(valeur)
+        if indice is None:
+            indice = chaines[valeur] = len(textes_chaines)
+            textes_chaines.append(valeur.encode('utf-8'))
+        return indice
+    
+    encoder_json = json.JSONEncoder(ensure_ascii=False).encode
+    colonnes_fixes, colonnes_blocs, repertoire = [], [], []
+    for nom in noms:
+        valeurs = [doc.get(nom, ABSENT) for doc in documents]
+        type_valeurs = type_colonne(nom, valeurs)
+        if type_valeurs == "chaine":
+            colonnes_fixes.append((nom, type_valeurs, tableau_octets(array('I', map(interner, valeurs)))))
+        elif type_valeurs == "entier":
+            colonnes_fixes.append((nom, type_valeurs, tableau_octets(array('q', (
+                ENTIER_ABSENT if valeur is ABSENT else ENTIER_NUL if valeur is None else valeur for valeur in valeurs
+            )))))
+        else:
+            blocs, index_valeurs, morceaux, longueur = [], array('I'), [], 0
+            for valeur in valeurs:
+                if valeur is ABSENT or (valeur is None and type_valeurs == "texte"):
+                    index_valeurs.extend((len(blocs), 0, INDICE_ABSENT if valeur is ABSENT else INDICE_NUL))
                     continue
-        return texte.strip()
-    except Exception as e:
-        return f"[Erreur PDF: {str(e)}]"
+                if type_valeurs == "json":
+                    valeur = encoder_json(valeur)
+                    if morceaux:
+                        morceaux.append(",")
+                        longueur += 1
+                index_valeurs.extend((len(blocs), longueur, len(valeur)))
+                morceaux.append(valeur)
+                longueur += len(valeur)
+                if longueur >= CONFIG["catalogue_bloc_octets"]:
+                    blocs.append(zlib.compress(''.join(morceaux).encode('utf-8'), CONFIG["catalogue_compression"]))
+                    morceaux, longueur = [], 0
+            if morceaux:
+                blocs.append(zlib.compress(''.join(morceaux).encode('utf-8'), CONFIG["catalogue_compression"]))
+            colonnes_fixes.append((nom, type_valeurs, tableau_octets(index_valeurs)))
+            colonnes_blocs.append((nom, blocs))
+    
+    ordre_ids = sorted(
+        (position for position, doc in enumerate(documents) if isinstance(doc.get('id'), str)),
+        key=lambda position: documents[position]['id']
+    )
+    
+    donnees = bytearray()
+    
+    def ajouter(contenu):
+        debut = len(donnees)
+        donnees.extend(contenu)
+        donnees.extend(b"\0" * (-len(donnees) % 8))
+        return debut
+    
+    decalages = array('Q', [0])
+    for texte in textes_chaines:
+        decalages.append(decalages[-1] + len(texte))
+    description_chaines = {
+        "nombre": len(textes_chaines),
+        "decalages": ajouter(tableau_octets(decalages)),
+        "octets": ajouter(b"".join(textes_chaines))
+    }
+    description_ordre = ajouter(tableau_octets(array('I', ordre_ids)))
+    for nom, type_valeurs, contenu in colonnes_fixes:
+        repertoire.append({"nom": nom, "type": type_valeurs, "decalage": ajouter(contenu)})
+    fin_controle = len(donnees)
+    
+    colonnes = {colonne["nom"]: colonne for colonne in repertoire}
+    for nom, blocs in colonnes_blocs:
+        positions = array('Q', [0])
+        for bloc in blocs:
+            positions.append(positions[-1] + len(bloc))
+        colonnes[nom]["blocs"] = ajouter(tableau_octets(positions))
+        colonnes[nom]["nombre_blocs"] = len(blocs)
+        colonnes[nom]["donnees_blocs"] = ajouter(b"".join(blocs))
+    
+    description = json.dumps({
+        "colonnes": repertoire,
+        "chaines": description_chaines,
+        "ordre_ids": description_ordre,
+        "fin_controle": fin_controle
+    }, ensure_ascii=False).encode('utf-8')
+    description += b" " * (-(ENTETE_CATALOGUE.size + len(description)) % 8)
+    somme = hashlib.sha256(description + bytes(memoryview(donnees)[:fin_controle])).digest()
+    entete = ENTETE_CATALOGUE.pack(MAGIC_CATALOGUE, VERSION_CATALOGUE, 0, sequence, len(documents), ENTETE_CATALOGUE.size, len(description), somme)
+    return entete + description + bytes(donnees)
 
-def extraire_texte_simple(chemin_fichier):
+class CatalogueBinaire:
+    def __init__(self, fichier):
+        self.fichier = fichier
+        with open(fichier, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.charger_repertoire()
+        except BaseException:
+            self.mmap.close()
+            raise
+        self.chaines = {}
+        self.blocs = OrderedDict()
+        self.verrou = threading.Lock()
+    
+    def charger_repertoire(self):
+        if len(self.mmap) < ENTETE_CATALOGUE.size:
+            raise ErreurStockage(f"Catalogue binaire tronqué: {self.fichier}")
+        magic, version, _, self.sequence, self.nombre, debut, taille, somme = ENTETE_CATALOGUE.unpack_from(self.mmap, 0)
+        if magic != MAGIC_CATALOGUE or version != VERSION_CATALOGUE:
+            raise ErreurStockage(f"Format de catalogue inconnu: {self.fichier}")
+        description = json.loads(self.mmap[debut:debut + taille].decode('utf-8'))
+        self.debut_donnees = debut + taille
+        fin_controle = self.debut_donnees + description["fin_controle"]
+        if fin_controle > len(self.mmap) or hashlib.sha256(memoryview(self.mmap)[debut:fin_controle]).digest() != somme:
+            raise ErreurStockage(f"Somme de contrôle invalide: {self.fichier}")
+        self.colonnes = OrderedDict((colonne["nom"], colonne) for colonne in description["colonnes"])
+        chaines = description["chaines"]
+        self.nombre_chaines = chaines["nombre"]
+        self.decalages_chaines = self.tableau('Q', chaines["decalages"], self.nombre_chaines + 1)
+        self.debut_chaines = self.debut_donnees + chaines["octets"]
+        self.ordre_ids = self.tableau('I', description["ordre_ids"], self.nombre if 'id' in self.colonnes else 0)
+    
+    def tableau(self, code, decalage, nombre):
+        debut = self.debut_donnees + decalage
+        vue = memoryview(self.mmap)[debut:debut + nombre * array(code).itemsize].cast(code)
+        if sys.byteorder != 'little':
+            vue = array(code, vue.tobytes())
+            vue.byteswap()
+        return vue
+    
+    def fermer(self):
+        self.decalages_chaines = self.ordre_ids = None
+        try:
+            self.mmap.close()
+        except BufferError:
+            pass
+    
+    def __len__(self):
+        return self.nombre
+    
+    def chaine(self, indice):
+        if indice == INDICE_ABSENT:
+            return ABSENT
+        if indice == INDICE_NUL:
+            return None
+        valeur = self.chaines.get(indice)
+        if valeur is None:
+            valeur = self.chaines[indice] = self.mmap[
+                self.debut_chaines + self.decalages_chaines[indice]:self.debut_chaines + self.decalages_chaines[indice + 1]
+            ].decode('utf-8')
+        return valeur
+    
+    def bloc(self, colonne, numero):
+        cle = (colonne["nom"], numero)
+        with self.verrou:
+            contenu = self.blocs.get(cle)
+            if contenu is not None:
+                self.blocs.move_to_end(cle)
+                return contenu
+        positions = self.tableau('Q', colonne["blocs"], colonne["nombre_blocs"] + 1)
+        debut = self.debut_donnees + colonne["donnees_blocs"]
+        try:
+            contenu = zlib.decompress(self.mmap[debut + positions[numero]:debut + positions[numero + 1]]).decode('utf-8')
+        except (zlib.error, UnicodeDecodeError) as e:
+            raise ErreurStockage(f"Bloc {numero} de la colonne {colonne['nom']} illisible: {e}")
+        with self.verrou:
+            self.blocs[cle] = contenu
+            while len(self.blocs) > CONFIG["catalogue_blocs_en_cache"]:
+                self.blocs.popitem(last=False)
+        return contenu
+    
+    def valeurs(self, nom, positions=None):
+        colonne = self.colonnes.get(nom)
+        positions = range(self.nombre) if positions is None else positions
+        if colonne is None:
+            return [ABSENT for _ in positions]
+        type_valeurs = colonne["type"]
+        if type_valeurs == "chaine":
+            indices = self.tableau('I', colonne["decalage"], self.nombre)
+            return [self.chaine(indices[position]) for position in positions]
+        if type_valeurs == "entier":
+            entiers = self.tableau('q', colonne["decalage"], self.nombre)
+            return [
+                ABSENT if valeur == ENTIER_ABSENT else None if valeur == ENTIER_NUL else valeur
+                for valeur in (entiers[position] for position in positions)
+            ]
+        
+        index_valeurs = self.tableau('I', colonne["decalage"], self.nombre * 3)
+        if type_valeurs == "json" and isinstance(positions, range) and len(positions) == self.nombre:
+            decodes = iter([
+                valeur
+                for numero in range(colonne["nombre_blocs"])
+                for valeur in json.loads("[" + self.bloc(colonne, numero) + "]")
+            ])
+            return [ABSENT if index_valeurs[position * 3 + 2] == INDICE_ABSENT else next(decodes) for position in positions]
+        
+        resultat = []
+        for position in positions:
+            numero, debut, longueur = index_valeurs[position * 3:position * 3 + 3]
+            if longueur == INDICE_ABSENT:
+                resultat.append(ABSENT)
+            elif longueur == INDICE_NUL:
+                resultat.append(None)
+            else:
+                brut = self.bloc(colonne, numero)[debut:debut + longueur]
+                resultat.append(brut if type_valeurs == "texte" else json.loads(brut))
+        return resultat
+    
+    def colonne(self, nom, defaut=None):
+        return [defaut if valeur is ABSENT else valeur for valeur in self.valeurs(nom)]
+    
+    def enregistrements(self, positions=None, champs=None):
+        positions = range(self.nombre) if positions is None else positions
+        noms = [nom for nom in self.colonnes if champs is None or nom in champs]
+        colonnes = [self.valeurs(nom, positions) for nom in noms]
+        return [
+            {nom: valeur for nom, valeur in zip(noms, ligne) if valeur is not ABSENT}
+            for ligne in zip(*colonnes)
+        ] if noms else [{} for _ in positions]
+    
+    def position(self, document_id):
+        indices = self.tableau('I', self.colonnes['id']["decalage"], self.nombre) if 'id' in self.colonnes else None
+        bas, haut = 0, len(self.ordre_ids)
+        while bas < haut:
+            milieu = (bas + haut) // 2
+            valeur = self.chaine(indices[self.ordre_ids[milieu]])
+            if valeur < document_id:
+                bas = milieu + 1
+            else:
+                haut = milieu
+        if bas < len(self.ordre_ids) and self.chaine(indices[self.ordre_ids[bas]]) == document_id:
+            return self.ordre_ids[bas]
+        return None
+
+class VueCatalogue:
+    def __init__(self, catalogue, enregistrements, sequence, fin):
+        self.catalogue = catalogue
+        self.modifies, self.ajoutes, self.supprimes, self.positions = {}, OrderedDict(), set(), {}
+        self.appliquer(enregistrements, sequence, fin)
+    
+    def appliquer(self, enregistrements, sequence, fin):
+        self.sequence, self.fin = sequence, fin
+        for enregistrement in enregistrements:
+            for doc in enregistrement["ecrire"]:
+                if doc['id'] not in self.ajoutes and doc['id'] not in self.supprimes and self.position(doc['id']) is not None:
+                    self.modifies[doc['id']] = doc
+                else:
+                    self.ajoutes[doc['id']] = doc
+            for document_id in enregistrement["supprimer"]:
+                if self.ajoutes.pop(document_id, None) is None and self.position(document_id) is not None:
+                    self.modifies.pop(document_id, None)
+                    self.supprimes.add(document_id)
+        self.remplacements = {self.positions[document_id]: doc for document_id, doc in self.modifies.items()}
+        self.remplacements.update((self.positions[document_id], None) for document_id in self.supprimes)
+    
+    def position(self, document_id):
+        if document_id not in self.positions:
+            self.positions[document_id] = self.catalogue.position(document_id)
+        return self.positions[document_id]
+    
+    def __len__(self):
+        return len(self.catalogue) - len(self.supprimes) + len(self.ajoutes)
+    
+    def colonne(self, nom, defaut=None):
+        valeurs = self.catalogue.colonne(nom, defaut)
+        if self.remplacements:
+            valeurs = [
+                valeur if position not in self.remplacements else self.remplacements[position].get(nom, defaut)
+                for position, valeur in enumerate(valeurs)
+                if self.remplacements.get(position, True) is not None
+            ]
+        return valeurs + [doc.get(nom, defaut) for doc in self.ajoutes.values()]
+    
+    def document(self, document_id, champs=None):
+        if document_id in self.ajoutes or document_id in self.modifies:
+            return dict(self.ajoutes.get(document_id) or self.modifies[document_id])
+        position = self.position(document_id)
+        if position is None or document_id in self.supprimes:
+            return None
+        return self.catalogue.enregistrements([position], champs)[0]
+
+ETAT_CATALOGUE_BINAIRE = {"catalogues": {}, "cle_vue": None, "vue": None}
+
+def cle_fichier(fichier):
     try:
-        texte = ""
-        extension = os.path.splitext(chemin_fichier)[1].lower()
+        etat = os.stat(fichier)
+    except FileNotFoundError:
+        return None
+    return (etat.st_ino, etat.st_size, etat.st_mtime_ns)
+
+def fermer_catalogue_binaire(fichier):
+    with VERROU_STOCKAGE:
+        entree = ETAT_CATALOGUE_BINAIRE["catalogues"].pop(fichier, None)
+        if entree is not None:
+            entree[1].fermer()
+            ETAT_CATALOGUE_BINAIRE["cle_vue"] = ETAT_CATALOGUE_BINAIRE["vue"] = None
+
+def ouvrir_catalogue_binaire(fichier):
+    with VERROU_STOCKAGE:
+        cle = cle_fichier(fichier)
+        entree = ETAT_CATALOGUE_BINAIRE["catalogues"].get(fichier)
+        if entree is not None and entree[0] == cle:
+            return entree[1]
+        fermer_catalogue_binaire(fichier)
+        catalogue = CatalogueBinaire(fichier)
+        ETAT_CATALOGUE_BINAIRE["catalogues"][fichier] = (cle, catalogue)
+        return catalogue
+
+def ouvrir_vue_catalogue():
+    if not est_catalogue_binaire(FICHIER_INDEX):
+        return None
+    journal = fichier_journal(FICHIER_INDEX)
+    cle = (cle_fichier(FICHIER_INDEX), cle_fichier(journal))
+    if ETAT_CATALOGUE_BINAIRE["cle_vue"] == cle:
+        return ETAT_CATALOGUE_BINAIRE["vue"]
+    vue, cle_precedente = ETAT_CATALOGUE_BINAIRE["vue"], ETAT_CATALOGUE_BINAIRE["cle_vue"]
+    suite = vue is not None and cle_precedente[0] == cle[0] and cle[1] is not None and (
+        cle_precedente[1] is None or (cle_precedente[1][0] == cle[1][0] and cle[1][1] >= vue.fin)
+    )
+    try:
+        catalogue = ouvrir_catalogue_binaire(FICHIER_INDEX)
+        sequence, debut = (vue.sequence, vue.fin) if suite else (catalogue.sequence, 0)
+        enregistrements, sequence, complet, fin = lire_journal(journal, sequence, debut)
+    except (OSError, ValueError, ErreurStockage) as e:
+        logger.warning(f"Catalogue binaire inutilisable, lecture complète: {e}")
+        return None
+    if not complet:
+        return None
+    if suite:
+        vue.appliquer(enregistrements, sequence, fin)
+    else:
+        vue = VueCatalogue(catalogue, enregistrements, sequence, fin)
+    ETAT_CATALOGUE_BINAIRE["cle_vue"], ETAT_CATALOGUE_BINAIRE["vue"] = cle, vue
+    return vue
+
+def lire_colonnes_catalogue(champs):
+    with VERROU_STOCKAGE:
+        vue = ouvrir_vue_catalogue()
+        if vue is not None:
+            with METRIQUE_STOCKAGE_DUREE.chronometrer(operation="colonnes", fichier=os.path.basename(FICHIER_INDEX)):
+                return {nom: vue.colonne(nom, defaut) for nom, defaut in champs.items()}
+    documents = charger_donnees(FICHIER_INDEX)
+    return {nom: [doc.get(nom, defaut) for doc in documents] for nom, defaut in champs.items()}
+
+def lire_document(document_id, champs=None):
+    with VERROU_STOCKAGE:
+        vue = ouvrir_vue_catalogue()
+        if vue is not None:
+            return vue.document(document_id, champs)
+    return obtenir_catalogue_par_id().get(document_id)
+
+def lire_instantane(fichier):
+    if est_catalogue_binaire(fichier):
+        with VERROU_STOCKAGE:
+            catalogue = ouvrir_catalogue_binaire(fichier)
+            return catalogue.enregistrements(), catalogue.sequence
+    with open(fichier, 'rb') as f:
+        contenu = f.read()
+    if not contenu.startswith(ENTETE_STOCKAGE):
+        return json.loads(contenu.decode('utf-8')), 0
+    entete, _, corps = contenu.partition(b"\n")
+    champs = dict(element.split('=', 1) for element in entete[len(ENTETE_STOCKAGE):].decode('ascii').split())
+    if hashlib.sha256(corps).hexdigest() != champs.get("sha256"):
+        raise ErreurStockage(f"Somme de contrôle invalide: {fichier}")
+    return json.loads(corps.decode('utf-8')), int(champs["sequence"])
+
+def lire_journal(journal, sequence, debut=0):
+    try:
+        with open(journal, 'rb') as f:
+            f.seek(debut)
+            lignes = f.read().split(b"\n")
+    except FileNotFoundError:
+        return [], sequence, True, 0
+    
+    enregistrements = []
+    fin = debut
+    for numero, ligne in enumerate(lignes):
+        if not ligne:
+            if numero < len(lignes) - 1:
+                fin += 1
+            continue
+        somme, _, corps = ligne.partition(b" ")
+        if hashlib.sha256(corps).hexdigest().encode('ascii') != somme:
+            if numero == len(lignes) - 1:
+                logger.warning(f"Dernière écriture incomplète ignorée dans {os.path.basename(journal)}")
+                break
+            logger.error(f"Journal corrompu à la ligne {numero + 1} de {os.path.basename(journal)}, relecture interrompue")
+            return enregistrements, sequence, False, fin
+        enregistrement = json.loads(corps.decode('utf-8'))
+        if enregistrement["sequence"] > sequence + 1:
+            logger.critical(f"Écritures {sequence + 1} à {enregistrement['sequence'] - 1} absentes de {os.path.basename(journal)}")
+            return enregistrements, sequence, False, fin
+        if enregistrement["sequence"] == sequence + 1:
+            enregistrements.append(enregistrement)
+            sequence = enregistrement["sequence"]
+        if numero < len(lignes) - 1:
+            fin += len(ligne) + 1
+    return enregistrements, sequence, True, fin
+
+def appliquer_journal(donnees, enregistrements):
+    documents = OrderedDict((doc['id'], doc) for doc in donnees)
+    for enregistrement in enregistrements:
+        for doc in enregistrement["ecrire"]:
+            documents[doc['id']] = doc
+        for document_id in enregistrement["supprimer"]:
+            documents.pop(document_id, None)
+    return list(documents.values())
+
+def lire_etat_stockage(fichier):
+    illisibles = []
+    for source in (fichier, fichier_precedent(fichier)):
+        try:
+            donnees, sequence = lire_instantane(source)
+        except FileNotFoundError:
+            continue
+        except (ValueError, UnicodeDecodeError, ErreurStockage) as e:
+            logger.error(f"Fichier illisible {os.path.basename(source)}: {e}")
+            illisibles.append(source)
+            continue
+        journaux = [fichier_journal(fichier)]
+        if source != fichier:
+            logger.warning(f"Reprise de {os.path.basename(fichier)} depuis l'instantané précédent")
+            journaux.insert(0, fichier_precedent(fichier_journal(fichier)))
+        enregistrements = []
+        for journal in journaux:
+            lus, sequence, complet, _ = lire_journal(journal, sequence)
+            enregistrements.extend(lus)
+            if not complet:
+                break
+        if enregistrements:
+            donnees = appliquer_journal(donnees, enregistrements)
+        return donnees, sequence, source
+    if illisibles:
+        raise ErreurStockage(f"Aucune version lisible de {os.path.basename(fichier)}")
+    return None, 0, None
+
+TYPES_SIMPLES = (str, int, float, bool, type(None))
+
+def empreinte_enregistrement(doc):
+    return hash(tuple(
+        (cle, type(valeur).__name__, valeur if isinstance(valeur, TYPES_SIMPLES) else json.dumps(valeur, ensure_ascii=False, sort_keys=True))
+        for cle, valeur in sorted(doc.items())
+    ))
+
+def memoriser_etat_journal(fichier, donnees, sequence):
+    ETAT_JOURNAUX[fichier] = {
+        "sequence": sequence,
+        "operations": 0,
+        "empreintes": OrderedDict((doc['id'], empreinte_enregistrement(doc)) for doc in donnees)
+    }
+
+def journalisable(donnees):
+    return isinstance(donnees, list) and all(isinstance(doc, dict) and 'id' in doc for doc in donnees)
+
+def charger_donnees(fichier, defaut=None):
+    with METRIQUE_STOCKAGE_DUREE.chronometrer(operation="chargement", fichier=os.path.basename(fichier)):
+        with VERROU_STOCKAGE:
+            donnees, sequence, _ = lire_etat_stockage(fichier)
+            if fichier in FICHIERS_JOURNALISES and fichier not in ETAT_JOURNAUX and donnees is not None and journalisable(donnees):
+                memoriser_etat_journal(fichier, donnees, sequence)
+    if donnees is None:
+        return [] if defaut is None else defaut
+    return donnees
+
+GENERATION_CATALOGUE = 0
+
+def signaler_modification_catalogue():
+    global GENERATION_CATALOGUE
+    GENERATION_CATALOGUE += 1
+
+def ecrire_instantane(fichier, donnees, sequence):
+    journalise = fichier in FICHIERS_JOURNALISES
+    if journalise and CONFIG["catalogue_binaire"] and journalisable(donnees):
+        contenu = encoder_catalogue(donnees, sequence)
+    else:
+        contenu = json.dumps(donnees, ensure_ascii=False, indent=2).encode('utf-8')
+        contenu = ENTETE_STOCKAGE + f"sequence={sequence} sha256={hashlib.sha256(contenu).hexdigest()}\n".encode('ascii') + contenu
+    fermer_catalogue_binaire(fichier)
+    fermer_catalogue_binaire(fichier_precedent(fichier))
+    ecrire_fichier_atomique(fichier, contenu, fichier_precedent(fichier) if journalise else None)
+    if journalise and os.path.exists(fichier_journal(fichier)):
+        os.replace(fichier_journal(fichier), fichier_precedent(fichier_journal(fichier)))
+        synchroniser_dossier(os.path.dirname(fichier))
+
+def ecritures_journal(etat, donnees):
+    empreintes = OrderedDict((doc['id'], empreinte_enregistrement(doc)) for doc in donnees)
+    if len(empreintes) != len(donnees):
+        return None
+    conserves = [document_id for document_id in etat["empreintes"] if document_id in empreintes]
+    if conserves != list(empreintes)[:len(conserves)]:
+        return None
+    ecrire = [doc for doc in donnees if etat["empreintes"].get(doc['id']) != empreintes[doc['id']]]
+    supprimer = [document_id for document_id in etat["empreintes"] if document_id not in empreintes]
+    return ecrire, supprimer, empreintes
+
+def ajouter_au_journal(fichier, enregistrement):
+    corps = json.dumps(enregistrement, ensure_ascii=False).encode('utf-8')
+    with open(fichier_journal(fichier), 'ab') as f:
+        f.write(hashlib.sha256(corps).hexdigest().encode('ascii') + b" " + corps + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+def sauvegarder_donnees(fichier, donnees):
+    with METRIQUE_STOCKAGE_DUREE.chronometrer(operation="sauvegarde", fichier=os.path.basename(fichier)):
+        with VERROU_STOCKAGE:
+            etat = ETAT_JOURNAUX.get(fichier)
+            ecritures = ecritures_journal(etat, donnees) if etat is not None and journalisable(donnees) else None
+            if ecritures is None:
+                sequence = (etat["sequence"] if etat is not None else lire_etat_stockage(fichier)[1]) + 1 if fichier in FICHIERS_JOURNALISES else 0
+                ecrire_instantane(fichier, donnees, sequence)
+                if fichier in FICHIERS_JOURNALISES and journalisable(donnees):
+                    memoriser_etat_journal(fichier, donnees, sequence)
+            else:
+                ecrire, supprimer, empreintes = ecritures
+                if ecrire or supprimer:
+                    sequence = etat["sequence"] + 1
+                    taille = ajouter_au_journal(fichier, {"sequence": sequence, "ecrire": ecrire, "supprimer": supprimer})
+                    etat.update(sequence=sequence, operations=etat["operations"] + len(ecrire) + len(supprimer), empreintes=empreintes)
+                    if etat["operations"] >= CONFIG["stockage_compactage_operations"] or taille >= CONFIG["stockage_compactage_octets"]:
+                        with METRIQUE_STOCKAGE_DUREE.chronometrer(operation="compactage", fichier=os.path.basename(fichier)):
+                            ecrire_instantane(fichier, donnees, sequence)
+                        etat["operations"] = 0
+    if fichier == FICHIER_INDEX:
+        signaler_modification_catalogue()
+
+def journaliser_documents(fichier, ecrire=(), supprimer=()):
+    with METRIQUE_STOCKAGE_DUREE.chronometrer(operation="journalisation", fichier=os.path.basename(fichier)):
+        with VERROU_STOCKAGE:
+            etat = ETAT_JOURNAUX.get(fichier)
+            if etat is None:
+                donnees = charger_donnees(fichier)
+                etat = ETAT_JOURNAUX.get(fichier)
+                if etat is None:
+                    sauvegarder_donnees(fichier, appliquer_journal(donnees, [{"ecrire": list(ecrire), "supprimer": list(supprimer)}]))
+                    return
+            empreintes = {doc['id']: empreinte_enregistrement(doc) for doc in ecrire}
+            ecrire = [doc for doc in ecrire if etat["empreintes"].get(doc['id']) != empreintes[doc['id']]]
+            supprimer = [document_id for document_id in supprimer if document_id in etat["empreintes"]]
+            if not (ecrire or supprimer):
+                return
+            sequence = etat["sequence"] + 1
+            taille = ajouter_au_journal(fichier, {"sequence": sequence, "ecrire": ecrire, "supprimer": supprimer})
+            for doc in ecrire:
+                etat["empreintes"][doc['id']] = empreintes[doc['id']]
+            for document_id in supprimer:
+                del etat["empreintes"][document_id]
+            etat.update(sequence=sequence, operations=etat["operations"] + len(ecrire) + len(supprimer))
+            if taille >= max(CONFIG["stockage_compactage_octets"], os.path.getsize(fichier) if os.path.exists(fichier) else 0):
+                with METRIQUE_STOCKAGE_DUREE.chronometrer(operation="compactage", fichier=os.path.basename(fichier)):
+                    ecrire_instantane(fichier, lire_etat_stockage(fichier)[0], sequence)
+                etat["operations"] = 0
+    if fichier == FICHIER_INDEX:
+        signaler_modification_catalogue()
+
+def migrer_catalogue():
+    ancien = FICHIER_INDEX_JSON if FICHIER_INDEX == FICHIER_INDEX_BINAIRE else FICHIER_INDEX_BINAIRE
+    if not os.path.exists(ancien):
+        return
+    with VERROU_STOCKAGE:
+        try:
+            donnees, sequence, source = lire_etat_stockage(ancien)
+            actuel = lire_etat_stockage(FICHIER_INDEX)
+        except ErreurStockage as e:
+            logger.critical(f"{e} : migration du catalogue impossible")
+            return
+        finally:
+            fermer_catalogue_binaire(ancien)
+            fermer_catalogue_binaire(fichier_precedent(ancien))
+        if source is None or donnees is None or (actuel[2] is not None and actuel[1] >= sequence):
+            return
+        ecrire_instantane(FICHIER_INDEX, donnees, sequence)
+    logger.info(f"Catalogue migré de {os.path.basename(ancien)} vers {os.path.basename(FICHIER_INDEX)} ({len(donnees)} documents)")
+
+def recuperer_stockage():
+    migrer_catalogue()
+    for fichier in (FICHIER_INDEX, FICHIER_STATS, FICHIER_SPECIALITES, FICHIER_AVOCATS, FICHIER_SEGMENTS, FICHIER_UTILISATEURS):
+        dossier = os.path.dirname(fichier) or '.'
+        prefixe = os.path.basename(fichier) + "."
+        for nom in os.listdir(dossier):
+            if nom.startswith(prefixe) and nom.endswith(".tmp"):
+                os.remove(os.path.join(dossier, nom))
+        try:
+            with VERROU_STOCKAGE:
+                donnees, sequence, source = lire_etat_stockage(fichier)
+                conversion = fichier in FICHIERS_JOURNALISES and donnees is not None and journalisable(donnees) and est_catalogue_binaire(fichier) != CONFIG["catalogue_binaire"]
+                if source is not None and (source != fichier or os.path.exists(fichier_journal(fichier)) or conversion):
+                    ecrire_instantane(fichier, donnees, sequence)
+                    logger.info(f"{os.path.basename(fichier)} restauré jusqu'à l'écriture {sequence}")
+                if fichier in FICHIERS_JOURNALISES and donnees is not None and journalisable(donnees):
+                    memoriser_etat_journal(fichier, donnees, sequence)
+        except ErreurStockage as e:
+            logger.critical(f"{e} : restaurez une sauvegarde avant toute modification")
+
+recuperer_stockage()
+
+def score_moteur_pdf(moteur):
+    performance = PERFORMANCES_PDF[moteur]
+    reussite = 1 - performance["echecs"] / max(performance["documents"], 1)
+    return (performance["secondes_par_page"] or 0) / max(reussite, 0.1)
+
+def choisir_moteurs_pdf():
+    if CONFIG["pdf_moteur"] in PERFORMANCES_PDF:
+        return [CONFIG["pdf_moteur"]] + [m for m in MOTEURS_PDF if m != CONFIG["pdf_moteur"]]
+    with VERROU_PERFORMANCES_PDF:
+        ETAT_PERFORMANCES_PDF["documents"] += 1
+        numero = ETAT_PERFORMANCES_PDF["documents"]
+        a_essayer = [m for m in MOTEURS_PDF if PERFORMANCES_PDF[m]["documents"] < CONFIG["pdf_essais_moteur"]]
+        if a_essayer:
+            choix = min(a_essayer, key=lambda m: PERFORMANCES_PDF[m]["documents"])
+        elif numero % CONFIG["pdf_exploration"] == 0:
+            choix = min(MOTEURS_PDF, key=lambda m: PERFORMANCES_PDF[m]["dernier_usage"])
+        else:
+            choix = min(MOTEURS_PDF, key=score_moteur_pdf)
+        PERFORMANCES_PDF[choix]["dernier_usage"] = numero
+        return [choix] + sorted((m for m in MOTEURS_PDF if m != choix), key=score_moteur_pdf)
+
+def enregistrer_performance_pdf(moteur, pages, duree, echec=False):
+    with VERROU_PERFORMANCES_PDF:
+        performance = PERFORMANCES_PDF[moteur]
+        performance["documents"] += 1
+        if echec:
+            performance["echecs"] += 1
+            return
+        if not pages:
+            return
+        performance["pages"] += pages
+        mesure = duree / pages
+        if performance["secondes_par_page"] is None:
+            performance["secondes_par_page"] = mesure
+        else:
+            performance["secondes_par_page"] = 0.8 * performance["secondes_par_page"] + 0.2 * mesure
+
+def extraire_pages_pdf(moteur, chemin_fichier, delai_total=None):
+    if CONFIG["pdf_sous_processus"]:
+        return extraction_pdf.extraire_pages_isolees(
+            RESERVE_PDF, moteur, chemin_fichier, CONFIG["pdf_delai_page"],
+            delai_total=delai_total, incidents_max=CONFIG["pdf_incidents_max"]
+        )
+    pages = []
+    incidents = []
+    for message in extraction_pdf.iterer_pages(moteur, chemin_fichier):
+        if message["type"] == "page":
+            pages.append(message)
+        else:
+            incidents.append({"numero": message["numero"], "motif": "erreur", "erreur": message["erreur"]})
+    return pages, incidents
+
+def extraire_texte_pdf(chemin_fichier, delai_total=None):
+    if not MOTEURS_PDF:
+        return "[Aucun moteur PDF disponible]"
+    
+    erreur = None
+    for moteur in choisir_moteurs_pdf():
+        debut = time.perf_counter()
+        try:
+            pages, incidents = extraire_pages_pdf(moteur, chemin_fichier, delai_total)
+        except Exception as e:
+            enregistrer_performance_pdf(moteur, 0, 0, echec=True)
+            logger.warning(f"Moteur PDF {moteur} en échec sur {chemin_fichier}: {e}")
+            erreur = e
+            continue
+        enregistrer_performance_pdf(moteur, len(pages), time.perf_counter() - debut)
         
-        if extension == '.pdf':
-            texte = extraire_texte_pdf(chemin_fichier)
+        morceaux = []
+        for page in pages:
+            METRIQUE_EXTRACTION_PAGE.observer(page["duree"], etape=f"pdf_{moteur}")
+            if page["texte"].strip():
+                morceaux.append(f"--- Page {page['numero'] + 1} ---\n{page['texte']}\n\n")
+        METRIQUE_EXTRACTION_PAGES.inc(len(pages), etape=f"pdf_{moteur}")
+        for incident in incidents:
+            METRIQUE_EXTRACTION_INTERRUPTIONS.inc(extracteur="pdf_texte", motif=incident["motif"])
+            logger.warning(f"Page {incident['numero'] + 1} ignorée ({incident['motif']}) dans {chemin_fichier}")
+        return ''.join(morceaux).strip()
+    
+    METRIQUE_EXTRACTION_ERREURS.inc(extracteur="pdf_texte")
+    return f"[Erreur PDF: {str(erreur)}]"
+
+class DelaiExtractionDepasse(Exception):
+    pass
+
+class LimiteTexteAtteinte(Exception):
+    pass
+
+class SortieExtraction:
+    def __init__(self, delai, caracteres_max):
+        self.morceaux = []
+        self.caracteres = 0
+        self.caracteres_max = caracteres_max
+        self.delai = delai
+        self.echeance = time.monotonic() + delai
+    
+    def ecrire(self, texte):
+        if texte:
+            restant = self.caracteres_max - self.caracteres
+            if len(texte) >= restant:
+                self.morceaux.append(texte[:restant])
+                self.caracteres = self.caracteres_max
+                raise LimiteTexteAtteinte()
+            self.morceaux.append(texte)
+            self.caracteres += len(texte)
+        self.verifier()
+    
+    def verifier(self):
+        if time.monotonic() > self.echeance:
+            raise DelaiExtractionDepasse()
+    
+    def temps_restant(self):
+        return max(0.0, self.echeance - time.monotonic())
+    
+    def texte(self):
+        return ''.join(self.morceaux)
+
+EXTRACTEURS = {}
+
+def extracteur(*extensions, nom):
+    def enregistrer(fonction):
+        for extension in extensions:
+            EXTRACTEURS[extension] = {"nom": nom, "fonction": fonction}
+        return fonction
+    return enregistrer
+
+def limites_extraction(extension):
+    limites = CONFIG["extraction_limites"].get(extension, {})
+    return (
+        limites.get("taille_max", CONFIG["extraction_taille_max"]),
+        limites.get("delai", CONFIG["extraction_delai"]),
+        limites.get("caracteres_max", CONFIG["extraction_caracteres_max"])
+    )
+
+def ouvrir_membre_zip(archive, nom_membre):
+    info = archive.getinfo(nom_membre)
+    if info.file_size > CONFIG["extraction_taille_decompressee_max"]:
+        raise ValueError(f"{nom_membre} trop volumineux une fois décompressé ({info.file_size // (1024 * 1024)} Mo)")
+    return archive.open(info)
+
+def parcourir_blocs_xml(flux, balises_bloc):
+    pile = []
+    for evenement, element in ET.iterparse(flux, events=('start', 'end')):
+        if evenement == 'start':
+            pile.append(element)
+            continue
+        pile.pop()
+        if element.tag in balises_bloc:
+            yield element
+            if pile:
+                pile[-1].remove(element)
+
+@extracteur('.pdf', nom="pdf_texte")
+def extraire_pdf(chemin_fichier, sortie):
+    sortie.ecrire(extraire_texte_pdf(chemin_fichier, delai_total=sortie.temps_restant()))
+
+@extracteur('.txt', nom="txt")
+def extraire_txt(chemin_fichier, sortie):
+    for encodage in ('utf-8', 'latin-1'):
+        position = len(sortie.morceaux)
+        try:
+            with open(chemin_fichier, 'r', encoding=encodage) as f:
+                for bloc in iter(lambda: f.read(1024 * 1024), ''):
+                    sortie.ecrire(bloc)
+            return
+        except UnicodeDecodeError:
+            del sortie.morceaux[position:]
+            sortie.caracteres = sum(len(morceau) for morceau in sortie.morceaux)
+
+NS_WORD = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+@extracteur('.docx', nom="docx")
+def extraire_docx(chemin_fichier, sortie):
+    with zipfile.ZipFile(chemin_fichier) as archive:
+        with ouvrir_membre_zip(archive, 'word/document.xml') as flux:
+            for paragraphe in parcourir_blocs_xml(flux, {NS_WORD + 'p'}):
+                morceaux = []
+                for element in paragraphe.iter():
+                    if element.tag == NS_WORD + 't':
+                        morceaux.append(element.text or '')
+                    elif element.tag == NS_WORD + 'tab':
+                        morceaux.append('\t')
+                    elif element.tag in (NS_WORD + 'br', NS_WORD + 'cr'):
+                        morceaux.append('\n')
+                texte = ''.join(morceaux)
+                if texte.strip():
+                    sortie.ecrire(texte + '\n')
+                else:
+                    sortie.verifier()
+
+NS_ODF_TEXTE = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+
+def texte_element_odf(element):
+    morceaux = [element.text or '']
+    for enfant in element:
+        if enfant.tag == NS_ODF_TEXTE + 's':
+            morceaux.append(' ' * int(enfant.get(NS_ODF_TEXTE + 'c', 1)))
+        elif enfant.tag == NS_ODF_TEXTE + 'tab':
+            morceaux.append('\t')
+        elif enfant.tag == NS_ODF_TEXTE + 'line-break':
+            morceaux.append('\n')
+        else:
+            morceaux.append(texte_element_odf(enfant))
+        morceaux.append(enfant.tail or '')
+    return ''.join(morceaux)
+
+@extracteur('.odt', '.ods', '.odp', nom="odf")
+def extraire_odf(chemin_fichier, sortie):
+    with zipfile.ZipFile(chemin_fichier) as archive:
+        with ouvrir_membre_zip(archive, 'content.xml') as flux:
+            for bloc in parcourir_blocs_xml(flux, {NS_ODF_TEXTE + 'p', NS_ODF_TEXTE + 'h'}):
+                texte = texte_element_odf(bloc)
+                if texte.strip():
+                    sortie.ecrire(texte + '\n')
+                else:
+                    sortie.verifier()
+
+NS_TABLEUR = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_RELATIONS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_RELATIONS_PAQUET = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+def feuilles_xlsx(archive):
+    cibles = {}
+    if 'xl/_rels/workbook.xml.rels' in archive.namelist():
+        with ouvrir_membre_zip(archive, 'xl/_rels/workbook.xml.rels') as flux:
+            for relation in ET.parse(flux).getroot().iter(NS_RELATIONS_PAQUET + 'Relationship'):
+                cible = relation.get('Target', '')
+                cibles[relation.get('Id')] = cible.lstrip('/') if cible.startswith('/') else 'xl/' + cible
+    
+    feuilles = []
+    with ouvrir_membre_zip(archive, 'xl/workbook.xml') as flux:
+        for feuille in ET.parse(flux).getroot().iter(NS_TABLEUR + 'sheet'):
+            chemin = cibles.get(feuille.get(NS_RELATIONS + 'id'))
+            if chemin and chemin in archive.namelist():
+                feuilles.append((feuille.get('name', ''), chemin))
+    
+    if not feuilles:
+        noms = [nom for nom in archive.namelist() if re.match(r'xl/worksheets/sheet\d+\.xml$', nom)]
+        noms.sort(key=lambda nom: int(re.search(r'(\d+)', nom.rsplit('/', 1)[1]).group(1)))
+        feuilles = [(os.path.basename(nom)[:-4], nom) for nom in noms]
+    
+    return feuilles
+
+@extracteur('.xlsx', nom="xlsx")
+def extraire_xlsx(chemin_fichier, sortie):
+    with zipfile.ZipFile(chemin_fichier) as archive:
+        chaines = []
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            with ouvrir_membre_zip(archive, 'xl/sharedStrings.xml') as flux:
+                for element in parcourir_blocs_xml(flux, {NS_TABLEUR + 'si'}):
+                    chaines.append(''.join(t.text or '' for t in element.iter(NS_TABLEUR + 't')))
+                    if len(chaines) % 1000 == 0:
+                        sortie.verifier()
+        
+        for nom_feuille, chemin_feuille in feuilles_xlsx(archive):
+            sortie.ecrire(f"--- Feuille : {nom_feuille} ---\n")
+            with ouvrir_membre_zip(archive, chemin_feuille) as flux:
+                for ligne in parcourir_blocs_xml(flux, {NS_TABLEUR + 'row'}):
+                    valeurs = []
+                    for cellule in ligne.iter(NS_TABLEUR + 'c'):
+                        type_cellule = cellule.get('t')
+                        if type_cellule == 'inlineStr':
+                            valeurs.append(''.join(t.text or '' for t in cellule.iter(NS_TABLEUR + 't')))
+                            continue
+                        valeur = cellule.find(NS_TABLEUR + 'v')
+                        if valeur is None or valeur.text is None:
+                            continue
+                        if type_cellule == 's':
+                            indice = int(valeur.text)
+                            valeurs.append(chaines[indice] if indice < len(chaines) else '')
+                        else:
+                            valeurs.append(valeur.text)
+                    texte = '\t'.join(v for v in valeurs if v)
+                    if texte.strip():
+                        sortie.ecrire(texte + '\n')
+                    else:
+                        sortie.verifier()
+            sortie.ecrire('\n')
+
+NS_DESSIN = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+
+@extracteur('.pptx', nom="pptx")
+def extraire_pptx(chemin_fichier, sortie):
+    with zipfile.ZipFile(chemin_fichier) as archive:
+        diapositives = [nom for nom in archive.namelist() if re.match(r'ppt/slides/slide\d+\.xml$', nom)]
+        diapositives.sort(key=lambda nom: int(re.search(r'(\d+)\.xml$', nom).group(1)))
+        
+        for numero, nom in enumerate(diapositives, start=1):
+            sortie.ecrire(f"--- Page {numero} ---\n")
+            with ouvrir_membre_zip(archive, nom) as flux:
+                for paragraphe in parcourir_blocs_xml(flux, {NS_DESSIN + 'p'}):
+                    morceaux = []
+                    for element in paragraphe.iter():
+                        if element.tag == NS_DESSIN + 't':
+                            morceaux.append(element.text or '')
+                        elif element.tag == NS_DESSIN + 'br':
+                            morceaux.append('\n')
+                    texte = ''.join(morceaux)
+                    if texte.strip():
+                        sortie.ecrire(texte + '\n')
+            sortie.ecrire('\n')
+
+DESTINATIONS_RTF_IGNOREES = {
+    b'fonttbl', b'colortbl', b'stylesheet', b'info', b'pict', b'object', b'themedata',
+    b'colorschememapping', b'latentstyles', b'datastore', b'xmlnstbl', b'listtable',
+    b'listoverridetable', b'rsidtbl', b'generator', b'header', b'footer', b'headerl',
+    b'headerr', b'footerl', b'footerr', b'fldinst', b'bkmkstart', b'bkmkend', b'filetbl'
+}
+SYMBOLES_RTF = {b'par': '\n', b'line': '\n', b'sect': '\n\n', b'page': '\n\n', b'tab': '\t', b'cell': '\t', b'row': '\n', b'emdash': '—', b'endash': '–', b'bullet': '•', b'lquote': '‘', b'rquote': '’', b'ldblquote': '“', b'rdblquote': '”'}
+MOTIF_RTF = re.compile(rb"\\([a-zA-Z]+)(-?\d+)? ?|\\'([0-9a-fA-F]{2})|\\([^a-zA-Z])|([{}])|[\r\n]+|([^\\{}\r\n]+)")
+
+@extracteur('.rtf', nom="rtf")
+def extraire_rtf(chemin_fichier, sortie):
+    if os.path.getsize(chemin_fichier) == 0:
+        return
+    
+    with open(chemin_fichier, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as contenu:
+        pile = []
+        ignorer = False
+        saut_unicode = 1
+        a_sauter = 0
+        encodage = 'cp1252'
+        morceaux = []
         
-        elif extension == '.txt':
+        for correspondance in MOTIF_RTF.finditer(contenu):
+            mot, parametre, hexadecimal, symbole, accolade, texte = correspondance.groups()
+            
+            if accolade == b'{':
+                pile.append((ignorer, saut_unicode))
+                a_sauter = 0
+            elif accolade == b'}':
+                if pile:
+                    ignorer, saut_unicode = pile.pop()
+                a_sauter = 0
+            elif symbole is not None:
+                if symbole == b'*':
+                    ignorer = True
+                elif not ignorer and symbole in (b'\\', b'{', b'}'):
+                    morceaux.append(symbole.decode())
+                elif not ignorer and symbole == b'~':
+                    morceaux.append('\u00a0')
+                elif not ignorer and symbole == b'-':
+                    continue
+            elif mot is not None:
+                if mot in DESTINATIONS_RTF_IGNOREES:
+                    ignorer = True
+                elif mot == b'ansicpg' and parametre:
+                    encodage = f"cp{int(parametre)}"
+                elif mot == b'uc' and parametre:
+                    saut_unicode = int(parametre)
+                elif mot == b'u' and parametre:
+                    if not ignorer:
+                        morceaux.append(chr(int(parametre) % 65536))
+                    a_sauter = saut_unicode
+                elif not ignorer and mot in SYMBOLES_RTF:
+                    morceaux.append(SYMBOLES_RTF[mot])
+            elif hexadecimal is not None:
+                if a_sauter:
+                    a_sauter -= 1
+                elif not ignorer:
+                    morceaux.append(bytes.fromhex(hexadecimal.decode()).decode(encodage, errors='replace'))
+            elif texte is not None:
+                if a_sauter:
+                    retire = min(a_sauter, len(texte))
+                    texte = texte[retire:]
+                    a_sauter -= retire
+                if not ignorer and texte:
+                    morceaux.append(texte.decode(encodage, errors='replace'))
+            
+            if len(morceaux) >= 256:
+                sortie.ecrire(''.join(morceaux))
+                morceaux = []
+        
+        sortie.ecrire(''.join(morceaux))
+
+OUTILS_OFFICE_BINAIRE = {
+    '.doc': [['antiword', '-w', '0'], ['catdoc', '-w']],
+    '.xls': [['xls2csv', '-q', '0']],
+    '.ppt': [['catppt']],
+}
+MOTIF_CHAINES_UTF16 = re.compile(rb'(?:[\x20-\x7e\xa0-\xff\t\r\n]\x00){6,}')
+MOTIF_CHAINES_8BITS = re.compile(rb'[\x20-\x7e\xa0-\xff\t\r\n]{12,}')
+
+@extracteur('.doc', '.xls', '.ppt', nom="office_binaire")
+def extraire_office_binaire(chemin_fichier, sortie):
+    extension = os.path.splitext(chemin_fichier)[1].lower()
+    
+    for commande in OUTILS_OFFICE_BINAIRE.get(extension, []):
+        if shutil.which(commande[0]):
             try:
-                with open(chemin_fichier, 'r', encoding='utf-8') as f:
-                    texte = f.read()
-            except UnicodeDecodeError:
-                with open(chemin_fichier, 'r', encoding='latin-1') as f:
-                    texte = f.read()
+                resultat = subprocess.run(commande + [chemin_fichier], capture_output=True, timeout=sortie.temps_restant())
+            except subprocess.TimeoutExpired:
+                raise DelaiExtractionDepasse()
+            if resultat.returncode == 0 and resultat.stdout.strip():
+                sortie.ecrire(resultat.stdout.decode('utf-8', errors='replace'))
+                return
+    
+    if os.path.getsize(chemin_fichier) == 0:
+        return
+    
+    with open(chemin_fichier, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as contenu:
+        trouve = False
+        for correspondance in MOTIF_CHAINES_UTF16.finditer(contenu):
+            texte = correspondance.group().decode('utf-16-le', errors='ignore').strip()
+            if len(texte) >= 6 and sum(c.isalpha() for c in texte) >= len(texte) / 2:
+                sortie.ecrire(texte.replace('\r', '\n') + '\n')
+                trouve = True
+        
+        if not trouve:
+            for correspondance in MOTIF_CHAINES_8BITS.finditer(contenu):
+                texte = correspondance.group().decode('cp1252', errors='ignore').strip()
+                if sum(c.isalpha() for c in texte) >= len(texte) * 0.6:
+                    sortie.ecrire(texte.replace('\r', '\n') + '\n')
+
+def extraire_texte_simple(chemin_fichier):
+    extension = os.path.splitext(chemin_fichier)[1].lower()
+    definition = EXTRACTEURS.get(extension)
+    if not definition:
+        return "[Aucun contenu textuel extrait]"
+    
+    nom = definition["nom"]
+    taille_max, delai, caracteres_max = limites_extraction(extension)
+    
+    try:
+        taille = os.path.getsize(chemin_fichier)
+        if taille > taille_max:
+            METRIQUE_EXTRACTION_INTERRUPTIONS.inc(extracteur=nom, motif="taille")
+            logger.warning(f"Extraction ignorée, fichier trop volumineux ({taille // (1024 * 1024)} Mo): {chemin_fichier}")
+            return f"[Fichier trop volumineux pour l'extraction: {taille // (1024 * 1024)} Mo]"
         
-        elif extension == '.docx':
+        sortie = SortieExtraction(delai, caracteres_max)
+        with METRIQUE_EXTRACTION_DUREE.chronometrer(extracteur=nom):
             try:
-                import docx
-                doc = docx.Document(chemin_fichier)
-                for paragraph in doc.paragraphs:
-                    if paragraph.text.strip():
-                        texte += paragraph.text + "\n"
-            except ImportError:
-                texte = "[Document Word - python-docx non installé]"
+                definition["fonction"](chemin_fichier, sortie)
+            except LimiteTexteAtteinte:
+                METRIQUE_EXTRACTION_INTERRUPTIONS.inc(extracteur=nom, motif="caracteres")
+                logger.info(f"Texte tronqué à {caracteres_max} caractères: {chemin_fichier}")
+            except DelaiExtractionDepasse:
+                METRIQUE_EXTRACTION_INTERRUPTIONS.inc(extracteur=nom, motif="delai")
+                logger.warning(f"Extraction interrompue après {delai} s: {chemin_fichier}")
+                if not sortie.texte().strip():
+                    return f"[Extraction interrompue: délai de {delai} s dépassé]"
         
-        return texte.strip() if texte else "[Aucun contenu textuel extrait]"
+        texte = sortie.texte()
+        return texte.strip() if texte.strip() else "[Aucun contenu textuel extrait]"
     
     except Exception as e:
+        METRIQUE_EXTRACTION_ERREURS.inc(extracteur=nom)
         return f"[Erreur extraction: {str(e)}]"
 
+MOTS_VIDES_LANGUES = {
+    "fra": {"le", "la", "les", "des", "du", "et", "est", "une", "dans", "pour", "que", "qui", "par", "sur", "au", "aux", "avec", "ce", "cette", "pas", "sont", "il", "elle", "nous", "vous", "ne", "se", "leur", "ont", "été"},
+    "eng": {"the", "and", "of", "to", "is", "that", "for", "with", "as", "by", "this", "are", "be", "it", "was", "from", "at", "or", "which", "not", "have", "has", "shall", "will", "any", "such", "its", "been", "were", "their"}
+}
+
+def detecter_langue_ocr(texte, langues):
+    comptes = {langue: 0 for langue in langues if langue in MOTS_VIDES_LANGUES}
+    if len(comptes) < 2:
+        return None
+    for mot in re.findall(r"[a-zàâäéèêëîïôöùûüç]+", texte.lower()):
+        for langue in comptes:
+            if mot in MOTS_VIDES_LANGUES[langue]:
+                comptes[langue] += 1
+    classement = sorted(comptes.items(), key=lambda x: x[1], reverse=True)
+    langue, premier = classement[0]
+    if premier >= CONFIG["ocr_detection_mots_min"] and premier >= 4 * classement[1][1]:
+        return langue
+    return None
+
+def options_tesseract():
+    return f"--oem {CONFIG['ocr_oem']} --psm {CONFIG['ocr_psm']}"
+
+def choisir_dpi_ocr(chemin_fichier):
+    if not CONFIG["ocr_dpi_adaptatif"]:
+        return CONFIG["ocr_dpi"]
+    try:
+        taille = pdfinfo_from_path(chemin_fichier)["Page size"]
+        largeur, hauteur = [float(valeur) for valeur in re.findall(r"\d+(?:\.\d+)?", taille)[:2]]
+    except Exception:
+        return CONFIG["ocr_dpi"]
+    dpi = CONFIG["ocr_largeur_cible"] * 72 / min(largeur, hauteur)
+    return int(max(CONFIG["ocr_dpi_min"], min(CONFIG["ocr_dpi_max"], dpi)))
+
+def seuil_otsu(image):
+    histogramme = image.histogram()[:256]
+    total = sum(histogramme)
+    somme_totale = sum(niveau * nombre for niveau, nombre in enumerate(histogramme))
+    somme_fond = 0
+    poids_fond = 0
+    meilleur_seuil = 127
+    meilleure_variance = -1
+    for niveau, nombre in enumerate(histogramme):
+        poids_fond += nombre
+        if not poids_fond:
+            continue
+        poids_encre = total - poids_fond
+        if not poids_encre:
+            break
+        somme_fond += niveau * nombre
+        ecart = somme_fond / poids_fond - (somme_totale - somme_fond) / poids_encre
+        variance = poids_fond * poids_encre * ecart * ecart
+        if variance > meilleure_variance:
+            meilleure_variance = variance
+            meilleur_seuil = niveau
+    return meilleur_seuil
+
+def reduire_image(image, cote_max):
+    facteur = max(1, -(-max(image.size) // cote_max))
+    return image.reduce(facteur) if facteur > 1 else image, facteur
+
+def estimer_inclinaison(image, angle_max):
+    encre = ImageOps.invert(reduire_image(image, 1000)[0])
+    
+    def contraste_lignes(angle):
+        tournee = encre.rotate(angle, resample=Image.NEAREST, fillcolor=0)
+        profil = list(tournee.resize((1, tournee.height), Image.BOX).getdata())
+        return sum((a - b) * (a - b) for a, b in zip(profil, profil[1:]))
+    
+    meilleur = max(range(-angle_max, angle_max + 1), key=contraste_lignes)
+    return max((meilleur + pas / 5 for pas in range(-4, 5)), key=contraste_lignes)
+
+def recadrer_image(image):
+    reduite, facteur = reduire_image(image, 1000)
+    boite = ImageOps.invert(reduite).filter(ImageFilter.MedianFilter(3)).getbbox()
+    if not boite:
+        return None
+    marge = CONFIG["ocr_marge_recadrage"]
+    return image.crop((
+        max(0, boite[0] * facteur - marge),
+        max(0, boite[1] * facteur - marge),
+        min(image.width, boite[2] * facteur + marge),
+        min(image.height, boite[3] * facteur + marge)
+    ))
+
+def pretraiter_image_ocr(image):
+    if min(image.size) > CONFIG["ocr_cote_max_image"]:
+        rapport = CONFIG["ocr_cote_max_image"] / min(image.size)
+        image = image.resize((round(image.width * rapport), round(image.height * rapport)), Image.LANCZOS)
+    if not (CONFIG["ocr_niveaux_gris"] or CONFIG["ocr_binarisation"]):
+        return image
+    image = image.convert('L')
+    if CONFIG["ocr_binarisation"]:
+        seuil = seuil_otsu(image)
+        image = image.point([0 if niveau <= seuil else 255 for niveau in range(256)])
+    if CONFIG["ocr_redressement"]:
+        angle = estimer_inclinaison(image, CONFIG["ocr_angle_max"])
+        if abs(angle) >= 0.2:
+            image = image.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+    if CONFIG["ocr_recadrage"]:
+        image = recadrer_image(image)
+    return image
+
+def reconnaitre_images(images):
+    langues = CONFIG["ocr_langues"]
+    langue_choisie = not CONFIG["ocr_detection_langue"] or len(images) < 2
+    textes = []
+    for image in images:
+        with METRIQUE_EXTRACTION_PAGE.chronometrer(etape="pretraitement_ocr"):
+            image = pretraiter_image_ocr(image)
+        if image is None:
+            METRIQUE_EXTRACTION_PAGES.inc(etape="page_blanche")
+            textes.append('')
+            continue
+        with METRIQUE_EXTRACTION_PAGE.chronometrer(etape="tesseract"):
+            texte_page = pytesseract.image_to_string(image, lang=langues, config=options_tesseract())
+        METRIQUE_EXTRACTION_PAGES.inc(etape="tesseract")
+        textes.append(texte_page)
+        if not langue_choisie:
+            langue = detecter_langue_ocr(texte_page, langues.split('+'))
+            if langue:
+                langues = langue
+                langue_choisie = True
+    return textes
+
 def extraire_texte_ocr(chemin_fichier):
     if not OCR_DISPONIBLE:
         return extraire_texte_simple(chemin_fichier)
@@ -187,30 +1657,42 @@ def extraire_texte_ocr(chemin_fichier):
         extension = os.path.splitext(chemin_fichier)[1].lower()
         
         if extension == '.pdf':
-            texte = extraire_texte_pdf(chemin_fichier)
+            texte = extraire_texte_simple(chemin_fichier)
             
             if not texte or len(texte.strip()) < 100:
                 if PDF2IMAGE_DISPONIBLE:
                     try:
-                        images = convert_from_path(chemin_fichier, dpi=200)
-                        texte_ocr = ""
-                        for i, image in enumerate(images):
-                            texte_page = pytesseract.image_to_string(image, lang='fra+eng')
-                            texte_ocr += f"--- Page {i+1} (OCR) ---\n{texte_page}\n\n"
+                        with METRIQUE_EXTRACTION_DUREE.chronometrer(extracteur="pdf2image"):
+                            images = convert_from_path(
+                                chemin_fichier,
+                                dpi=choisir_dpi_ocr(chemin_fichier),
+                                grayscale=CONFIG["ocr_niveaux_gris"]
+                            )
+                        METRIQUE_EXTRACTION_PAGES.inc(len(images), etape="rasterisation")
+                        with METRIQUE_EXTRACTION_DUREE.chronometrer(extracteur="ocr_pdf"):
+                            textes = reconnaitre_images(images)
+                        texte_ocr = ''.join(
+                            f"--- Page {i+1} (OCR) ---\n{texte_page}\n\n"
+                            for i, texte_page in enumerate(textes)
+                            if texte_page.strip()
+                        )
                         
                         if texte_ocr.strip():
                             texte = texte_ocr
                     except Exception as e:
+                        METRIQUE_EXTRACTION_ERREURS.inc(extracteur="ocr_pdf")
                         if not texte:
                             texte = f"[OCR échoué: {str(e)}]"
         
         elif extension in ['.png', '.jpg', '.jpeg', '.tiff', '.bmp']:
             try:
-                image = Image.open(chemin_fichier)
-                texte = pytesseract.image_to_string(image, lang='fra+eng')
+                with METRIQUE_EXTRACTION_DUREE.chronometrer(extracteur="ocr_image"):
+                    image = Image.open(chemin_fichier)
+                    texte = reconnaitre_images([image])[0]
                 if not texte.strip():
                     texte = "[OCR n'a pu extraire de texte]"
             except Exception as e:
+                METRIQUE_EXTRACTION_ERREURS.inc(extracteur="ocr_image")
                 texte = f"[Erreur OCR: {str(e)}]"
         
         else:
@@ -221,156 +1703,682 @@ def extraire_texte_ocr(chemin_fichier):
     except Exception as e:
         return extraire_texte_simple(chemin_fichier)
 
-def recherche_flexible(terme):
-    logger.info(f"Recherche flexible pour: '{terme}'")
+def calculer_empreinte_fichier(chemin_fichier):
+    empreinte = hashlib.sha256()
+    with open(chemin_fichier, 'rb') as f:
+        for bloc in iter(lambda: f.read(1024 * 1024), b''):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+def index_par_empreinte(index):
+    return {doc['empreinte']: doc for doc in index if doc.get('empreinte') and doc.get('contenu_textuel')}
+
+class ContenusConnus:
+    def __init__(self, capacite):
+        colonnes = lire_colonnes_catalogue({"id": None, "empreinte": None})
+        self.ids = {empreinte: document_id for document_id, empreinte in zip(colonnes["id"], colonnes["empreinte"]) if empreinte and document_id}
+        self.recents = OrderedDict()
+        self.capacite = capacite
+        self.verrou = threading.Lock()
     
-    return {
-        "multi_match": {
-            "query": terme,
-            "fields": [
-                "nom^4",
-                "contenu_textuel^2",
-                "mots_cles^3",
-                "specialite^2",
-                "avocat^2",
-                "categorie^2"
-            ],
-            "fuzziness": "AUTO",
-            "operator": "and"
+    def get(self, empreinte):
+        with self.verrou:
+            doc = self.recents.get(empreinte)
+            document_id = self.ids.get(empreinte)
+        if doc is None and document_id is not None:
+            doc = lire_document(document_id)
+        if doc and doc.get('empreinte') == empreinte and doc.get('contenu_textuel'):
+            return doc
+        return None
+    
+    def setdefault(self, empreinte, doc):
+        with self.verrou:
+            if empreinte in self.recents or empreinte in self.ids:
+                return
+            self.recents[empreinte] = doc
+            while len(self.recents) > self.capacite:
+                ancienne, ancien = self.recents.popitem(last=False)
+                self.ids[ancienne] = ancien['id']
+
+def extraire_contenu_fichier(chemin_fichier, extension, documents_connus=None):
+    empreinte = calculer_empreinte_fichier(chemin_fichier)
+    
+    existant = documents_connus.get(empreinte) if documents_connus else None
+    if existant:
+        logger.info(f"Contenu identique déjà extrait ({existant.get('id')}), extraction ignorée: {chemin_fichier}")
+        return {
+            "contenu_textuel": existant['contenu_textuel'],
+            "type_fichier": existant.get('type_fichier', 'standard'),
+            "empreinte": empreinte,
+            "signature_minhash": existant.get('signature_minhash') or calculer_signature_minhash(existant['contenu_textuel']),
+            "entites": existant.get('entites') or extraire_entites(existant['contenu_textuel']),
+            "reperes_pages": existant.get('reperes_pages') or reperes_pages(existant['contenu_textuel'])
         }
+    
+    contenu_textuel = extraire_texte_ocr(chemin_fichier)
+    type_fichier = "standard"
+    
+    if contenu_textuel and not contenu_textuel.startswith("["):
+        if OCR_DISPONIBLE and extension in ['.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.bmp']:
+            type_fichier = "OCR"
+        else:
+            type_fichier = "texte"
+    
+    return {
+        "contenu_textuel": contenu_textuel,
+        "type_fichier": type_fichier,
+        "empreinte": empreinte,
+        "signature_minhash": calculer_signature_minhash(contenu_textuel),
+        "entites": extraire_entites(contenu_textuel),
+        "reperes_pages": reperes_pages(contenu_textuel)
     }
 
-def analyser_requete_avancee(terme):
-    if not terme or not terme.strip():
-        return {"match_all": {}}
+MOTIF_MARQUEUR_PAGE = re.compile(r'--- Page (\d+)(?: \(OCR\))? ---')
+
+def reperes_pages(texte):
+    if not texte or texte.startswith('['):
+        return []
+    return [[marqueur.end(), int(marqueur.group(1))] for marqueur in MOTIF_MARQUEUR_PAGE.finditer(texte)]
+
+def shingles_texte(texte):
+    mots = re.findall(r'\w+', normaliser_suggestion(MOTIF_MARQUEUR_PAGE.sub(' ', texte)))
+    taille = CONFIG["similarite_taille_shingle"]
     
-    terme = terme.strip()
-    logger.info(f"Analyse requête: '{terme}'")
+    if len(mots) <= taille:
+        return {' '.join(mots)} if mots else set()
+    return {' '.join(mots[i:i + taille]) for i in range(len(mots) - taille + 1)}
+
+def calculer_signature_minhash(texte):
+    if not texte or texte.startswith("["):
+        return None
     
-    has_advanced_operators = any(op in terme for op in [':', '"', '-']) or ' OR ' in terme.upper() or ' AND ' in terme.upper()
+    shingles = shingles_texte(texte)
+    if not shingles:
+        return None
     
-    if not has_advanced_operators:
-        logger.info("Utilisation recherche flexible")
-        return recherche_flexible(terme)
+    nombre_casiers = CONFIG["similarite_permutations"]
+    vide = 1 << 64
+    minimums = [vide] * nombre_casiers
     
-    logger.info("Utilisation recherche avancée")
-    query = {"bool": {"must": [], "should": [], "must_not": [], "filter": []}}
+    for shingle in shingles:
+        valeur = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+        casier = valeur % nombre_casiers
+        valeur //= nombre_casiers
+        if valeur < minimums[casier]:
+            minimums[casier] = valeur
     
-    champ_pattern = r'(\w+):"([^"]+)"|(\w+):(\S+)'
-    champs_trouves = re.findall(champ_pattern, terme)
+    signature = []
+    for i in range(nombre_casiers):
+        distance = 0
+        while minimums[(i + distance) % nombre_casiers] == vide:
+            distance += 1
+        signature.append((minimums[(i + distance) % nombre_casiers] + distance * 0x9E3779B1) & 0xFFFFFFFF)
     
-    terme_restant = terme
-    for champ in champs_trouves:
-        champ_nom = champ[0] or champ[2]
-        champ_valeur = champ[1] or champ[3]
-        
-        terme_restant = terme_restant.replace(f'{champ_nom}:"{champ_valeur}"', '').replace(f'{champ_nom}:{champ_valeur}', '').strip()
+    return ''.join(f'{valeur:08x}' for valeur in signature)
+
+def estimer_similarite(signature_a, signature_b):
+    if not signature_a or not signature_b or len(signature_a) != len(signature_b):
+        return 0.0
+    
+    nombre = len(signature_a) // 8
+    egales = sum(1 for i in range(0, len(signature_a), 8) if signature_a[i:i + 8] == signature_b[i:i + 8])
+    return egales / nombre
+
+class IndexSimilarite:
+    def __init__(self, bandes):
+        self.bandes = bandes
+        self.signatures = {}
+        self.casiers = {}
+    
+    def ajouter(self, doc_id, signature):
+        self.signatures[doc_id] = signature
+        largeur = len(signature) // self.bandes
+        for bande in range(self.bandes):
+            cle = (bande, signature[bande * largeur:(bande + 1) * largeur])
+            self.casiers.setdefault(cle, []).append(doc_id)
+    
+    def candidats(self, doc_id):
+        signature = self.signatures.get(doc_id)
+        if not signature:
+            return set()
         
-        mapping_champs = {
-            'titre': 'nom', 'nom': 'nom',
-            'contenu': 'contenu_textuel', 'texte': 'contenu_textuel',
-            'avocat': 'avocat', 'specialite': 'specialite',
-            'categorie': 'categorie', 'categ': 'categorie',
-            'motcle': 'mots_cles', 'tag': 'mots_cles'
-        }
+        largeur = len(signature) // self.bandes
+        trouves = set()
+        for bande in range(self.bandes):
+            trouves.update(self.casiers.get((bande, signature[bande * largeur:(bande + 1) * largeur]), []))
+        trouves.discard(doc_id)
+        return trouves
+    
+    def similaires(self, doc_id, seuil):
+        signature = self.signatures.get(doc_id)
+        resultats = []
+        for autre_id in self.candidats(doc_id):
+            similarite = estimer_similarite(signature, self.signatures[autre_id])
+            if similarite >= seuil:
+                resultats.append((autre_id, similarite))
+        resultats.sort(key=lambda x: x[1], reverse=True)
+        return resultats
+    
+    def groupes(self, seuil):
+        parents = {}
         
-        champ_es = mapping_champs.get(champ_nom.lower(), champ_nom.lower())
+        def trouver(doc_id):
+            racine = doc_id
+            while parents.get(racine, racine) != racine:
+                racine = parents[racine]
+            while doc_id != racine:
+                parents[doc_id], doc_id = racine, parents.get(doc_id, doc_id)
+            return racine
         
-        query["bool"]["must"].append({
-            "match_phrase" if ' ' in champ_valeur else "match": {
-                champ_es: champ_valeur
-            }
-        })
-    
-    if terme_restant.strip():
-        has_remaining_operators = any(op in terme_restant for op in ['"', '-']) or ' OR ' in terme_restant.upper() or ' AND ' in terme_restant.upper()
+        for membres in self.casiers.values():
+            if len(membres) < 2:
+                continue
+            for position in range(1, len(membres)):
+                autre = membres[position]
+                for reference in (membres[0], membres[position - 1]):
+                    racine_a, racine_b = trouver(reference), trouver(autre)
+                    if racine_a == racine_b:
+                        break
+                    if estimer_similarite(self.signatures[reference], self.signatures[autre]) >= seuil:
+                        parents[racine_b] = racine_a
+                        break
         
-        if not has_remaining_operators:
-            query["bool"]["must"].append(recherche_flexible(terme_restant))
-        else:
-            parties_or = [part.strip() for part in terme_restant.split(' OR ') if part.strip()]
-            
-            for partie in parties_or:
-                termes_positifs = []
-                termes_negatifs = []
-                
-                phrases_exactes = re.findall(r'"([^"]*)"', partie)
-                for phrase in phrases_exactes:
-                    termes_positifs.append(f'"{phrase}"')
-                    partie = partie.replace(f'"{phrase}"', '')
-                
-                mots = partie.split()
-                for mot in mots:
-                    if mot.startswith('-') and len(mot) > 1:
-                        termes_negatifs.append(mot[1:])
-                    elif mot not in ['OR', 'AND', '']:
-                        termes_positifs.append(mot)
-                
-                if termes_positifs:
-                    for terme_pos in termes_positifs:
-                        if terme_pos.startswith('"') and terme_pos.endswith('"'):
-                            phrase = terme_pos[1:-1]
-                            query["bool"]["must"].append({
-                                "multi_match": {
-                                    "query": phrase,
-                                    "fields": ["nom^3", "contenu_textuel^2", "mots_cles^2", "specialite", "avocat", "categorie"],
-                                    "type": "phrase"
-                                }
-                            })
-                        else:
-                            query["bool"]["must"].append({
-                                "multi_match": {
-                                    "query": terme_pos,
-                                    "fields": ["nom^3", "contenu_textuel^2", "mots_cles^2", "specialite", "avocat", "categorie"],
-                                    "fuzziness": "AUTO"
-                                }
-                            })
-                
-                for terme_neg in termes_negatifs:
-                    query["bool"]["must_not"].append({
-                        "multi_match": {
-                            "query": terme_neg,
-                            "fields": ["nom", "contenu_textuel", "mots_cles", "specialite", "avocat", "categorie"]
-                        }
-                    })
+        groupes = {}
+        for doc_id in self.signatures:
+            groupes.setdefault(trouver(doc_id), []).append(doc_id)
+        return [membres for membres in groupes.values() if len(membres) > 1]
+
+TYPES_ENTITES = ['numeros_rg', 'pourvois', 'juridictions', 'dates', 'siren', 'siret', 'parties']
+
+MOIS_FRANCAIS = {
+    'janvier': 1, 'février': 2, 'fevrier': 2, 'mars': 3, 'avril': 4, 'mai': 5, 'juin': 6,
+    'juillet': 7, 'août': 8, 'aout': 8, 'septembre': 9, 'octobre': 10, 'novembre': 11,
+    'décembre': 12, 'decembre': 12
+}
+
+JURIDICTIONS = [
+    (r"cour\s+de\s+cassation", "Cour de cassation", False),
+    (r"conseil\s+d['’][ée]tat", "Conseil d'État", False),
+    (r"conseil\s+constitutionnel", "Conseil constitutionnel", False),
+    (r"cour\s+administrative\s+d['’]appel", "Cour administrative d'appel", True),
+    (r"cour\s+d['’]appel", "Cour d'appel", True),
+    (r"cour\s+d['’]assises", "Cour d'assises", True),
+    (r"tribunal\s+judiciaire", "Tribunal judiciaire", True),
+    (r"tribunal\s+de\s+grande\s+instance", "Tribunal de grande instance", True),
+    (r"tribunal\s+d['’]instance", "Tribunal d'instance", True),
+    (r"tribunal\s+de\s+proximit[ée]", "Tribunal de proximité", True),
+    (r"tribunal\s+de\s+commerce", "Tribunal de commerce", True),
+    (r"tribunal\s+administratif", "Tribunal administratif", True),
+    (r"tribunal\s+correctionnel", "Tribunal correctionnel", True),
+    (r"conseil\s+de\s+prud['’]\s?hommes", "Conseil de prud'hommes", True),
+]
+
+MOTIF_VILLE = r"(?:\s+(?i:de|du|des|d['’])\s*([A-ZÉÈÊÂÎÔ][\w\-]+(?:[\s\-](?:sur|en|lès|les|la|le|de|du)[\s\-][A-ZÉÈÊÂÎÔ][\w\-]+)?))?"
+
+FORMES_SOCIETES = r"(?:SAS|SASU|SARL|EURL|SCI|SNC|SCP|SELARL|SELAS)"
+MOTIF_NOM_SOCIETE = r"(?!(?:" + FORMES_SOCIETES + r"|SA|SE)\b)[A-Z0-9ÀÂÄÇÉÈÊËÎÏÔÖÙÛÜ][\w&'’\-\.]*\w"
+
+MOTIFS_ENTITES = {
+    'numeros_rg': re.compile(r"\bR\.?\s?G\.?\s*(?:n[°o]\.?|N[°o]\.?)?\s*:?\s*(\d{2})\s*/\s*(\d{4,6})\b"),
+    'pourvois': re.compile(r"(?i:pourvoi)\s*(?:n[°o]\.?|N[°o]\.?)?\s*:?\s*([A-Z]\s?)?(\d{2})\s?-\s?(\d{2})\.?(\d{3})\b"),
+    'juridictions': [
+        (re.compile(r"\b(?i:" + motif + r")" + (MOTIF_VILLE if avec_ville else "")), canonique, avec_ville)
+        for motif, canonique, avec_ville in JURIDICTIONS
+    ],
+    'dates_texte': re.compile(r"\b(1er|\d{1,2})\s+(" + '|'.join(MOIS_FRANCAIS) + r")\s+(\d{4})\b", re.IGNORECASE),
+    'dates_numeriques': re.compile(r"\b(\d{1,2})[/.](\d{1,2})[/.](\d{4})\b"),
+    'siren': re.compile(r"(?:SIREN|RCS\s+(?:de\s+)?[A-ZÉÈ][\w\-]+(?:\s+[AB])?|immatricul[ée]+e?\s+sous\s+le\s+(?:num[ée]ro|n°))\s*(?:n[°o]\.?|:)?\s*:?\s*(\d{3}\s?\d{3}\s?\d{3})(?!\s?\d)"),
+    'siret': re.compile(r"SIRET\s*(?:n[°o]\.?|:)?\s*:?\s*(\d{3}\s?\d{3}\s?\d{3}\s?\d{5})\b"),
+    'personnes': re.compile(r"\b(?:M\.|Mme|Mlle|Monsieur|Madame|Mademoiselle)\s+((?:[A-ZÉÈ][a-zéèêëàâîïôöûüç]+(?:-[A-ZÉÈ][a-zéèêëàâîïôöûüç]+)?\s+)*[A-ZÉÈÊ][A-ZÉÈÊËÀÂÎÏÔÖÛÜÇ'\-]+(?:\s+[A-ZÉÈÊ][A-ZÉÈÊËÀÂÎÏÔÖÛÜÇ'\-]+)?)\b"),
+    'societes': re.compile(
+        r"\b(?:(?i:soci[ée]t[ée])|" + FORMES_SOCIETES + r")\s+"
+        r"(" + MOTIF_NOM_SOCIETE + r"(?:\s+(?:&\s+)?" + MOTIF_NOM_SOCIETE + r"){0,5})"
+    ),
+}
+
+def cle_luhn_valide(numero):
+    total = 0
+    for position, chiffre in enumerate(reversed(numero)):
+        valeur = int(chiffre)
+        if position % 2 == 1:
+            valeur *= 2
+            if valeur > 9:
+                valeur -= 9
+        total += valeur
+    return total % 10 == 0
+
+def formater_date_entite(jour, mois, annee):
+    try:
+        return datetime(int(annee), int(mois), int(jour)).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+def nommer_juridiction(canonique, ville):
+    if not ville:
+        return canonique
+    if ville.isupper():
+        ville = ville.title()
+    return f"{canonique} de {ville}"
+
+def canoniser_juridiction(texte):
+    for motif, canonique, avec_ville in MOTIFS_ENTITES['juridictions']:
+        texte = texte.strip()
+        correspondance = motif.match(texte)
+        if correspondance:
+            ville = correspondance.group(1) if avec_ville else None
+            reste = texte[correspondance.end():].strip()
+            if avec_ville and not ville and reste:
+                ville = re.sub(r"^(?i:de|du|des|d['’])\s*", '', reste).title()
+            return nommer_juridiction(canonique, ville)
+    return texte
+
+def extraire_entites(texte):
+    entites = {type_entite: [] for type_entite in TYPES_ENTITES}
+    if not texte or texte.startswith("["):
+        return entites
+    
+    texte = texte[:CONFIG["entites_taille_max_texte"]]
+    maximum = CONFIG["entites_max_par_type"]
+    
+    def ajouter(type_entite, valeur):
+        if valeur and valeur not in entites[type_entite] and len(entites[type_entite]) < maximum:
+            entites[type_entite].append(valeur)
+    
+    for m in MOTIFS_ENTITES['numeros_rg'].finditer(texte):
+        ajouter('numeros_rg', f"{m.group(1)}/{m.group(2)}")
+    
+    for m in MOTIFS_ENTITES['pourvois'].finditer(texte):
+        prefixe = (m.group(1) or '').strip()
+        ajouter('pourvois', f"{prefixe + ' ' if prefixe else ''}{m.group(2)}-{m.group(3)}.{m.group(4)}")
+    
+    for motif, canonique, avec_ville in MOTIFS_ENTITES['juridictions']:
+        for m in motif.finditer(texte):
+            ajouter('juridictions', nommer_juridiction(canonique, m.group(1) if avec_ville else None))
+    
+    for m in MOTIFS_ENTITES['dates_texte'].finditer(texte):
+        jour = 1 if m.group(1).lower() == '1er' else m.group(1)
+        ajouter('dates', formater_date_entite(jour, MOIS_FRANCAIS[m.group(2).lower()], m.group(3)))
+    
+    for m in MOTIFS_ENTITES['dates_numeriques'].finditer(texte):
+        ajouter('dates', formater_date_entite(m.group(1), m.group(2), m.group(3)))
+    
+    for m in MOTIFS_ENTITES['siret'].finditer(texte):
+        numero = re.sub(r'\s', '', m.group(1))
+        if cle_luhn_valide(numero):
+            ajouter('siret', numero)
+            ajouter('siren', numero[:9])
+    
+    for m in MOTIFS_ENTITES['siren'].finditer(texte):
+        numero = re.sub(r'\s', '', m.group(1))
+        if cle_luhn_valide(numero):
+            ajouter('siren', numero)
+    
+    for motif in (MOTIFS_ENTITES['personnes'], MOTIFS_ENTITES['societes']):
+        for m in motif.finditer(texte):
+            ajouter('parties', ' '.join(m.group(1).split()).rstrip('.'))
+    
+    entites['dates'].sort()
+    return entites
+
+def normaliser_valeur_entite(type_entite, valeur):
+    valeur = ' '.join(valeur.split())
+    if type_entite == 'juridictions':
+        valeur = canoniser_juridiction(valeur)
+    elif type_entite in ('siren', 'siret'):
+        valeur = re.sub(r'\s', '', valeur)
+    elif type_entite == 'dates':
+        m = re.match(r'^(\d{1,2})[/.](\d{1,2})[/.](\d{4})$', valeur)
+        if m:
+            valeur = formater_date_entite(m.group(1), m.group(2), m.group(3)) or valeur
+    elif type_entite == 'numeros_rg':
+        valeur = re.sub(r'\s*/\s*', '/', valeur)
+    return valeur
+
+def recherche_flexible(terme):
+    logger.info(f"Recherche flexible pour: '{terme}'")
+    
+    return {
+        "multi_match": {
+            "query": terme,
+            "fields": [
+                "nom^4",
+                "contenu_textuel^2",
+                "mots_cles^3",
+                "specialite^2",
+                "avocat^2",
+                "categorie^2"
+            ],
+            "fuzziness": "AUTO",
+            "operator": "and"
+        }
+    }
+
+CHAMPS_REQUETE = {
+    'titre': 'nom', 'nom': 'nom',
+    'contenu': 'contenu_textuel', 'texte': 'contenu_textuel', 'contenu_textuel': 'contenu_textuel',
+    'avocat': 'avocat', 'specialite': 'specialite', 'spécialité': 'specialite',
+    'categorie': 'categorie', 'catégorie': 'categorie', 'categ': 'categorie',
+    'motcle': 'mots_cles', 'mots_cles': 'mots_cles', 'tag': 'mots_cles'
+}
+OPERATEURS_REQUETE = {'OR': 'OU', 'OU': 'OU', 'AND': 'ET', 'ET': 'ET', 'NOT': 'NON', 'SAUF': 'NON'}
+MOTIF_MOT_REQUETE = re.compile(r'[^\s()"]+')
+CHAMPS_PHRASE = ["nom^3", "contenu_textuel^2", "mots_cles^2", "specialite", "avocat", "categorie"]
+CHAMPS_LOCAUX = ('nom', 'mots_cles', 'contenu_textuel')
+POIDS_CHAMPS_LOCAUX = {'nom': 3, 'mots_cles': 2}
+COUT_CHAMPS_LOCAUX = {'contenu_textuel': 10}
+
+def decouper_requete(terme):
+    jetons = []
+    position, fin = 0, len(terme)
+    while position < fin:
+        caractere = terme[position]
+        if caractere.isspace():
+            position += 1
+        elif caractere in '()':
+            jetons.append((caractere, None))
+            position += 1
+        elif caractere in '-+' and position + 1 < fin and not terme[position + 1].isspace() and terme[position + 1] not in '-+)':
+            if caractere == '-':
+                jetons.append(('NON', None))
+            position += 1
+        elif caractere == '"':
+            fermeture = terme.find('"', position + 1)
+            fermeture = fin if fermeture < 0 else fermeture
+            jetons.append(('phrase', terme[position + 1:fermeture]))
+            position = fermeture + 1
+        else:
+            mot = MOTIF_MOT_REQUETE.match(terme, position).group()
+            nom, separateur, reste = mot.partition(':')
+            champ = CHAMPS_REQUETE.get(nom.lower()) if separateur else None
+            if champ and (reste or terme[position + len(mot):position + len(mot) + 1] in ('"', '(')):
+                jetons.append(('champ', champ))
+                position += len(nom) + 1
+            else:
+                jetons.append((OPERATEURS_REQUETE.get(mot, 'mot'), mot))
+                position += len(mot)
+    return jetons
+
+def combiner_noeuds(type_noeud, enfants):
+    aplatis = []
+    for enfant in enfants:
+        if enfant is None:
+            continue
+        aplatis.extend(enfant["enfants"] if enfant["type"] == type_noeud else [enfant])
+    if not aplatis:
+        return None
+    return aplatis[0] if len(aplatis) == 1 else {"type": type_noeud, "enfants": aplatis}
+
+class AnalyseurRequete:
+    def __init__(self, jetons):
+        self.jetons = jetons
+        self.position = 0
+    
+    def suivant(self):
+        return self.jetons[self.position][0] if self.position < len(self.jetons) else None
+    
+    def analyser(self):
+        noeuds = []
+        while self.position < len(self.jetons):
+            noeuds.append(self.disjonction(None))
+            if self.suivant() == ')':
+                self.position += 1
+        return combiner_noeuds("et", noeuds) or {"type": "tout"}
+    
+    def disjonction(self, champ):
+        enfants = [self.conjonction(champ)]
+        while self.suivant() == 'OU':
+            self.position += 1
+            enfants.append(self.conjonction(champ))
+        return combiner_noeuds("ou", enfants)
+    
+    def conjonction(self, champ):
+        enfants = []
+        explicite = False
+        while self.suivant() not in (None, 'OU', ')'):
+            if self.suivant() == 'ET':
+                self.position += 1
+                explicite = True
+                continue
+            noeud = self.unaire(champ)
+            if noeud is not None and not explicite and enfants and noeud["type"] == enfants[-1]["type"] == "mots":
+                enfants[-1] = {"type": "mots", "valeurs": enfants[-1]["valeurs"] + noeud["valeurs"]}
+            elif noeud is not None:
+                enfants.append(noeud)
+            explicite = False
+        return combiner_noeuds("et", enfants)
+    
+    def unaire(self, champ):
+        if self.suivant() in (None, 'OU', 'ET', ')'):
+            return None
+        if self.suivant() == 'NON':
+            self.position += 1
+            enfant = self.unaire(champ)
+            return {"type": "non", "enfant": enfant} if enfant is not None else None
+        
+        type_jeton, valeur = self.jetons[self.position]
+        self.position += 1
+        if type_jeton == 'champ':
+            return self.unaire(valeur)
+        if type_jeton == '(':
+            noeud = self.disjonction(champ)
+            if self.suivant() == ')':
+                self.position += 1
+            return noeud
+        if type_jeton == 'phrase':
+            valeur = ' '.join(valeur.split())
+            return {"type": "phrase", "valeur": valeur, "champ": champ} if valeur else None
+        if '*' in valeur or '?' in valeur:
+            return {"type": "joker", "valeur": valeur.lower(), "champ": champ} if valeur.strip('*?') else None
+        if champ:
+            return {"type": "terme", "valeur": valeur, "champ": champ}
+        return {"type": "mots", "valeurs": [valeur]}
+
+def analyser_requete(terme):
+    return AnalyseurRequete(decouper_requete(terme)).analyser()
+
+def compiler_requete_elasticsearch(noeud):
+    type_noeud = noeud["type"]
+    if type_noeud == "tout":
+        return {"match_all": {}}
+    if type_noeud == "mots":
+        return recherche_flexible(' '.join(noeud["valeurs"]))
+    if type_noeud == "terme":
+        return {"match": {noeud["champ"]: noeud["valeur"]}}
+    if type_noeud == "phrase":
+        if noeud["champ"]:
+            return {"match_phrase": {noeud["champ"]: noeud["valeur"]}}
+        return {"multi_match": {"query": noeud["valeur"], "fields": CHAMPS_PHRASE, "type": "phrase"}}
+    if type_noeud == "joker":
+        clauses = [
+            {"wildcard": {champ: {"value": noeud["valeur"], "case_insensitive": True}}}
+            for champ in ([noeud["champ"]] if noeud["champ"] else [champ.split('^')[0] for champ in CHAMPS_PHRASE])
+        ]
+        return clauses[0] if len(clauses) == 1 else {"bool": {"should": clauses, "minimum_should_match": 1}}
+    if type_noeud == "non":
+        return {"bool": {"must_not": [compiler_exclusion_elasticsearch(noeud["enfant"])]}}
+    if type_noeud == "ou":
+        return {"bool": {"should": [compiler_requete_elasticsearch(enfant) for enfant in noeud["enfants"]], "minimum_should_match": 1}}
+    
+    positifs = [compiler_requete_elasticsearch(enfant) for enfant in noeud["enfants"] if enfant["type"] != "non"]
+    negatifs = [compiler_exclusion_elasticsearch(enfant["enfant"]) for enfant in noeud["enfants"] if enfant["type"] == "non"]
+    requete = {"must": positifs or [{"match_all": {}}]}
+    if negatifs:
+        requete["must_not"] = negatifs
+    return {"bool": requete}
+
+def compiler_exclusion_elasticsearch(noeud):
+    if noeud["type"] == "mots":
+        return {"multi_match": {"query": ' '.join(noeud["valeurs"]), "fields": [champ.split('^')[0] for champ in CHAMPS_PHRASE], "operator": "and"}}
+    return compiler_requete_elasticsearch(noeud)
+
+class TextesDocument:
+    __slots__ = ('doc', 'textes')
+    
+    def __init__(self, doc):
+        self.doc = doc
+        self.textes = {}
+    
+    def __getitem__(self, champ):
+        texte = self.textes.get(champ)
+        if texte is None:
+            valeur = self.doc.get(champ)
+            texte = '\n'.join(map(str, valeur)).lower() if isinstance(valeur, list) else str(valeur or '').lower()
+            self.textes[champ] = texte
+        return texte
+
+def motif_joker(valeur):
+    corps = ''.join(r'\w*' if c == '*' else r'\w' if c == '?' else re.escape(c) for c in valeur)
+    return re.compile(r'(?<!\w)' + corps + ('' if valeur[-1] in '*?' else r'(?!\w)'))
+
+def compiler_recherche_champs(type_noeud, valeur, champs, correspond):
+    poids = [(champ, POIDS_CHAMPS_LOCAUX.get(champ, 1)) for champ in champs]
+    
+    def evaluer(textes):
+        score = sum(points for champ, points in poids if correspond(textes[champ]))
+        return score or None
+    
+    cout = sum(COUT_CHAMPS_LOCAUX.get(champ, 1) for champ in champs) * (1 if type_noeud == "terme" else 2)
+    return evaluer, cout, {"operation": type_noeud, "valeur": valeur, "champs": list(champs), "cout": cout}
+
+def compiler_requete_locale(noeud):
+    type_noeud = noeud["type"]
+    if type_noeud == "tout":
+        return (lambda textes: 1), 0, {"operation": "tout", "cout": 0}
+    
+    if type_noeud == "mots":
+        mots = [mot.lower() for mot in noeud["valeurs"]]
+        
+        def evaluer_mots(textes):
+            score = trouves = 0
+            for champ, points in (('nom', 3), ('mots_cles', 2), ('contenu_textuel', 1)):
+                texte = textes[champ]
+                for mot in mots:
+                    if mot in texte:
+                        score += points
+                        trouves += 1
+            if trouves == len(mots):
+                score += 5
+            elif trouves >= len(mots) / 2:
+                score += 2
+            return score or None
+        
+        cout = 12 * len(mots)
+        return evaluer_mots, cout, {"operation": "mots", "valeurs": mots, "cout": cout}
+    
+    if type_noeud in ("terme", "phrase", "joker"):
+        champs = (noeud["champ"],) if noeud["champ"] else CHAMPS_LOCAUX
+        valeur = noeud["valeur"].lower()
+        if type_noeud == "terme":
+            correspond = lambda texte: valeur in texte
+        elif type_noeud == "phrase":
+            correspond = re.compile(r'\s+'.join(map(re.escape, valeur.split()))).search
+        else:
+            correspond = motif_joker(valeur).search
+        return compiler_recherche_champs(type_noeud, valeur, champs, correspond)
+    
+    if type_noeud == "non":
+        evaluer_enfant, cout, description = compiler_requete_locale(noeud["enfant"])
+        return (lambda textes: 0 if evaluer_enfant(textes) is None else None), cout, {"operation": "non", "enfant": description, "cout": cout}
+    
+    enfants = sorted((compiler_requete_locale(enfant) for enfant in noeud["enfants"]), key=lambda enfant: enfant[1])
+    evaluateurs = [enfant[0] for enfant in enfants]
+    cout = sum(enfant[1] for enfant in enfants)
+    
+    if type_noeud == "ou":
+        def evaluer_ou(textes):
+            scores = [score for score in (evaluer(textes) for evaluer in evaluateurs) if score is not None]
+            return sum(scores) if scores else None
+        return evaluer_ou, cout, {"operation": "ou", "enfants": [enfant[2] for enfant in enfants], "cout": cout}
+    
+    def evaluer_et(textes):
+        total = 0
+        for evaluer in evaluateurs:
+            score = evaluer(textes)
+            if score is None:
+                return None
+            total += score
+        return total
+    return evaluer_et, cout, {"operation": "et", "enfants": [enfant[2] for enfant in enfants], "cout": cout}
+
+COMPILATEURS_REQUETE = {
+    "elasticsearch": compiler_requete_elasticsearch,
+    "local": compiler_requete_locale
+}
+ETAT_REQUETES = {"plans": OrderedDict(), "succes": 0, "echecs": 0}
+VERROU_REQUETES = threading.Lock()
+
+def obtenir_plan_requete(terme, cible):
+    cle = ' '.join(terme.split())
+    with VERROU_REQUETES:
+        entree = ETAT_REQUETES["plans"].get(cle)
+        if entree is not None and cible in entree:
+            ETAT_REQUETES["plans"].move_to_end(cle)
+            ETAT_REQUETES["succes"] += 1
+            return entree[cible]
+    
+    entree = dict(entree or {"ast": analyser_requete(cle)})
+    if cible not in entree:
+        entree[cible] = COMPILATEURS_REQUETE[cible](entree["ast"])
+    
+    with VERROU_REQUETES:
+        plans = ETAT_REQUETES["plans"]
+        plans[cle] = {**plans.get(cle, {}), **entree}
+        plans.move_to_end(cle)
+        ETAT_REQUETES["echecs"] += 1
+        while len(plans) > CONFIG["requetes_cache_plans"]:
+            plans.popitem(last=False)
+    return entree[cible]
+
+def analyser_requete_avancee(terme):
+    return obtenir_plan_requete(terme or '', "elasticsearch")
+
+def construire_requete_elasticsearch(terme, specialite=None, avocat=None, categorie=None, entites=None, acl=None):
+    query = analyser_requete_avancee(terme)
+    
+    filtres = []
+    if acl is not None:
+        filtres.append({"terms": {"acl": sorted(acl)}})
+    if specialite:
+        filtres.append({"term": {"specialite": specialite}})
+    if avocat:
+        filtres.append({"term": {"avocat": avocat}})
+    if categorie:
+        filtres.append({"term": {"categorie": categorie}})
+    for type_entite, valeur in (entites or {}).items():
+        filtres.append({"term": {f"entites_normalisees.{type_entite}": normaliser_suggestion(valeur)}})
     
-    if not query["bool"]["must"] and not query["bool"]["must_not"] and not query["bool"]["should"]:
-        query["bool"]["must"].append({"match_all": {}})
+    if filtres:
+        query = {"bool": {"must": [query], "filter": filtres}}
     
     return query
 
-def rechercher_dans_elasticsearch(terme, specialite=None, avocat=None, categorie=None):
+def surlignage_elasticsearch(vecteurs_termes, champs_metadonnees=True):
+    surlignage_contenu = {"number_of_fragments": CONFIG["passages_max"], "fragment_size": CONFIG["passages_taille"]}
+    if vecteurs_termes:
+        surlignage_contenu.update({"type": "fvh", "boundary_scanner": "word"})
+    
+    champs = {"contenu_textuel": surlignage_contenu}
+    if champs_metadonnees:
+        champs.update({
+            "nom": {"number_of_fragments": 2, "fragment_size": 100},
+            "mots_cles": {"number_of_fragments": 1, "fragment_size": 50},
+            "specialite": {},
+            "avocat": {},
+            "categorie": {}
+        })
+    return {"pre_tags": ["<mark>"], "post_tags": ["</mark>"], "encoder": "html", "fields": champs}
+
+def rechercher_dans_elasticsearch(terme, specialite=None, avocat=None, categorie=None, entites=None, acl=None):
     if not es:
         return []
     
     try:
-        query = analyser_requete_avancee(terme)
-        
-        filtres = []
-        if specialite:
-            filtres.append({"term": {"specialite": specialite}})
-        if avocat:
-            filtres.append({"term": {"avocat": avocat}})
-        if categorie:
-            filtres.append({"term": {"categorie": categorie}})
-        
-        if filtres:
-            query["bool"]["filter"] = filtres
+        query = construire_requete_elasticsearch(terme, specialite, avocat, categorie, entites, acl)
         
         resultat = es.search(index=CONFIG["index_name"], body={
             "query": query,
-            "highlight": {
-                "pre_tags": ["<mark>"],
-                "post_tags": ["</mark>"],
-                "fields": {
-                    "nom": {"number_of_fragments": 2, "fragment_size": 100},
-                    "contenu_textuel": {"number_of_fragments": 3, "fragment_size": 150},
-                    "mots_cles": {"number_of_fragments": 1, "fragment_size": 50},
-                    "specialite": {},
-                    "avocat": {},
-                    "categorie": {}
-                }
-            },
+            "_source": {"excludes": ["contenu_textuel", "suggestion"]},
+            "highlight": surlignage_elasticsearch(ETAT_ES["vecteurs_termes"]),
             "size": 100
         })
         
@@ -380,104 +2388,848 @@ def rechercher_dans_elasticsearch(terme, specialite=None, avocat=None, categorie
         logger.error(f"Erreur recherche Elasticsearch: {e}")
         return []
 
+def rechercher_pages_dans_elasticsearch(terme, specialite=None, avocat=None, categorie=None, entites=None, acl=None):
+    if not es:
+        return []
+    
+    try:
+        surlignage_page = surlignage_elasticsearch(True, champs_metadonnees=False)
+        surlignage_page["fields"]["contenu_textuel"]["number_of_fragments"] = 1
+        
+        resultat = es.search(index=INDEX_PAGES, body={
+            "query": construire_requete_elasticsearch(terme, specialite, avocat, categorie, entites, acl),
+            "_source": ["document_id"],
+            "collapse": {
+                "field": "document_id",
+                "inner_hits": {
+                    "name": "pages",
+                    "size": CONFIG["pages_par_document"],
+                    "_source": ["page"],
+                    "highlight": surlignage_page
+                }
+            },
+            "highlight": surlignage_elasticsearch(True),
+            "size": 100
+        })
+        
+        logger.info(f"Résultats Elasticsearch (pages): {len(resultat['hits']['hits'])} documents")
+        return resultat['hits']['hits']
+    except Exception as e:
+        logger.error(f"Erreur recherche Elasticsearch par pages: {e}")
+        return []
+
+def rechercher_localement(index, terme, specialite='', avocat='', categorie='', ids_autorises=None):
+    resultats = []
+    evaluer = obtenir_plan_requete(terme, "local")[0] if terme and terme.strip() else None
+    
+    for fichier in index:
+        if ids_autorises is not None and fichier.get('id') not in ids_autorises:
+            continue
+        if specialite and fichier.get('specialite') != specialite:
+            continue
+        if avocat and fichier.get('avocat') != avocat:
+            continue
+        if categorie and fichier.get('categorie') != categorie:
+            continue
+        
+        if evaluer is not None:
+            score = evaluer(TextesDocument(fichier))
+            if score is None:
+                continue
+            score = score or 1
+        else:
+            score = 1
+        
+        resultats.append({**fichier, 'score': score})
+    
+    resultats.sort(key=lambda x: x.get('score', 0), reverse=True)
+    return resultats
+
+def termes_surlignage(terme):
+    termes = []
+    a_visiter = [obtenir_plan_requete(terme or '', "ast")]
+    while a_visiter:
+        noeud = a_visiter.pop()
+        if noeud["type"] in ("et", "ou"):
+            a_visiter.extend(reversed(noeud["enfants"]))
+        elif noeud["type"] == "mots":
+            termes.extend(noeud["valeurs"])
+        elif noeud["type"] in ("terme", "phrase"):
+            termes.append(noeud["valeur"])
+        elif noeud["type"] == "joker":
+            termes.append(re.split(r'[*?]', noeud["valeur"])[0])
+    return [t for t in termes if len(t) >= 2]
+
+def compiler_motif_termes(termes):
+    if not termes:
+        return None
+    return re.compile('|'.join(re.escape(t) for t in sorted(set(termes), key=len, reverse=True)), re.IGNORECASE)
+
+def page_de_position(debuts, reperes, position):
+    rang = bisect.bisect_right(debuts, position) - 1
+    return reperes[rang][1] if rang >= 0 else None
+
+def surligner(fragment, motif):
+    morceaux = []
+    position = 0
+    for correspondance in motif.finditer(fragment):
+        morceaux.append(html.escape(fragment[position:correspondance.start()]))
+        morceaux.append(f"<mark>{html.escape(correspondance.group())}</mark>")
+        position = correspondance.end()
+    morceaux.append(html.escape(fragment[position:]))
+    return ' '.join(''.join(morceaux).split())
+
+def fin_de_page(texte, debuts, rang):
+    if rang + 1 >= len(debuts):
+        return len(texte)
+    fin = texte.rfind('--- Page', debuts[rang] if rang >= 0 else 0, debuts[rang + 1])
+    return fin if fin != -1 else debuts[rang + 1]
+
+def dans_marqueur(texte, debuts, position):
+    rang = bisect.bisect_right(debuts, position)
+    return rang < len(debuts) and position >= fin_de_page(texte, debuts, rang - 1)
+
+def decouper_pages(texte, reperes):
+    if not texte or texte.startswith('['):
+        return {}
+    if not reperes:
+        return {1: texte.strip()}
+    debuts = [debut for debut, _ in reperes]
+    return {
+        numero: texte[debut:fin_de_page(texte, debuts, rang)].strip()
+        for rang, (debut, numero) in enumerate(reperes)
+    }
+
+def pages_correspondantes(texte, reperes, motif):
+    if not texte or texte.startswith('[') or motif is None:
+        return []
+    debuts = [debut for debut, _ in reperes]
+    comptes = {}
+    for correspondance in motif.finditer(texte):
+        if dans_marqueur(texte, debuts, correspondance.start()):
+            continue
+        page = page_de_position(debuts, reperes, correspondance.start()) or 1
+        comptes[page] = comptes.get(page, 0) + 1
+    classement = sorted(comptes.items(), key=lambda x: (-x[1], x[0]))[:CONFIG["pages_par_document"]]
+    return [{"page": page, "correspondances": nombre} for page, nombre in classement]
+
+def generer_passages(texte, reperes, motif):
+    if not texte or texte.startswith('[') or motif is None:
+        return []
+    
+    debuts = [debut for debut, _ in reperes]
+    taille = CONFIG["passages_taille"]
+    candidats = []
+    for correspondance in motif.finditer(texte):
+        if dans_marqueur(texte, debuts, correspondance.start()):
+            continue
+        candidats.append(correspondance)
+        if len(candidats) >= 1000:
+            break
+    
+    passages = []
+    intervalles = []
+    termes_couverts = set()
+    for nouveaux_termes_seulement in (True, False):
+        for correspondance in candidats:
+            if len(passages) >= CONFIG["passages_max"]:
+                break
+            terme = correspondance.group().lower()
+            if nouveaux_termes_seulement and terme in termes_couverts:
+                continue
+            if any(debut <= correspondance.start() < fin for debut, fin in intervalles):
+                continue
+            
+            rang = bisect.bisect_right(debuts, correspondance.start()) - 1
+            borne_debut = debuts[rang] if rang >= 0 else 0
+            borne_fin = fin_de_page(texte, debuts, rang)
+            
+            debut = max(borne_debut, correspondance.start() - taille // 3)
+            if debut > borne_debut:
+                espace = texte.find(' ', debut, correspondance.start())
+                if espace != -1:
+                    debut = espace + 1
+            fin = min(borne_fin, debut + taille)
+            if fin < borne_fin:
+                espace = texte.rfind(' ', correspondance.end(), fin)
+                if espace != -1:
+                    fin = espace
+            
+            intervalles.append((debut, fin))
+            termes_couverts.add(terme)
+            passages.append({
+                "page": reperes[rang][1] if rang >= 0 else None,
+                "texte": surligner(texte[debut:fin], motif),
+                "position": debut
+            })
+    
+    passages.sort(key=lambda passage: passage["position"])
+    for passage in passages:
+        del passage["position"]
+    return passages
+
+def passages_depuis_fragments(fragments, texte, reperes):
+    debuts = [debut for debut, _ in reperes]
+    passages = []
+    for fragment in fragments:
+        brut = html.unescape(fragment.replace('<mark>', '').replace('</mark>', ''))
+        position = texte.find(brut) if texte else -1
+        passages.append({
+            "page": page_de_position(debuts, reperes, position) if position >= 0 else None,
+            "texte": ' '.join(MOTIF_MARQUEUR_PAGE.sub(' ', fragment).split())
+        })
+    return passages
+
+CHAMPS_NON_EXPOSES = ('contenu_textuel', 'signature_minhash', 'reperes_pages')
+
+def presenter_document(doc, passages=None):
+    resultat = {cle: valeur for cle, valeur in doc.items() if cle not in CHAMPS_NON_EXPOSES}
+    texte = doc.get('contenu_textuel') or ''
+    resultat['contenu_disponible'] = bool(texte) and not texte.startswith('[')
+    resultat['extrait'] = None
+    if resultat['contenu_disponible']:
+        debut = ' '.join(MOTIF_MARQUEUR_PAGE.sub(' ', texte[:CONFIG["extrait_taille"] * 2]).split())
+        resultat['extrait'] = debut[:CONFIG["extrait_taille"]]
+    if passages is not None:
+        resultat['passages'] = passages
+    return resultat
+
+CHAMPS_ACL = frozenset(('avocat', 'dossier', 'acces'))
+
+def dossiers_parents(dossier):
+    dossier = os.path.normpath(dossier)
+    dossiers = [dossier]
+    while os.path.dirname(dossier) not in ('', dossier):
+        dossier = os.path.dirname(dossier)
+        dossiers.append(dossier)
+    return dossiers
+
+def acl_document(doc):
+    avocat = doc.get('avocat')
+    acces = doc.get('acces') or []
+    acl = [f"avocat:{avocat}"] if avocat and avocat != 'Non attribué' else [] if acces else ["tous"]
+    dossiers = ([doc['dossier']] if doc.get('dossier') else []) + [principal[8:] for principal in acces if principal.startswith("dossier:")]
+    for dossier in dossiers:
+        acl.extend(f"dossier:{parent}" for parent in dossiers_parents(dossier) if f"dossier:{parent}" not in acl)
+    acl.extend(principal for principal in acces if principal not in acl)
+    return acl
+
+def document_elasticsearch(fichier_info):
+    return {
+        'id': fichier_info['id'],
+        'nom': fichier_info['nom'],
+        'chemin': fichier_info['chemin'],
+        'dossier': fichier_info['dossier'],
+        'extension': fichier_info['extension'],
+        'taille': fichier_info['taille'],
+        'date_modification': fichier_info['date_modification'],
+        'date_indexation': fichier_info['date_indexation'],
+        'type_mime': fichier_info['type_mime'],
+        'mots_cles': fichier_info['mots_cles'],
+        'categorie': fichier_info['categorie'],
+        'specialite': fichier_info.get('specialite', 'Non spécifiée'),
+        'avocat': fichier_info.get('avocat', 'Non attribué'),
+        'statut': fichier_info['statut'],
+        'contenu_textuel': fichier_info.get('contenu_textuel', ''),
+        'type_fichier': fichier_info.get('type_fichier', 'standard'),
+        'entites': fichier_info.get('entites') or {},
+        'entites_normalisees': entites_normalisees(fichier_info.get('entites')),
+        'acl': acl_document(fichier_info),
+        'suggestion': entrees_suggestion(fichier_info)
+    }
+
+def entites_normalisees(entites):
+    return {
+        type_entite: sorted({normaliser_suggestion(valeur) for valeur in valeurs})
+        for type_entite, valeurs in (entites or {}).items() if valeurs
+    }
+
 def indexer_dans_elasticsearch(fichier_info):
     if not es:
         return
     
     try:
-        doc = {
-            'id': fichier_info['id'],
-            'nom': fichier_info['nom'],
-            'chemin': fichier_info['chemin'],
-            'dossier': fichier_info['dossier'],
-            'extension': fichier_info['extension'],
-            'taille': fichier_info['taille'],
-            'date_modification': fichier_info['date_modification'],
-            'date_indexation': fichier_info['date_indexation'],
-            'type_mime': fichier_info['type_mime'],
-            'mots_cles': fichier_info['mots_cles'],
-            'categorie': fichier_info['categorie'],
-            'specialite': fichier_info.get('specialite', 'Non spécifiée'),
-            'avocat': fichier_info.get('avocat', 'Non attribué'),
-            'statut': fichier_info['statut'],
-            'contenu_textuel': fichier_info.get('contenu_textuel', ''),
-            'type_fichier': fichier_info.get('type_fichier', 'standard')
-        }
-        
-        es.index(index=CONFIG["index_name"], id=fichier_info['id'], body=doc)
+        es.index(index=CONFIG["index_name"], id=fichier_info['id'], body=document_elasticsearch(fichier_info))
+        indexer_pages_elasticsearch(fichier_info)
     except Exception as e:
         logger.error(f"Erreur indexation Elasticsearch: {e}")
 
-def indexer_fichiers(chemin_dossier, specialite="Non spécifiée", avocat="Non attribué"):
-    index = []
-    total_fichiers = 0
+CHAMPS_PAGES = ('nom', 'mots_cles', 'categorie', 'specialite', 'avocat', 'entites')
+
+def actions_pages_elasticsearch(fichier_info):
+    texte = fichier_info.get('contenu_textuel', '')
+    pages = decouper_pages(texte, fichier_info.get('reperes_pages') or reperes_pages(texte))
+    return (
+        {
+            "_index": INDEX_PAGES,
+            "_id": f"{fichier_info['id']}_{numero}",
+            "_source": {
+                "document_id": fichier_info['id'],
+                "page": numero,
+                "contenu_textuel": contenu,
+                "acl": acl_document(fichier_info),
+                "entites_normalisees": entites_normalisees(fichier_info.get('entites')),
+                **{champ: fichier_info.get(champ) for champ in CHAMPS_PAGES}
+            }
+        }
+        for numero, contenu in pages.items()
+    )
+
+def supprimer_pages_elasticsearch(ids):
+    for debut in range(0, len(ids), 1000):
+        es.delete_by_query(index=INDEX_PAGES, query={"terms": {"document_id": ids[debut:debut + 1000]}}, conflicts="proceed", refresh=True)
+
+def indexer_pages_elasticsearch(fichier_info):
+    if not es or not CONFIG["index_pages"]:
+        return
     
-    for root, dirs, files in os.walk(chemin_dossier):
-        for file in files:
-            chemin_complet = os.path.join(root, file)
-            extension = os.path.splitext(file)[1].lower()
-            
-            if extension in CONFIG["extensions_autorisees"]:
-                try:
-                    stat = os.stat(chemin_complet)
-                    
-                    contenu_textuel = ""
-                    type_fichier = "standard"
-                    
-                    contenu_textuel = extraire_texte_ocr(chemin_complet)
-                    
-                    if contenu_textuel and not contenu_textuel.startswith("["):
-                        if OCR_DISPONIBLE and extension in ['.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.bmp']:
-                            type_fichier = "OCR"
-                        else:
-                            type_fichier = "texte"
-                    
-                    fichier_info = {
-                        "id": str(uuid.uuid4())[:8],
-                        "nom": file,
-                        "chemin": chemin_complet,
-                        "dossier": root,
-                        "extension": extension,
-                        "taille": stat.st_size,
-                        "date_modification": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        "date_indexation": datetime.now().isoformat(),
-                        "type_mime": mimetypes.guess_type(file)[0] or "inconnu",
-                        "mots_cles": extraire_mots_cles(chemin_complet, file),
-                        "categorie": deviner_categorie(root, file),
-                        "specialite": specialite,
-                        "avocat": avocat,
-                        "statut": "indexé",
-                        "contenu_textuel": contenu_textuel,
-                        "type_fichier": type_fichier
+    supprimer_pages_elasticsearch([fichier_info['id']])
+    succes, erreurs = helpers.bulk(es, actions_pages_elasticsearch(fichier_info), chunk_size=500, raise_on_error=False)
+    for erreur in erreurs[:5]:
+        logger.warning(f"Erreur indexation des pages: {erreur}")
+
+def indexer_elasticsearch_en_masse(documents):
+    if not es or not documents:
+        return {"indexes": 0, "erreurs": 0}
+    
+    def actions():
+        for fichier_info in documents:
+            yield {"_index": CONFIG["index_name"], "_id": fichier_info['id'], "_source": document_elasticsearch(fichier_info)}
+            if CONFIG["index_pages"]:
+                yield from actions_pages_elasticsearch(fichier_info)
+    
+    try:
+        if CONFIG["index_pages"]:
+            supprimer_pages_elasticsearch([fichier_info['id'] for fichier_info in documents])
+        succes, erreurs = helpers.bulk(es, actions(), chunk_size=500, raise_on_error=False)
+        for erreur in erreurs[:5]:
+            logger.warning(f"Erreur indexation Elasticsearch en masse: {erreur}")
+        return {"indexes": succes, "erreurs": len(erreurs)}
+    except Exception as e:
+        logger.error(f"Erreur indexation Elasticsearch en masse: {e}")
+        return {"indexes": 0, "erreurs": len(documents)}
+
+def mettre_a_jour_pages_elasticsearch(documents, champs):
+    acl = not CHAMPS_ACL.isdisjoint(champs)
+    champs = [champ for champ in champs if champ in CHAMPS_PAGES]
+    if not es or not CONFIG["index_pages"] or not (champs or acl):
+        return
+    
+    groupes = {}
+    for doc in documents:
+        cle = tuple(doc.get(champ) for champ in champs) + ((tuple(acl_document(doc)),) if acl else ())
+        groupes.setdefault(cle, []).append(doc['id'])
+    
+    for cle, ids in groupes.items():
+        valeurs = dict(zip(champs, cle))
+        if acl:
+            valeurs["acl"] = list(cle[-1])
+        for debut in range(0, len(ids), 1000):
+            try:
+                es.update_by_query(
+                    index=INDEX_PAGES,
+                    query={"terms": {"document_id": ids[debut:debut + 1000]}},
+                    script={
+                        "source": "for (entree in params.valeurs.entrySet()) { ctx._source[entree.getKey()] = entree.getValue(); }",
+                        "params": {"valeurs": valeurs}
+                    },
+                    conflicts="proceed",
+                    refresh=True
+                )
+            except Exception as e:
+                logger.error(f"Erreur mise à jour des pages Elasticsearch: {e}")
+
+def mettre_a_jour_elasticsearch_en_masse(documents, champs):
+    if not es or not documents:
+        return {"mis_a_jour": 0, "erreurs": 0}
+    
+    acl = not CHAMPS_ACL.isdisjoint(champs)
+    actions = (
+        {
+            "_op_type": "update",
+            "_index": CONFIG["index_name"],
+            "_id": doc['id'],
+            "doc": {
+                **{champ: doc.get(champ) for champ in champs},
+                **({"acl": acl_document(doc)} if acl else {}),
+                "date_modification": doc.get('date_modification'),
+                "suggestion": entrees_suggestion(doc)
+            }
+        }
+        for doc in documents
+    )
+    
+    try:
+        succes, erreurs = helpers.bulk(es, actions, chunk_size=1000, raise_on_error=False, refresh='wait_for')
+        for erreur in erreurs[:5]:
+            logger.warning(f"Erreur mise à jour Elasticsearch en masse: {erreur}")
+        mettre_a_jour_pages_elasticsearch(documents, champs)
+        return {"mis_a_jour": succes, "erreurs": len(erreurs)}
+    except Exception as e:
+        logger.error(f"Erreur mise à jour Elasticsearch en masse: {e}")
+        return {"mis_a_jour": 0, "erreurs": len(documents)}
+
+ETAT_ES = {"vecteurs_termes": False}
+
+def initialiser_index_elasticsearch():
+    if not es:
+        return
+    
+    proprietes = {
+        "contenu_textuel": {"type": "text", "term_vector": "with_positions_offsets"},
+        "suggestion": {"type": "completion", "analyzer": "simple", "preserve_separators": True},
+        "entites": {"properties": {type_entite: {"type": "keyword"} for type_entite in TYPES_ENTITES}},
+        "entites_normalisees": {"properties": {type_entite: {"type": "keyword"} for type_entite in TYPES_ENTITES}},
+        "acl": {"type": "keyword"}
+    }
+    
+    try:
+        if es.indices.exists(index=CONFIG["index_name"]):
+            mapping = es.indices.get_mapping(index=CONFIG["index_name"])[CONFIG["index_name"]]["mappings"]
+            contenu = mapping.get("properties", {}).get("contenu_textuel")
+            if contenu:
+                del proprietes["contenu_textuel"]
+                ETAT_ES["vecteurs_termes"] = contenu.get("term_vector") == "with_positions_offsets"
+                if not ETAT_ES["vecteurs_termes"]:
+                    logger.info("Index sans vecteurs de termes: surligneur standard utilisé (réindexer pour activer le surligneur rapide)")
+            else:
+                ETAT_ES["vecteurs_termes"] = True
+            es.indices.put_mapping(index=CONFIG["index_name"], properties=proprietes)
+        else:
+            ETAT_ES["vecteurs_termes"] = True
+            proprietes["suggestion"]["analyzer"] = "analyseur_suggestion"
+            es.indices.create(
+                index=CONFIG["index_name"],
+                settings={
+                    "analysis": {
+                        "analyzer": {
+                            "analyseur_suggestion": {
+                                "type": "custom",
+                                "tokenizer": "standard",
+                                "filter": ["lowercase", "asciifolding"]
+                            }
+                        }
                     }
-                    index.append(fichier_info)
-                    total_fichiers += 1
-                    
-                    indexer_dans_elasticsearch(fichier_info)
-                    
-                except Exception as e:
-                    logger.error(f"Erreur indexation {chemin_complet}: {e}")
+                },
+                mappings={"properties": proprietes}
+            )
+        
+        if CONFIG["index_pages"] and not es.indices.exists(index=INDEX_PAGES):
+            es.indices.create(index=INDEX_PAGES, mappings={"properties": {
+                "document_id": {"type": "keyword"},
+                "page": {"type": "integer"},
+                "contenu_textuel": {"type": "text", "term_vector": "with_positions_offsets"},
+                "entites": {"properties": {type_entite: {"type": "keyword"} for type_entite in TYPES_ENTITES}},
+                "entites_normalisees": {"properties": {type_entite: {"type": "keyword"} for type_entite in TYPES_ENTITES}},
+                "acl": {"type": "keyword"}
+            }})
+        elif CONFIG["index_pages"]:
+            es.indices.put_mapping(index=INDEX_PAGES, properties={
+                "entites_normalisees": {"properties": {type_entite: {"type": "keyword"} for type_entite in TYPES_ENTITES}},
+                "acl": {"type": "keyword"}
+            })
+    except Exception as e:
+        logger.warning(f"Erreur initialisation index Elasticsearch: {e}")
+
+initialiser_index_elasticsearch()
+
+PRIORITE_INTERACTIVE = 0
+PRIORITE_MASSE = 1
+NOMS_PRIORITES = {PRIORITE_INTERACTIVE: "interactive", PRIORITE_MASSE: "masse"}
+
+class FileSaturee(Exception):
+    pass
+
+class TravailOrdonnance:
+    def __init__(self, ordonnanceur, nom, priorite, quota, capacite):
+        self.ordonnanceur = ordonnanceur
+        self.id = str(uuid.uuid4())[:8]
+        self.nom = nom
+        self.priorite = priorite
+        self.quota = quota
+        self.capacite = capacite
+        self.en_attente = deque()
+        self.actives = 0
+        self.soumises = 0
+        self.terminees = 0
+        self.echecs = 0
+        self.attente_totale = 0.0
+        self.passage = 0
+        self.dans_tas = False
+        self.ferme = False
+        self.cree = datetime.now().isoformat()
     
-    return index, total_fichiers
+    def eligible(self):
+        return bool(self.en_attente) and self.actives < self.quota
+    
+    def soumettre(self, fonction, *args, bloquant=True):
+        return self.ordonnanceur.soumettre(self, fonction, args, bloquant)
+    
+    def fermer(self, annuler=False):
+        self.ordonnanceur.fermer(self, annuler)
+    
+    def resume(self):
+        return {
+            "id": self.id,
+            "nom": self.nom,
+            "priorite": NOMS_PRIORITES[self.priorite],
+            "quota": self.quota,
+            "en_attente": len(self.en_attente),
+            "actives": self.actives,
+            "soumises": self.soumises,
+            "terminees": self.terminees,
+            "echecs": self.echecs,
+            "attente_moyenne_ms": round(self.attente_totale / self.terminees * 1000, 1) if self.terminees else None,
+            "ferme": self.ferme,
+            "cree": self.cree
+        }
 
-def extraire_mots_cles(chemin, nom_fichier):
-    texte = f"{chemin} {nom_fichier}".lower()
-    mots = set()
+class OrdonnanceurExtraction:
+    def __init__(self, travailleurs, reserve_interactive):
+        self.travailleurs = travailleurs
+        self.limite_masse = max(1, travailleurs - reserve_interactive)
+        self.condition = threading.Condition()
+        self.tas = []
+        self.sequence = 0
+        self.horloge = 0
+        self.travaux = {}
+        self.historique = deque(maxlen=20)
+        self.actives = {priorite: 0 for priorite in NOMS_PRIORITES}
+        self.demarre = False
     
-    mots_ignorer = {'dossier', 'fichier', 'document', 'pdf', 'doc', 'docx', 'txt', 'rtf', 'odt', 'png', 'jpg', 'jpeg'}
+    def demarrer(self):
+        if self.demarre:
+            return
+        self.demarre = True
+        for numero in range(self.travailleurs):
+            threading.Thread(target=self.boucle, name=f"extraction-{numero}", daemon=True).start()
     
-    for mot in texte.split():
-        mot_clean = ''.join(c for c in mot if c.isalnum())
-        if mot_clean and len(mot_clean) > 2 and mot_clean not in mots_ignorer:
-            mots.add(mot_clean)
+    def creer_travail(self, nom, priorite=PRIORITE_MASSE, quota=None, capacite=None):
+        if quota is None:
+            quota = CONFIG["ordonnanceur_quota_masse"] if priorite == PRIORITE_MASSE else 1
+        if capacite is None:
+            capacite = CONFIG["ordonnanceur_file_masse"] if priorite == PRIORITE_MASSE else CONFIG["ordonnanceur_file_interactive"]
+        with self.condition:
+            self.demarrer()
+            travail = TravailOrdonnance(self, nom, priorite, quota, capacite)
+            travail.passage = self.horloge
+            self.travaux[travail.id] = travail
+            return travail
     
-    return list(mots)
+    @contextmanager
+    def travail(self, nom, priorite=PRIORITE_MASSE, quota=None):
+        travail = self.creer_travail(nom, priorite, quota)
+        try:
+            yield travail
+        except BaseException:
+            travail.fermer(annuler=True)
+            raise
+        travail.fermer()
+    
+    def executer(self, nom, fonction, *args, priorite=PRIORITE_INTERACTIVE):
+        if priorite == PRIORITE_INTERACTIVE:
+            with self.condition:
+                if self.profondeur(PRIORITE_INTERACTIVE) >= CONFIG["ordonnanceur_file_interactive"]:
+                    raise FileSaturee("File d'extraction interactive saturée")
+        travail = self.creer_travail(nom, priorite, quota=1, capacite=1)
+        try:
+            futur = travail.soumettre(fonction, *args)
+        finally:
+            travail.fermer()
+        return futur.result()
+    
+    def profondeur(self, priorite):
+        return sum(len(travail.en_attente) for travail in self.travaux.values() if travail.priorite == priorite)
+    
+    def planifier(self, travail):
+        if travail.eligible() and not travail.dans_tas:
+            travail.passage = max(travail.passage, self.horloge)
+            self.sequence += 1
+            heapq.heappush(self.tas, (travail.priorite, travail.passage, self.sequence, travail))
+            travail.dans_tas = True
+            self.condition.notify_all()
+    
+    def soumettre(self, travail, fonction, args, bloquant):
+        futur = Future()
+        with self.condition:
+            if travail.ferme:
+                raise RuntimeError(f"Travail {travail.id} déjà fermé")
+            while len(travail.en_attente) >= travail.capacite:
+                if not bloquant:
+                    raise FileSaturee(f"File du travail {travail.id} saturée")
+                self.condition.wait()
+            travail.en_attente.append((fonction, args, futur, time.perf_counter()))
+            travail.soumises += 1
+            self.planifier(travail)
+        return futur
+    
+    def fermer(self, travail, annuler):
+        with self.condition:
+            travail.ferme = True
+            if annuler:
+                while travail.en_attente:
+                    travail.en_attente.popleft()[2].cancel()
+            self.retirer_si_termine(travail)
+    
+    def retirer_si_termine(self, travail):
+        if travail.ferme and not travail.en_attente and not travail.actives and travail.id in self.travaux:
+            del self.travaux[travail.id]
+            self.historique.append(travail.resume())
+    
+    def prochaine_tache(self):
+        while self.tas:
+            priorite, passage, _, travail = self.tas[0]
+            if not travail.eligible():
+                heapq.heappop(self.tas)
+                travail.dans_tas = False
+                continue
+            if priorite == PRIORITE_MASSE and self.actives[PRIORITE_MASSE] >= self.limite_masse:
+                return None
+            heapq.heappop(self.tas)
+            travail.dans_tas = False
+            self.horloge = passage
+            travail.passage = passage + 1
+            travail.actives += 1
+            self.actives[priorite] += 1
+            tache = travail.en_attente.popleft()
+            self.planifier(travail)
+            return travail, tache
+        return None
+    
+    def boucle(self):
+        while True:
+            with self.condition:
+                selection = self.prochaine_tache()
+                while selection is None:
+                    self.condition.wait()
+                    selection = self.prochaine_tache()
+                self.condition.notify_all()
+            travail, (fonction, args, futur, soumission) = selection
+            attente = time.perf_counter() - soumission
+            METRIQUE_ORDONNANCEUR_ATTENTE.observer(attente, priorite=NOMS_PRIORITES[travail.priorite])
+            echec = False
+            if futur.set_running_or_notify_cancel():
+                try:
+                    futur.set_result(fonction(*args))
+                except BaseException as e:
+                    echec = True
+                    futur.set_exception(e)
+            with self.condition:
+                travail.actives -= 1
+                self.actives[travail.priorite] -= 1
+                travail.terminees += 1
+                travail.attente_totale += attente
+                if echec:
+                    travail.echecs += 1
+                self.planifier(travail)
+                self.retirer_si_termine(travail)
+                self.condition.notify_all()
+    
+    def mesures(self, champ):
+        return {(nom,): valeur for nom, valeur in self.etat()[champ].items()}
+    
+    def etat(self):
+        with self.condition:
+            return {
+                "travailleurs": self.travailleurs,
+                "limite_masse": self.limite_masse,
+                "actives": {NOMS_PRIORITES[p]: n for p, n in self.actives.items()},
+                "en_attente": {NOMS_PRIORITES[p]: self.profondeur(p) for p in NOMS_PRIORITES},
+                "travaux": [travail.resume() for travail in self.travaux.values()],
+                "historique": list(self.historique)
+            }
 
-def deviner_categorie(chemin, nom_fichier):
-    chemin_lower = chemin.lower()
-    nom_lower = nom_fichier.lower()
+ORDONNANCEUR = OrdonnanceurExtraction(CONFIG["ordonnanceur_travailleurs"], CONFIG["ordonnanceur_reserve_interactive"])
+METRIQUE_ORDONNANCEUR_ATTENTE = Histogramme('cabinet_ordonnanceur_attente_secondes', "Temps d'attente des extractions avant exécution", ['priorite'])
+Jauge('cabinet_ordonnanceur_file', "Nombre d'extractions en attente par priorité", ['priorite'], lambda: ORDONNANCEUR.mesures("en_attente"))
+Jauge('cabinet_ordonnanceur_actives', "Nombre d'extractions en cours par priorité", ['priorite'], lambda: ORDONNANCEUR.mesures("actives"))
+
+def decrire_fichier(chemin, contenu, specialite="Non spécifiée", avocat="Non attribué", statut="indexé", dossier=None):
+    stat = os.stat(chemin)
+    dossier = os.path.dirname(chemin) if dossier is None else dossier
+    nom = os.path.basename(chemin)
+    return {
+        "id": str(uuid.uuid4())[:8],
+        "nom": nom,
+        "chemin": chemin,
+        "dossier": dossier,
+        "extension": os.path.splitext(nom)[1].lower(),
+        "taille": stat.st_size,
+        "date_modification": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        "date_indexation": datetime.now().isoformat(),
+        "type_mime": mimetypes.guess_type(nom)[0] or "inconnu",
+        "mots_cles": extraire_mots_cles(chemin, nom),
+        "categorie": deviner_categorie(dossier, nom),
+        "specialite": specialite,
+        "avocat": avocat,
+        "statut": statut,
+        **contenu
+    }
+
+def options_parcours(options=None):
+    options = options or {}
+    return {
+        "inclure": list(options.get("inclure") or CONFIG["indexation_inclure"]),
+        "exclure": list(CONFIG["indexation_exclure"]) + list(options.get("exclure") or []),
+        "taille_max": options.get("taille_max", CONFIG["indexation_taille_max"]),
+        "fichiers_caches": options.get("fichiers_caches", CONFIG["indexation_fichiers_caches"]),
+        "suivre_liens": options.get("suivre_liens", CONFIG["indexation_suivre_liens"]),
+        "concurrence": options.get("concurrence") or CONFIG["indexation_concurrence_dossier"]
+    }
+
+def correspond_motifs(chemin_relatif, motifs):
+    nom = chemin_relatif.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatch(chemin_relatif, motif) or fnmatch.fnmatch(nom, motif) for motif in motifs)
+
+def est_cache(entree):
+    if entree.name.startswith('.'):
+        return True
+    if os.name != 'nt':
+        return False
+    try:
+        return bool(getattr(entree.stat(follow_symlinks=False), 'st_file_attributes', 0) & FILE_ATTRIBUTE_HIDDEN)
+    except OSError:
+        return False
+
+def parcourir_dossier(racine, options):
+    a_visiter = [racine]
+    visites = set()
+    while a_visiter:
+        dossier = a_visiter.pop()
+        try:
+            infos = os.stat(dossier)
+        except OSError as e:
+            logger.warning(f"Dossier inaccessible {dossier}: {e}")
+            continue
+        cle = (infos.st_dev, infos.st_ino)
+        if cle in visites:
+            logger.warning(f"Boucle de liens ignorée: {dossier}")
+            continue
+        visites.add(cle)
+        
+        try:
+            with os.scandir(dossier) as iterateur:
+                entrees = sorted(iterateur, key=lambda entree: entree.name)
+        except OSError as e:
+            logger.warning(f"Dossier illisible {dossier}: {e}")
+            continue
+        
+        sous_dossiers = []
+        for entree in entrees:
+            if not options["fichiers_caches"] and est_cache(entree):
+                continue
+            relatif = os.path.relpath(entree.path, racine).replace(os.sep, '/')
+            if correspond_motifs(relatif, options["exclure"]):
+                continue
+            try:
+                if entree.is_dir():
+                    if options["suivre_liens"] or not entree.is_symlink():
+                        sous_dossiers.append(entree.path)
+                    continue
+                if not entree.is_file():
+                    continue
+                if os.path.splitext(entree.name)[1].lower() not in CONFIG["extensions_autorisees"]:
+                    continue
+                if options["inclure"] and not correspond_motifs(relatif, options["inclure"]):
+                    continue
+                if options["taille_max"] is not None and entree.stat().st_size > options["taille_max"]:
+                    logger.info(f"Fichier trop volumineux ignoré: {entree.path}")
+                    continue
+            except OSError as e:
+                logger.warning(f"Fichier inaccessible {entree.path}: {e}")
+                continue
+            yield entree.path, dossier
+        a_visiter.extend(reversed(sous_dossiers))
+
+def indexer_fichiers(chemin_dossier, specialite="Non spécifiée", avocat="Non attribué", documents_connus=None, options=None, chemins_vus=None):
+    options = options_parcours(options)
+    if documents_connus is None:
+        documents_connus = {}
+    en_cours = deque()
+    limite = CONFIG["ordonnanceur_file_masse"]
     
-    if any(mot in chemin_lower for mot in ['contrat', 'agreement', 'convention']):
+    def terminer(chemin_complet, dossier, futur):
+        try:
+            fichier_info = decrire_fichier(chemin_complet, futur.result(), specialite, avocat, dossier=dossier)
+        except Exception as e:
+            logger.error(f"Erreur indexation {chemin_complet}: {e}")
+            return None
+        if fichier_info['contenu_textuel']:
+            documents_connus.setdefault(fichier_info['empreinte'], fichier_info)
+        return fichier_info
+    
+    with ORDONNANCEUR.travail(f"indexation {chemin_dossier}", quota=options["concurrence"]) as travail:
+        for chemin_complet, dossier in parcourir_dossier(chemin_dossier, options):
+            if chemins_vus is not None:
+                chemins_vus.add(chemin_complet)
+            extension = os.path.splitext(chemin_complet)[1].lower()
+            futur = travail.soumettre(extraire_contenu_fichier, chemin_complet, extension, documents_connus)
+            en_cours.append((chemin_complet, dossier, futur))
+            while en_cours and (en_cours[0][-1].done() or len(en_cours) > limite):
+                fichier_info = terminer(*en_cours.popleft())
+                if fichier_info is not None:
+                    yield fichier_info
+        
+        while en_cours:
+            fichier_info = terminer(*en_cours.popleft())
+            if fichier_info is not None:
+                yield fichier_info
+
+CHAMPS_GERES = ('nom', 'avocat', 'specialite', 'categorie', 'acces')
+
+def enregistrer_lot_indexation(lot, explicites=()):
+    with VERROU_STOCKAGE:
+        colonnes = lire_colonnes_catalogue({"chemin": None, "id": None})
+        ids = dict(zip(colonnes["chemin"], colonnes["id"]))
+        for fichier_info in lot:
+            document_id = ids.setdefault(fichier_info['chemin'], fichier_info['id'])
+            if document_id == fichier_info['id']:
+                continue
+            ancien = lire_document(document_id, CHAMPS_GERES) or {}
+            fichier_info['id'] = document_id
+            for champ in CHAMPS_GERES:
+                if champ in ancien and champ not in explicites:
+                    fichier_info[champ] = ancien[champ]
+        journaliser_documents(FICHIER_INDEX, lot)
+    indexer_elasticsearch_en_masse(lot)
+
+def retirer_documents_disparus(chemin_dossier, chemins_vus):
+    prefixe = os.path.join(chemin_dossier, '')
+    with VERROU_STOCKAGE:
+        colonnes = lire_colonnes_catalogue({"chemin": None, "id": None})
+        retires = [
+            document_id for chemin, document_id in zip(colonnes["chemin"], colonnes["id"])
+            if chemin and chemin.startswith(prefixe) and chemin not in chemins_vus and not os.path.exists(chemin)
+        ]
+        if retires:
+            journaliser_documents(FICHIER_INDEX, supprimer=retires)
+    if es and retires:
+        try:
+            es.delete_by_query(index=CONFIG["index_name"], query={"ids": {"values": retires}}, conflicts="proceed")
+            if CONFIG["index_pages"]:
+                es.delete_by_query(index=INDEX_PAGES, query={"terms": {"document_id": retires}}, conflicts="proceed")
+        except Exception as e:
+            logger.warning(f"Impossible de supprimer d'Elasticsearch: {e}")
+    return len(retires)
+
+def extraire_mots_cles(chemin, nom_fichier):
+    texte = f"{chemin} {nom_fichier}".lower()
+    mots = set()
+    
+    mots_ignorer = {'dossier', 'fichier', 'document', 'pdf', 'doc', 'docx', 'txt', 'rtf', 'odt', 'png', 'jpg', 'jpeg'}
+    
+    for mot in texte.split():
+        mot_clean = ''.join(c for c in mot if c.isalnum())
+        if mot_clean and len(mot_clean) > 2 and mot_clean not in mots_ignorer:
+            mots.add(mot_clean)
+    
+    return list(mots)
+
+def deviner_categorie(chemin, nom_fichier):
+    chemin_lower = chemin.lower()
+    nom_lower = nom_fichier.lower()
+    
+    if any(mot in chemin_lower for mot in ['contrat', 'agreement', 'convention']):
         return "Contrats"
     elif any(mot in chemin_lower for mot in ['facture', 'invoice', 'paiement']):
         return "Factures"
@@ -492,27 +3244,1579 @@ def deviner_categorie(chemin, nom_fichier):
     else:
         return "Divers"
 
-def charger_specialites():
-    try:
-        with open(FICHIER_SPECIALITES, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return CONFIG["specialites_juridiques"]
+def charger_specialites():
+    return charger_donnees(FICHIER_SPECIALITES, list(CONFIG["specialites_juridiques"]))
+
+def sauvegarder_specialites(specialites):
+    sauvegarder_donnees(FICHIER_SPECIALITES, specialites)
+    signaler_modification_catalogue()
+
+def charger_avocats():
+    return charger_donnees(FICHIER_AVOCATS, ["Maître Dupont", "Maître Martin", "Maître Dubois"])
+
+def sauvegarder_avocats(avocats):
+    sauvegarder_donnees(FICHIER_AVOCATS, avocats)
+    signaler_modification_catalogue()
+
+def normaliser_suggestion(texte):
+    texte = unicodedata.normalize('NFKD', texte.lower())
+    return ''.join(c for c in texte if not unicodedata.combining(c))
+
+def suffixes_mots(texte, maximum=12):
+    mots = texte.split()
+    debuts = [i for i, mot in enumerate(mots) if any(c.isalnum() for c in mot)]
+    return [' '.join(mots[i:]) for i in debuts[:maximum]]
+
+def entrees_suggestion(fichier_info):
+    entrees = []
+    
+    nom = fichier_info.get('nom', '')
+    if nom:
+        entrees.append({"input": suffixes_mots(nom), "weight": 4})
+    
+    mots_cles = [mot for mot in fichier_info.get('mots_cles', []) if mot]
+    if mots_cles:
+        entrees.append({"input": mots_cles, "weight": 2})
+    
+    for champ, valeur_defaut in [('avocat', 'Non attribué'), ('specialite', 'Non spécifiée')]:
+        valeur = fichier_info.get(champ)
+        if valeur and valeur != valeur_defaut:
+            entrees.append({"input": suffixes_mots(valeur), "weight": 3})
+    
+    return entrees
+
+class NoeudPrefixe:
+    __slots__ = ('enfants', 'meilleurs')
+    
+    def __init__(self):
+        self.enfants = {}
+        self.meilleurs = []
+
+class ArbrePrefixes:
+    def __init__(self, taille_resultats, longueur_max):
+        self.racine = NoeudPrefixe()
+        self.capacite = taille_resultats * 2
+        self.longueur_max = longueur_max
+        self.compteur = 0
+    
+    def inserer(self, cle, entree, poids):
+        self.compteur += 1
+        element = (poids, -self.compteur, entree)
+        noeud = self.racine
+        
+        for caractere in cle[:self.longueur_max]:
+            enfant = noeud.enfants.get(caractere)
+            if enfant is None:
+                enfant = noeud.enfants[caractere] = NoeudPrefixe()
+            noeud = enfant
+            
+            if len(noeud.meilleurs) < self.capacite:
+                heapq.heappush(noeud.meilleurs, element)
+            elif element > noeud.meilleurs[0]:
+                heapq.heapreplace(noeud.meilleurs, element)
+    
+    def rechercher(self, prefixe, maximum):
+        noeud = self.racine
+        for caractere in prefixe[:self.longueur_max]:
+            noeud = noeud.enfants.get(caractere)
+            if noeud is None:
+                return []
+        
+        resultats = []
+        vus = set()
+        for poids, _, entree in sorted(noeud.meilleurs, reverse=True):
+            cle = (entree['type'], entree['texte'], entree.get('id'))
+            if cle in vus:
+                continue
+            if len(prefixe) > self.longueur_max and not correspond_prefixe(entree['texte'], prefixe):
+                continue
+            vus.add(cle)
+            resultats.append(entree)
+            if len(resultats) >= maximum:
+                break
+        
+        return resultats
+
+def correspond_prefixe(texte, prefixe):
+    return any(normaliser_suggestion(suffixe).startswith(prefixe) for suffixe in suffixes_mots(texte))
+
+def construire_arbre_suggestions(documents=None):
+    arbre = ArbrePrefixes(CONFIG["suggestions_max"], CONFIG["suggestions_longueur_prefixe_max"])
+    compteurs = {}
+    
+    for doc in charger_donnees(FICHIER_INDEX) if documents is None else documents:
+        nom = doc.get('nom')
+        if nom:
+            entree = {"texte": nom, "type": "document", "id": doc.get('id')}
+            for suffixe in suffixes_mots(nom):
+                arbre.inserer(normaliser_suggestion(suffixe), entree, 4)
+        
+        for mot in doc.get('mots_cles', []):
+            compteurs[('mot_cle', mot)] = compteurs.get(('mot_cle', mot), 0) + 1
+        
+        for champ in ['avocat', 'specialite']:
+            valeur = doc.get(champ)
+            if valeur:
+                compteurs[(champ, valeur)] = compteurs.get((champ, valeur), 0) + 1
+    
+    for avocat in charger_avocats():
+        compteurs.setdefault(('avocat', avocat), 0)
+    for specialite in charger_specialites():
+        compteurs.setdefault(('specialite', specialite), 0)
+    
+    poids_base = {"avocat": 3, "specialite": 3, "mot_cle": 2}
+    for (type_suggestion, texte), nombre in compteurs.items():
+        if texte in ('Non attribué', 'Non spécifiée'):
+            continue
+        entree = {"texte": texte, "type": type_suggestion}
+        poids = poids_base[type_suggestion] + min(nombre, 1000) / 1000
+        for suffixe in suffixes_mots(texte):
+            arbre.inserer(normaliser_suggestion(suffixe), entree, poids)
+    
+    return arbre
+
+ETAT_SUGGESTIONS = {"arbre": None, "generation": -1, "cache": OrderedDict(), "utilisateurs": {}, "arbres_acces": OrderedDict()}
+VERROU_SUGGESTIONS = threading.Lock()
+
+def obtenir_arbre_suggestions(principaux=None):
+    if principaux is not None:
+        return obtenir_arbre_suggestions_acces(principaux)
+    with VERROU_SUGGESTIONS:
+        if ETAT_SUGGESTIONS["arbre"] is None or ETAT_SUGGESTIONS["generation"] != GENERATION_CATALOGUE:
+            generation = GENERATION_CATALOGUE
+            debut = time.perf_counter()
+            ETAT_SUGGESTIONS["arbre"] = construire_arbre_suggestions()
+            ETAT_SUGGESTIONS["generation"] = generation
+            logger.info(f"Index de suggestions reconstruit en {(time.perf_counter() - debut) * 1000:.0f} ms")
+        return ETAT_SUGGESTIONS["arbre"]
+
+def obtenir_arbre_suggestions_acces(principaux):
+    _, documents = visibilite(principaux)
+    cle = (GENERATION_CATALOGUE, frozenset(principaux))
+    with VERROU_SUGGESTIONS:
+        arbres = ETAT_SUGGESTIONS["arbres_acces"]
+        arbre = arbres.get(cle)
+        if arbre is not None:
+            arbres.move_to_end(cle)
+            return arbre
+    
+    arbre = construire_arbre_suggestions(documents)
+    with VERROU_SUGGESTIONS:
+        arbres = ETAT_SUGGESTIONS["arbres_acces"]
+        for ancienne in [ancienne for ancienne in arbres if ancienne[0] != cle[0]]:
+            del arbres[ancienne]
+        arbres[cle] = arbre
+        while len(arbres) > CONFIG["acces_cache_filtres"]:
+            arbres.popitem(last=False)
+    return arbre
+
+def suggerer_elasticsearch(prefixe, maximum):
+    resultat = es.search(index=CONFIG["index_name"], body={
+        "_source": ["id", "nom", "avocat", "specialite", "mots_cles"],
+        "suggest": {
+            "suggestions": {
+                "prefix": prefixe,
+                "completion": {
+                    "field": "suggestion",
+                    "size": maximum * 3,
+                    "skip_duplicates": True,
+                    "fuzzy": {"fuzziness": 1 if len(prefixe) >= 4 else 0}
+                }
+            }
+        }
+    })
+    
+    suggestions = []
+    vus = set()
+    for option in resultat['suggest']['suggestions'][0]['options']:
+        doc = option.get('_source', {})
+        texte = option['text']
+        
+        if texte == doc.get('avocat') or doc.get('avocat', '').endswith(texte):
+            entree = {"texte": doc['avocat'], "type": "avocat"}
+        elif texte == doc.get('specialite') or doc.get('specialite', '').endswith(texte):
+            entree = {"texte": doc['specialite'], "type": "specialite"}
+        elif texte in doc.get('mots_cles', []):
+            entree = {"texte": texte, "type": "mot_cle"}
+        else:
+            entree = {"texte": doc.get('nom', texte), "type": "document", "id": doc.get('id')}
+        
+        cle = (entree['type'], entree['texte'], entree.get('id'))
+        if cle not in vus:
+            vus.add(cle)
+            suggestions.append(entree)
+        if len(suggestions) >= maximum:
+            break
+    
+    return suggestions
+
+def obtenir_suggestions(prefixe, maximum, utilisateur, principaux=None):
+    maintenant = time.monotonic()
+    moteur = "elasticsearch" if es and principaux is None else "local"
+    
+    with VERROU_SUGGESTIONS:
+        precedent = ETAT_SUGGESTIONS["utilisateurs"].get(utilisateur)
+        if precedent:
+            instant, prefixe_precedent, suggestions_precedentes, maximum_precedent, generation = precedent
+            if (maintenant - instant) * 1000 < CONFIG["suggestions_debounce_ms"] and generation == GENERATION_CATALOGUE and prefixe.startswith(prefixe_precedent):
+                suggestions = [s for s in suggestions_precedentes if correspond_prefixe(s['texte'], prefixe)]
+                if len(suggestions_precedentes) < maximum_precedent or len(suggestions) >= maximum:
+                    ETAT_SUGGESTIONS["utilisateurs"][utilisateur] = (maintenant, prefixe_precedent, suggestions_precedentes, maximum_precedent, generation)
+                    return suggestions[:maximum], moteur, "debounce"
+        
+        cle_cache = (GENERATION_CATALOGUE, moteur, prefixe, maximum, None if principaux is None else frozenset(principaux))
+        cache = ETAT_SUGGESTIONS["cache"]
+        entree_cache = cache.get(cle_cache)
+        if entree_cache and maintenant - entree_cache[0] < CONFIG["suggestions_cache_ttl"]:
+            cache.move_to_end(cle_cache)
+            ETAT_SUGGESTIONS["utilisateurs"][utilisateur] = (maintenant, prefixe, entree_cache[1], maximum, cle_cache[0])
+            return entree_cache[1], moteur, "cache"
+    
+    suggestions = None
+    if moteur == "elasticsearch":
+        try:
+            suggestions = suggerer_elasticsearch(prefixe, maximum)
+        except Exception as e:
+            logger.warning(f"Erreur suggestions Elasticsearch, bascule sur l'index local: {e}")
+            moteur = "local"
+    
+    if suggestions is None:
+        suggestions = obtenir_arbre_suggestions(principaux).rechercher(prefixe, maximum)
+    
+    with VERROU_SUGGESTIONS:
+        cache = ETAT_SUGGESTIONS["cache"]
+        cache[cle_cache] = (maintenant, suggestions)
+        cache.move_to_end(cle_cache)
+        while len(cache) > CONFIG["suggestions_cache_taille"]:
+            cache.popitem(last=False)
+        
+        utilisateurs = ETAT_SUGGESTIONS["utilisateurs"]
+        utilisateurs[utilisateur] = (maintenant, prefixe, suggestions, maximum, cle_cache[0])
+        if len(utilisateurs) > 1000:
+            for cle in [cle for cle, valeur in utilisateurs.items() if maintenant - valeur[0] > 60]:
+                del utilisateurs[cle]
+    
+    return suggestions, moteur, "index"
+
+ETAT_SIMILARITE = {"index": None, "groupes": {}, "generation": -1}
+VERROU_SIMILARITE = threading.Lock()
+
+def obtenir_index_similarite():
+    with VERROU_SIMILARITE:
+        if ETAT_SIMILARITE["index"] is None or ETAT_SIMILARITE["generation"] != GENERATION_CATALOGUE:
+            generation = GENERATION_CATALOGUE
+            debut = time.perf_counter()
+            
+            index_similarite = IndexSimilarite(CONFIG["similarite_bandes"])
+            for doc in charger_donnees(FICHIER_INDEX):
+                signature = doc.get('signature_minhash') or calculer_signature_minhash(doc.get('contenu_textuel', ''))
+                if signature:
+                    index_similarite.ajouter(doc['id'], signature)
+            
+            groupe_de = {}
+            for membres in index_similarite.groupes(CONFIG["similarite_seuil"]):
+                identifiant = min(membres)
+                for doc_id in membres:
+                    groupe_de[doc_id] = identifiant
+            
+            ETAT_SIMILARITE["index"] = index_similarite
+            ETAT_SIMILARITE["groupes"] = groupe_de
+            ETAT_SIMILARITE["generation"] = generation
+            logger.info(f"Index de similarité reconstruit en {(time.perf_counter() - debut) * 1000:.0f} ms ({len(index_similarite.signatures)} signatures)")
+        
+        return ETAT_SIMILARITE["index"], ETAT_SIMILARITE["groupes"]
+
+ETAT_ENTITES = {"index": {}, "facettes": {}, "generation": -1}
+VERROU_ENTITES = threading.Lock()
+
+def obtenir_index_entites():
+    with VERROU_ENTITES:
+        if ETAT_ENTITES["generation"] != GENERATION_CATALOGUE:
+            generation = GENERATION_CATALOGUE
+            index_entites = {type_entite: {} for type_entite in TYPES_ENTITES}
+            facettes = {type_entite: {} for type_entite in TYPES_ENTITES}
+            
+            for doc in charger_donnees(FICHIER_INDEX):
+                entites = doc.get('entites')
+                if entites is None:
+                    entites = extraire_entites(doc.get('contenu_textuel', ''))
+                for type_entite in TYPES_ENTITES:
+                    for valeur in entites.get(type_entite, []):
+                        index_entites[type_entite].setdefault(normaliser_suggestion(valeur), set()).add(doc['id'])
+                        facettes[type_entite][valeur] = facettes[type_entite].get(valeur, 0) + 1
+            
+            ETAT_ENTITES["index"] = index_entites
+            ETAT_ENTITES["facettes"] = facettes
+            ETAT_ENTITES["generation"] = generation
+        
+        return ETAT_ENTITES["index"], ETAT_ENTITES["facettes"]
+
+ETAT_CATALOGUE = {"documents": {}, "generation": -1}
+VERROU_CATALOGUE = threading.Lock()
+
+def obtenir_catalogue_par_id():
+    with VERROU_CATALOGUE:
+        if ETAT_CATALOGUE["generation"] != GENERATION_CATALOGUE:
+            generation = GENERATION_CATALOGUE
+            ETAT_CATALOGUE["documents"] = {doc['id']: doc for doc in charger_donnees(FICHIER_INDEX) if 'id' in doc}
+            ETAT_CATALOGUE["generation"] = generation
+        return ETAT_CATALOGUE["documents"]
+
+ROLES_UTILISATEURS = ("admin", "utilisateur")
+PREFIXES_ACCES = ("utilisateur:", "avocat:", "equipe:", "dossier:")
+COOKIE_SESSION = "session_cabinet"
+
+ETAT_ACCES = {"generation": -1, "documents": [], "bitsets": {}, "visibles": OrderedDict(), "sessions": {}}
+VERROU_ACCES = threading.Lock()
+
+def obtenir_bitsets_acces():
+    with VERROU_ACCES:
+        if ETAT_ACCES["generation"] != GENERATION_CATALOGUE:
+            generation = GENERATION_CATALOGUE
+            documents = list(obtenir_catalogue_par_id().values())
+            masques = {}
+            for position, doc in enumerate(documents):
+                for principal in acl_document(doc):
+                    masque = masques.get(principal)
+                    if masque is None:
+                        masque = masques[principal] = bytearray((len(documents) + 7) // 8)
+                    masque[position >> 3] |= 1 << (position & 7)
+            ETAT_ACCES["documents"] = documents
+            ETAT_ACCES["bitsets"] = {principal: int.from_bytes(masque, 'little') for principal, masque in masques.items()}
+            ETAT_ACCES["visibles"].clear()
+            ETAT_ACCES["generation"] = generation
+        return ETAT_ACCES["generation"], ETAT_ACCES["documents"], ETAT_ACCES["bitsets"]
+
+def visibilite(principaux):
+    generation, documents, bitsets = obtenir_bitsets_acces()
+    cle = (generation, frozenset(principaux))
+    with VERROU_ACCES:
+        entree = ETAT_ACCES["visibles"].get(cle)
+        if entree is not None:
+            ETAT_ACCES["visibles"].move_to_end(cle)
+            return entree
+    
+    masque = 0
+    for principal in principaux:
+        masque |= bitsets.get(principal, 0)
+    octets = masque.to_bytes((len(documents) + 7) // 8, 'little')
+    selection = [
+        documents[(position << 3) + bit]
+        for position, octet in enumerate(octets) if octet
+        for bit in range(8) if octet >> bit & 1
+    ]
+    entree = (frozenset(doc['id'] for doc in selection), selection)
+    
+    with VERROU_ACCES:
+        visibles = ETAT_ACCES["visibles"]
+        visibles[cle] = entree
+        while len(visibles) > CONFIG["acces_cache_filtres"]:
+            visibles.popitem(last=False)
+    return entree
+
+def principaux_acces():
+    utilisateur = g.get('utilisateur')
+    if not CONFIG["acces_actif"] or utilisateur is None or utilisateur["role"] == "admin":
+        return None
+    return utilisateur["principaux"]
+
+def ids_visibles():
+    principaux = principaux_acces()
+    return None if principaux is None else visibilite(principaux)[0]
+
+def documents_visibles():
+    principaux = principaux_acces()
+    return charger_donnees(FICHIER_INDEX) if principaux is None else visibilite(principaux)[1]
+
+def document_visible(doc, principaux):
+    return principaux is None or not principaux.isdisjoint(acl_document(doc))
+
+def hacher_mot_de_passe(mot_de_passe, sel=None, iterations=None):
+    sel = sel or secrets.token_hex(16)
+    iterations = iterations or CONFIG["acces_iterations_mot_de_passe"]
+    empreinte = hashlib.pbkdf2_hmac('sha256', mot_de_passe.encode('utf-8'), bytes.fromhex(sel), iterations).hex()
+    return f"pbkdf2_sha256${iterations}${sel}${empreinte}"
+
+def verifier_mot_de_passe(mot_de_passe, reference):
+    try:
+        _, iterations, sel, _ = reference.split('$')
+        return hmac.compare_digest(hacher_mot_de_passe(mot_de_passe, sel, int(iterations)), reference)
+    except (AttributeError, ValueError):
+        return False
+
+def charger_utilisateurs():
+    return charger_donnees(FICHIER_UTILISATEURS, [])
+
+def sauvegarder_utilisateurs(utilisateurs):
+    sauvegarder_donnees(FICHIER_UTILISATEURS, utilisateurs)
+
+def presenter_utilisateur(utilisateur):
+    return {cle: valeur for cle, valeur in utilisateur.items() if cle != 'mot_de_passe'}
+
+def principaux_utilisateur(utilisateur):
+    principaux = {"tous", f"utilisateur:{utilisateur['identifiant']}"}
+    if utilisateur.get('avocat'):
+        principaux.add(f"avocat:{utilisateur['avocat']}")
+    principaux.update(f"equipe:{equipe}" for equipe in utilisateur.get('equipes') or [])
+    principaux.update(f"dossier:{os.path.normpath(dossier)}" for dossier in utilisateur.get('dossiers') or [])
+    return frozenset(principaux)
+
+def lire_liste_acces(valeur):
+    if not isinstance(valeur, list) or not all(isinstance(principal, str) for principal in valeur):
+        raise ValueError("'acces' doit être une liste de chaînes")
+    acces = []
+    for principal in (principal.strip() for principal in valeur):
+        if principal != "tous" and not (principal.startswith(PREFIXES_ACCES) and principal.split(':', 1)[1]):
+            raise ValueError(f"Entrée d'accès invalide: {principal} (tous, {', '.join(p + '...' for p in PREFIXES_ACCES)})")
+        if principal not in acces:
+            acces.append(principal)
+    return acces
+
+def ouvrir_session(utilisateur):
+    jeton = secrets.token_urlsafe(32)
+    maintenant = time.time()
+    session = {
+        "jeton": jeton,
+        "identifiant": utilisateur['identifiant'],
+        "role": utilisateur.get('role', 'utilisateur'),
+        "principaux": principaux_utilisateur(utilisateur),
+        "changement_mot_de_passe": bool(utilisateur.get('changement_mot_de_passe')),
+        "expire": maintenant + CONFIG["acces_duree_session"]
+    }
+    with VERROU_ACCES:
+        sessions = ETAT_ACCES["sessions"]
+        for expire in [cle for cle, existante in sessions.items() if existante["expire"] < maintenant]:
+            del sessions[expire]
+        sessions[jeton] = session
+    return session
+
+def lire_session():
+    entete = request.headers.get('Authorization', '')
+    jeton = entete[7:].strip() if entete.startswith('Bearer ') else request.cookies.get(COOKIE_SESSION)
+    if not jeton:
+        return None
+    with VERROU_ACCES:
+        session = ETAT_ACCES["sessions"].get(jeton)
+        if session is not None and session["expire"] < time.time():
+            del ETAT_ACCES["sessions"][jeton]
+            session = None
+        return session
+
+def fermer_sessions(identifiant=None, jeton=None):
+    with VERROU_ACCES:
+        sessions = ETAT_ACCES["sessions"]
+        for cle in [cle for cle, session in sessions.items() if cle == jeton or session["identifiant"] == identifiant]:
+            del sessions[cle]
+
+def initialiser_acces():
+    if not CONFIG["acces_actif"] or charger_utilisateurs():
+        return
+    mot_de_passe = secrets.token_urlsafe(12)
+    os.makedirs(os.path.dirname(FICHIER_MOT_DE_PASSE_INITIAL) or '.', exist_ok=True)
+    descripteur = os.open(FICHIER_MOT_DE_PASSE_INITIAL, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descripteur, 'w', encoding='utf-8') as f:
+        f.write(f"identifiant: admin\nmot de passe: {mot_de_passe}\n")
+    if os.name != 'nt':
+        os.chmod(FICHIER_MOT_DE_PASSE_INITIAL, 0o600)
+    sauvegarder_utilisateurs([{
+        "identifiant": "admin",
+        "nom": "Administrateur",
+        "role": "admin",
+        "avocat": None,
+        "equipes": [],
+        "dossiers": [],
+        "mot_de_passe": hacher_mot_de_passe(mot_de_passe),
+        "changement_mot_de_passe": True
+    }])
+    logger.warning(f"Compte administrateur créé: identifiant 'admin', mot de passe initial dans {FICHIER_MOT_DE_PASSE_INITIAL} (à changer à la première connexion)")
+
+def synchroniser_acl_elasticsearch():
+    if not es:
+        return {"mis_a_jour": 0, "erreurs": 0}
+    catalogue = obtenir_catalogue_par_id()
+    documents = []
+    try:
+        for hit in helpers.scan(es, index=CONFIG["index_name"], size=1000, query={"_source": ["acl"]}):
+            doc = catalogue.get(hit['_id'])
+            if doc is not None and hit.get('_source', {}).get('acl') != acl_document(doc):
+                documents.append(doc)
+    except Exception as e:
+        logger.error(f"Erreur recherche des documents sans ACL à jour: {e}")
+        return {"mis_a_jour": 0, "erreurs": 0}
+    if documents:
+        logger.info(f"Mise à jour des ACL de {len(documents)} document(s) Elasticsearch")
+    return mettre_a_jour_elasticsearch_en_masse(documents, ['acces'])
+
+initialiser_acces()
+if CONFIG["acces_actif"] and es:
+    threading.Thread(target=synchroniser_acl_elasticsearch, name="acl-elasticsearch", daemon=True).start()
+
+def synchroniser_entites_elasticsearch():
+    if not es:
+        return {"indexes": 0, "erreurs": 0}
+    try:
+        ids = [
+            hit['_id'] for hit in helpers.scan(es, index=CONFIG["index_name"], size=1000, query={
+                "query": {"bool": {"filter": {"exists": {"field": "entites"}}, "must_not": {"exists": {"field": "entites_normalisees"}}}},
+                "_source": False
+            })
+        ]
+    except Exception as e:
+        logger.error(f"Erreur recherche des documents sans entités normalisées: {e}")
+        return {"indexes": 0, "erreurs": 0}
+    catalogue = obtenir_catalogue_par_id()
+    documents = [catalogue[document_id] for document_id in ids if document_id in catalogue]
+    if documents:
+        logger.info(f"Réindexation de {len(documents)} document(s) Elasticsearch pour les filtres d'entités")
+    return indexer_elasticsearch_en_masse(documents)
+
+if es:
+    threading.Thread(target=synchroniser_entites_elasticsearch, name="entites-elasticsearch", daemon=True).start()
+
+def lire_filtres_entites(arguments):
+    filtres = {}
+    for type_entite in TYPES_ENTITES:
+        valeur = arguments.get(type_entite, '').strip()
+        if valeur:
+            filtres[type_entite] = normaliser_valeur_entite(type_entite, valeur)
+    return filtres
+
+def documents_par_entites(filtres):
+    index_entites, _ = obtenir_index_entites()
+    ids = None
+    for type_entite, valeur in filtres.items():
+        trouves = index_entites[type_entite].get(normaliser_suggestion(valeur), set())
+        ids = set(trouves) if ids is None else ids & trouves
+    return ids if ids is not None else set()
+
+def regrouper_quasi_doublons(resultats):
+    _, groupe_de = obtenir_index_similarite()
+    representants = {}
+    regroupes = []
+    
+    for doc in resultats:
+        groupe = groupe_de.get(doc.get('id'))
+        if groupe is None:
+            regroupes.append(doc)
+        elif groupe in representants:
+            representants[groupe]['doublons'].append(doc['id'])
+        else:
+            doc['doublons'] = []
+            representants[groupe] = doc
+            regroupes.append(doc)
+    
+    return regroupes
+
+MOTIF_MOT = re.compile(r'\S+')
+
+def decouper_segments(texte, reperes):
+    if not texte or texte.startswith('['):
+        return []
+    
+    debuts = [debut for debut, _ in reperes] or [0]
+    numeros = [numero for _, numero in reperes] or [None]
+    taille = CONFIG["semantique_mots_segment"]
+    pas = max(1, taille - CONFIG["semantique_chevauchement"])
+    segments = []
+    for rang, debut_page in enumerate(debuts):
+        mots = [(mot.start(), mot.end()) for mot in MOTIF_MOT.finditer(texte, debut_page, fin_de_page(texte, debuts, rang))]
+        for debut in range(0, len(mots), pas):
+            fenetre = mots[debut:debut + taille]
+            segments.append({"page": numeros[rang], "debut": fenetre[0][0], "fin": fenetre[-1][1]})
+            if debut + taille >= len(mots):
+                break
+        if len(segments) >= CONFIG["semantique_segments_max_document"]:
+            return segments[:CONFIG["semantique_segments_max_document"]]
+    return segments
+
+class IndexVectoriel:
+    def __init__(self, dimension):
+        self.dimension = dimension
+        self.segments = []
+        self.blocs = []
+        self.matrice = np.zeros((0, dimension), dtype=np.float32)
+        self.actifs = []
+        self.documents = {}
+        self.empreintes = {}
+        self.hnsw = None
+        if HNSWLIB_DISPONIBLE:
+            self.hnsw = hnswlib.Index(space='ip', dim=dimension)
+            self.hnsw.init_index(max_elements=1024, ef_construction=200, M=16)
+            self.hnsw.set_ef(128)
+    
+    def moteur(self):
+        return "hnsw" if self.hnsw is not None else "numpy"
+    
+    def vecteurs(self):
+        if self.blocs:
+            self.matrice = np.vstack([self.matrice] + self.blocs)
+            self.blocs = []
+        return self.matrice
+    
+    def actives(self):
+        return sum(len(positions) for positions in self.documents.values())
+    
+    def ajouter(self, document_id, empreinte, segments, vecteurs):
+        debut = len(self.segments)
+        self.segments.extend(dict(segment, document_id=document_id) for segment in segments)
+        self.actifs.extend([True] * len(segments))
+        self.blocs.append(np.asarray(vecteurs, dtype=np.float32))
+        if self.hnsw is not None and len(segments):
+            if len(self.segments) > self.hnsw.get_max_elements():
+                self.hnsw.resize_index(max(len(self.segments), self.hnsw.get_max_elements() * 2))
+            self.hnsw.add_items(vecteurs, list(range(debut, len(self.segments))))
+        self.documents[document_id] = list(range(debut, len(self.segments)))
+        if empreinte:
+            self.empreintes[document_id] = empreinte
+    
+    def copier(self, source_id, document_id, empreinte):
+        positions = self.documents[source_id]
+        vecteurs = self.vecteurs()[positions] if positions else np.zeros((0, self.dimension), dtype=np.float32)
+        segments = [{cle: valeur for cle, valeur in self.segments[position].items() if cle != 'document_id'} for position in positions]
+        self.ajouter(document_id, empreinte, segments, vecteurs)
+    
+    def retirer(self, document_id):
+        for position in self.documents.pop(document_id, []):
+            self.actifs[position] = False
+            if self.hnsw is not None:
+                self.hnsw.mark_deleted(position)
+        self.empreintes.pop(document_id, None)
+    
+    def rechercher(self, vecteur, k):
+        total = self.actives()
+        if not total:
+            return []
+        k = min(k, total)
+        if self.hnsw is not None:
+            positions, distances = self.hnsw.knn_query(vecteur, k=k)
+            return [(self.segments[position], 1 - float(distance)) for position, distance in zip(positions[0], distances[0])]
+        scores = self.vecteurs() @ vecteur
+        scores[~np.asarray(self.actifs, dtype=bool)] = -np.inf
+        meilleurs = np.argpartition(-scores, k - 1)[:k]
+        meilleurs = meilleurs[np.argsort(-scores[meilleurs])]
+        return [(self.segments[position], float(scores[position])) for position in meilleurs]
+    
+    def compacter(self, complet=False):
+        inactifs = len(self.segments) - self.actives()
+        if not inactifs or (not complet and inactifs <= 0.3 * len(self.segments)):
+            return self
+        nouvel_index = IndexVectoriel(self.dimension)
+        vecteurs = self.vecteurs()
+        for document_id, positions in self.documents.items():
+            segments = [{cle: valeur for cle, valeur in self.segments[position].items() if cle != 'document_id'} for position in positions]
+            nouvel_index.ajouter(document_id, self.empreintes.get(document_id), segments, vecteurs[positions])
+        return nouvel_index
+    
+    def sauvegarder(self, modele):
+        index = self.compacter(complet=True)
+        tampon = io.BytesIO()
+        np.save(tampon, index.vecteurs())
+        ecrire_fichier_atomique(FICHIER_VECTEURS, tampon.getvalue())
+        sauvegarder_donnees(FICHIER_SEGMENTS, {
+            "modele": modele,
+            "dimension": index.dimension,
+            "segments": index.segments,
+            "empreintes": index.empreintes
+        })
+        return index
+    
+    @staticmethod
+    def charger(modele, dimension):
+        index = IndexVectoriel(dimension)
+        try:
+            donnees = charger_donnees(FICHIER_SEGMENTS)
+        except ErreurStockage as e:
+            logger.warning(f"Index sémantique reconstruit: {e}")
+            return index
+        if not donnees or donnees.get("modele") != modele or donnees.get("dimension") != dimension:
+            return index
+        try:
+            vecteurs = np.load(FICHIER_VECTEURS)
+        except (OSError, ValueError):
+            return index
+        if len(vecteurs) != len(donnees["segments"]):
+            return index
+        
+        par_document = OrderedDict()
+        for position, segment in enumerate(donnees["segments"]):
+            par_document.setdefault(segment["document_id"], []).append(position)
+        for document_id, positions in par_document.items():
+            segments = [{cle: valeur for cle, valeur in donnees["segments"][position].items() if cle != 'document_id'} for position in positions]
+            index.ajouter(document_id, donnees["empreintes"].get(document_id), segments, vecteurs[positions])
+        return index
+
+ETAT_SEMANTIQUE = {"modele": None, "index": None, "erreur": None, "en_attente": 0, "derniere_synchronisation": None, "generation": -1}
+VERROU_SEMANTIQUE = threading.RLock()
+
+def obtenir_modele_semantique():
+    with VERROU_SEMANTIQUE:
+        if ETAT_SEMANTIQUE["modele"] is None and ETAT_SEMANTIQUE["erreur"] is None:
+            try:
+                if not NUMPY_DISPONIBLE:
+                    raise ImportError("numpy non installé")
+                from sentence_transformers import SentenceTransformer
+                ETAT_SEMANTIQUE["modele"] = SentenceTransformer(CONFIG["semantique_modele"], device='cpu')
+                logger.info(f"Modèle sémantique chargé: {CONFIG['semantique_modele']}")
+            except Exception as e:
+                ETAT_SEMANTIQUE["erreur"] = str(e)
+                logger.warning(f"Recherche sémantique indisponible: {e}")
+        return ETAT_SEMANTIQUE["modele"]
+
+def encoder_textes(textes, prefixe):
+    modele = obtenir_modele_semantique()
+    vecteurs = modele.encode(
+        [prefixe + texte for texte in textes],
+        batch_size=CONFIG["semantique_taille_lot"],
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+    return np.asarray(vecteurs, dtype=np.float32).reshape(len(textes), -1)
+
+def obtenir_index_vectoriel():
+    with VERROU_SEMANTIQUE:
+        if ETAT_SEMANTIQUE["index"] is None:
+            modele = obtenir_modele_semantique()
+            if modele is None:
+                return None
+            dimension = modele.get_sentence_embedding_dimension()
+            ETAT_SEMANTIQUE["index"] = IndexVectoriel.charger(CONFIG["semantique_modele"], dimension)
+            initialiser_index_segments(dimension)
+        return ETAT_SEMANTIQUE["index"]
+
+def semantique_disponible():
+    return CONFIG["semantique_active"] and ETAT_SEMANTIQUE["index"] is not None and ETAT_SEMANTIQUE["index"].actives() > 0
+
+def initialiser_index_segments(dimension):
+    if not es:
+        return
+    try:
+        if not es.indices.exists(index=INDEX_SEGMENTS):
+            es.indices.create(index=INDEX_SEGMENTS, mappings={"properties": {
+                "document_id": {"type": "keyword"},
+                "page": {"type": "integer"},
+                "debut": {"type": "integer", "index": False},
+                "fin": {"type": "integer", "index": False},
+                "vecteur": {"type": "dense_vector", "dims": dimension, "index": True, "similarity": "dot_product"}
+            }})
+    except Exception as e:
+        logger.warning(f"Erreur initialisation index des segments: {e}")
+
+def indexer_segments_elasticsearch(document_id, segments, vecteurs):
+    if not es:
+        return
+    actions = (
+        {
+            "_index": INDEX_SEGMENTS,
+            "_id": f"{document_id}_{rang}",
+            "_source": {"document_id": document_id, **segment, "vecteur": vecteur.tolist()}
+        }
+        for rang, (segment, vecteur) in enumerate(zip(segments, vecteurs))
+    )
+    try:
+        helpers.bulk(es, actions, chunk_size=200, raise_on_error=False)
+    except Exception as e:
+        logger.error(f"Erreur indexation des segments: {e}")
+
+def calculer_vecteurs_documents(documents):
+    resultats = []
+    for doc in documents:
+        texte = doc.get('contenu_textuel', '')
+        segments = decouper_segments(texte, doc.get('reperes_pages') or reperes_pages(texte))
+        textes = [texte[segment["debut"]:segment["fin"]] for segment in segments]
+        vecteurs = encoder_textes(textes, CONFIG["semantique_prefixe_passage"]) if textes else None
+        resultats.append((doc, segments, vecteurs))
+    return resultats
+
+def enregistrer_vecteurs(index, resultats):
+    with VERROU_SEMANTIQUE:
+        for doc, segments, vecteurs in resultats:
+            if vecteurs is None:
+                vecteurs = np.zeros((0, index.dimension), dtype=np.float32)
+            index.ajouter(doc['id'], doc.get('empreinte'), segments, vecteurs)
+            ETAT_SEMANTIQUE["en_attente"] -= 1
+    for doc, segments, vecteurs in resultats:
+        if vecteurs is not None:
+            indexer_segments_elasticsearch(doc['id'], segments, vecteurs)
+
+def synchroniser_semantique():
+    index = obtenir_index_vectoriel()
+    if index is None:
+        return False
+    
+    generation = GENERATION_CATALOGUE
+    catalogue = obtenir_catalogue_par_id()
+    with VERROU_SEMANTIQUE:
+        perimes = [
+            document_id for document_id in index.documents
+            if document_id in catalogue and index.empreintes.get(document_id) != catalogue[document_id].get('empreinte')
+        ]
+        for document_id in perimes:
+            index.retirer(document_id)
+        if es and perimes:
+            try:
+                es.delete_by_query(index=INDEX_SEGMENTS, query={"terms": {"document_id": perimes}}, conflicts="proceed", refresh=True)
+            except Exception as e:
+                logger.warning(f"Erreur suppression des segments: {e}")
+        
+        source_par_empreinte = {empreinte: document_id for document_id, empreinte in index.empreintes.items()}
+        a_calculer = []
+        copies = 0
+        for document_id, doc in catalogue.items():
+            if document_id in index.documents:
+                continue
+            source = source_par_empreinte.get(doc.get('empreinte'))
+            if source is not None:
+                index.copier(source, document_id, doc.get('empreinte'))
+                copies += 1
+                if es:
+                    positions = index.documents[document_id]
+                    indexer_segments_elasticsearch(document_id, [index.segments[p] for p in positions], index.vecteurs()[positions])
+            elif doc.get('contenu_textuel') and not doc['contenu_textuel'].startswith('['):
+                a_calculer.append(doc)
+        
+        supprimes = [document_id for document_id in index.documents if document_id not in catalogue]
+        for document_id in supprimes:
+            index.retirer(document_id)
+        ETAT_SEMANTIQUE["en_attente"] = len(a_calculer)
+    
+    if es and supprimes:
+        try:
+            es.delete_by_query(index=INDEX_SEGMENTS, query={"terms": {"document_id": supprimes}}, conflicts="proceed")
+        except Exception as e:
+            logger.warning(f"Erreur suppression des segments: {e}")
+    
+    en_cours = deque()
+    taille_lot = CONFIG["semantique_documents_par_lot"]
+    with ORDONNANCEUR.travail("vecteurs sémantiques", quota=1) as travail:
+        for debut in range(0, len(a_calculer), taille_lot):
+            en_cours.append(travail.soumettre(calculer_vecteurs_documents, a_calculer[debut:debut + taille_lot]))
+            while en_cours and en_cours[0].done():
+                enregistrer_vecteurs(index, en_cours.popleft().result())
+    while en_cours:
+        enregistrer_vecteurs(index, en_cours.popleft().result())
+    
+    with VERROU_SEMANTIQUE:
+        if copies or supprimes or perimes or a_calculer:
+            ETAT_SEMANTIQUE["index"] = index.sauvegarder(CONFIG["semantique_modele"])
+        ETAT_SEMANTIQUE["generation"] = generation
+        ETAT_SEMANTIQUE["derniere_synchronisation"] = datetime.now().isoformat()
+    return True
+
+def boucle_semantique():
+    while True:
+        if ETAT_SEMANTIQUE["generation"] != GENERATION_CATALOGUE:
+            try:
+                if not synchroniser_semantique():
+                    return
+            except Exception as e:
+                logger.error(f"Erreur calcul des vecteurs sémantiques: {e}")
+        time.sleep(CONFIG["semantique_intervalle"])
+
+def rechercher_semantique(terme, ids_autorises=None):
+    index = obtenir_index_vectoriel()
+    if index is None or not terme:
+        return []
+    
+    vecteur = encoder_textes([terme], CONFIG["semantique_prefixe_requete"])[0]
+    k = CONFIG["semantique_k"]
+    if es:
+        resultat = es.search(index=INDEX_SEGMENTS, body={
+            "knn": {"field": "vecteur", "query_vector": vecteur.tolist(), "k": k * 4, "num_candidates": k * 20},
+            "_source": ["document_id", "page", "debut", "fin"],
+            "size": k * 4
+        })
+        correspondances = [(hit['_source'], 2 * hit['_score'] - 1) for hit in resultat['hits']['hits']]
+    else:
+        with VERROU_SEMANTIQUE:
+            correspondances = index.rechercher(vecteur, k * 4)
+    
+    meilleurs = OrderedDict()
+    for segment, score in correspondances:
+        document_id = segment['document_id']
+        if score < CONFIG["semantique_score_min"] or document_id in meilleurs or (ids_autorises is not None and document_id not in ids_autorises):
+            continue
+        meilleurs[document_id] = {"id": document_id, "score": score, "page": segment.get('page'), "debut": segment['debut'], "fin": segment['fin']}
+    return sorted(meilleurs.values(), key=lambda r: r['score'], reverse=True)[:k]
+
+def documents_autorises(catalogue, specialite, avocat, categorie, filtres_entites):
+    if not (specialite or avocat or categorie or filtres_entites):
+        return None
+    ids_entites = documents_par_entites(filtres_entites) if filtres_entites else None
+    return {
+        document_id for document_id, doc in catalogue.items()
+        if (not specialite or doc.get('specialite') == specialite)
+        and (not avocat or doc.get('avocat') == avocat)
+        and (not categorie or doc.get('categorie') == categorie)
+        and (ids_entites is None or document_id in ids_entites)
+    }
+
+def passage_semantique(doc, correspondance, motif):
+    fragment = ' '.join(doc.get('contenu_textuel', '')[correspondance['debut']:correspondance['fin']].split())
+    if len(fragment) > CONFIG["passages_taille"]:
+        fragment = fragment[:CONFIG["passages_taille"]].rsplit(' ', 1)[0]
+    return {"page": correspondance['page'], "texte": surligner(fragment, motif) if motif else html.escape(fragment)}
+
+def fusionner_resultats_semantiques(resultats, semantiques, terme, mode):
+    catalogue = obtenir_catalogue_par_id()
+    motif = compiler_motif_termes(termes_surlignage(terme))
+    par_id = {doc['id']: doc for doc in resultats if 'id' in doc}
+    classements = [[doc['id'] for doc in resultats if 'id' in doc]] if mode == "hybride" else []
+    classements.append([correspondance['id'] for correspondance in semantiques])
+    
+    scores = {}
+    for classement in classements:
+        for rang, document_id in enumerate(classement):
+            scores[document_id] = scores.get(document_id, 0) + 1 / (CONFIG["semantique_rrf_k"] + rang + 1)
+    
+    fusion = []
+    semantiques_par_id = {correspondance['id']: correspondance for correspondance in semantiques}
+    for document_id in sorted(scores, key=scores.get, reverse=True):
+        correspondance = semantiques_par_id.get(document_id)
+        doc = par_id.get(document_id)
+        if doc is None:
+            local = catalogue.get(document_id)
+            if local is None:
+                continue
+            doc = presenter_document(local, [passage_semantique(local, correspondance, motif)])
+        elif correspondance and not doc.get('passages') and document_id in catalogue:
+            doc['passages'] = [passage_semantique(catalogue[document_id], correspondance, motif)]
+        doc['score'] = round(scores[document_id], 6)
+        if correspondance:
+            doc['score_semantique'] = round(correspondance['score'], 4)
+        fusion.append(doc)
+    return fusion
+
+if CONFIG["semantique_active"]:
+    threading.Thread(target=boucle_semantique, name="vecteurs-semantiques", daemon=True).start()
+
+TABLE_GEAR = [int.from_bytes(hashlib.sha256(bytes([octet])).digest()[:4], 'big') for octet in range(256)]
+TAILLE_FENETRE_GEAR = 1 << 22
+
+def coupures_candidates(donnees, masque):
+    if NUMPY_DISPONIBLE:
+        table = np.array(TABLE_GEAR, dtype=np.uint32)
+        positions = []
+        for debut in range(0, len(donnees), TAILLE_FENETRE_GEAR):
+            origine = max(0, debut - 31)
+            valeurs = table[np.frombuffer(donnees[origine:debut + TAILLE_FENETRE_GEAR], dtype=np.uint8)]
+            empreintes = valeurs.copy()
+            for decalage in range(1, min(32, len(valeurs))):
+                empreintes[decalage:] += valeurs[:len(valeurs) - decalage] << np.uint32(decalage)
+            trouvees = np.flatnonzero((empreintes & np.uint32(masque)) == 0) + origine + 1
+            positions.extend(trouvees[trouvees > debut].tolist())
+        return positions
+    
+    positions = []
+    empreinte = 0
+    for position, octet in enumerate(donnees):
+        empreinte = ((empreinte << 1) + TABLE_GEAR[octet]) & 0xFFFFFFFF
+        if not empreinte & masque:
+            positions.append(position + 1)
+    return positions
+
+def decouper_blocs(donnees):
+    minimum, maximum = CONFIG["versions_bloc_min"], CONFIG["versions_bloc_max"]
+    bits = max(1, (CONFIG["versions_bloc_moyen"] - minimum).bit_length() - 1)
+    masque = ((1 << bits) - 1) << (32 - bits)
+    
+    coupures = []
+    debut = 0
+    for position in coupures_candidates(donnees, masque) + [len(donnees)]:
+        while position - debut > maximum:
+            debut += maximum
+            coupures.append(debut)
+        if position > debut and (position - debut >= minimum or position == len(donnees)):
+            coupures.append(position)
+            debut = position
+    return [donnees[a:b] for a, b in zip([0] + coupures, coupures)]
+
+def chemin_bloc(empreinte):
+    return os.path.join(DOSSIER_VERSIONS, "blocs", empreinte[:2], empreinte)
+
+def stocker_contenu(donnees):
+    empreintes = []
+    dossiers = set()
+    octets_stockes = 0
+    for bloc in decouper_blocs(donnees):
+        empreinte = hashlib.sha256(bloc).hexdigest()
+        empreintes.append(empreinte)
+        chemin = chemin_bloc(empreinte)
+        if os.path.exists(chemin):
+            continue
+        compresse = zlib.compress(bloc, 6)
+        contenu = b'z' + compresse if len(compresse) < len(bloc) else b'b' + bloc
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        temporaire = f"{chemin}.{threading.get_ident()}.tmp"
+        with open(temporaire, 'wb') as f:
+            f.write(contenu)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporaire, chemin)
+        dossiers.add(os.path.dirname(chemin))
+        octets_stockes += len(contenu)
+    for dossier in dossiers:
+        synchroniser_dossier(dossier)
+    return {
+        "taille": len(donnees),
+        "sha256": hashlib.sha256(donnees).hexdigest(),
+        "blocs": empreintes,
+        "octets_stockes": octets_stockes
+    }
+
+def lire_contenu(contenu):
+    if contenu["blocs"] is None:
+        raise ContenuNonConserve("Contenu non conservé pour cette version")
+    morceaux = []
+    for empreinte in contenu["blocs"]:
+        with open(chemin_bloc(empreinte), 'rb') as f:
+            brut = f.read()
+        bloc = zlib.decompress(brut[1:]) if brut[:1] == b'z' else brut[1:]
+        if hashlib.sha256(bloc).hexdigest() != empreinte:
+            raise ErreurStockage(f"Bloc de version corrompu: {empreinte}")
+        morceaux.append(bloc)
+    return b''.join(morceaux)
+
+def fichier_versions(document_id):
+    return os.path.join(DOSSIER_VERSIONS, f"{document_id}.json")
+
+def charger_versions(document_id):
+    return charger_donnees(fichier_versions(document_id))
+
+VERROU_VERSIONS = threading.Lock()
+
+def reference_contenu(taille, sha256, **autres):
+    return {"taille": taille, "sha256": sha256, "blocs": None, "octets_stockes": 0, **autres}
+
+def creer_version(doc, motif, precedente=None, reference=False):
+    texte = (doc.get('contenu_textuel') or '').encode('utf-8')
+    sha_texte = hashlib.sha256(texte).hexdigest()
+    if precedente and precedente["texte"]["sha256"] == sha_texte:
+        version_texte = dict(precedente["texte"], octets_stockes=0)
+    elif reference:
+        version_texte = reference_contenu(len(texte), sha_texte)
+    else:
+        version_texte = stocker_contenu(texte)
+    
+    version_fichier = None
+    try:
+        etat = os.stat(doc.get('chemin', ''))
+    except OSError:
+        etat = None
+    if etat is not None:
+        fichier_precedent = precedente.get("fichier") if precedente else None
+        if fichier_precedent and fichier_precedent["taille"] == etat.st_size and fichier_precedent.get("modifie_ns") == etat.st_mtime_ns:
+            version_fichier = dict(fichier_precedent, octets_stockes=0)
+        elif reference:
+            sha_fichier = doc.get('empreinte') if doc.get('taille') == etat.st_size else None
+            version_fichier = reference_contenu(etat.st_size, sha_fichier, modifie_ns=etat.st_mtime_ns)
+        else:
+            with open(doc['chemin'], 'rb') as f:
+                version_fichier = dict(stocker_contenu(f.read()), modifie_ns=etat.st_mtime_ns)
+    
+    return {
+        "version": precedente["version"] + 1 if precedente else 1,
+        "date": datetime.now().isoformat(),
+        "motif": motif,
+        "metadonnees": {cle: valeur for cle, valeur in doc.items() if cle not in CHAMPS_NON_EXPOSES},
+        "fichier": version_fichier,
+        "texte": version_texte
+    }
+
+def materialiser_versions(doc, versions):
+    derniere = versions[-1]
+    remplacements = {}
+    texte = (doc.get('contenu_textuel') or '').encode('utf-8')
+    if derniere["texte"]["blocs"] is None and derniere["texte"]["sha256"] == hashlib.sha256(texte).hexdigest():
+        remplacements["texte"] = stocker_contenu(texte)
+    fichier = derniere.get("fichier")
+    if fichier and fichier["blocs"] is None:
+        try:
+            etat = os.stat(doc.get('chemin', ''))
+        except OSError:
+            etat = None
+        if etat is not None and etat.st_size == fichier["taille"] and etat.st_mtime_ns == fichier["modifie_ns"]:
+            with open(doc['chemin'], 'rb') as f:
+                remplacements["fichier"] = dict(stocker_contenu(f.read()), modifie_ns=etat.st_mtime_ns)
+    
+    for champ, contenu in remplacements.items():
+        reference = derniere[champ]
+        for version in versions:
+            entree = version.get(champ)
+            if entree and entree["blocs"] is None and all(entree.get(cle) == reference.get(cle) for cle in ("taille", "sha256", "modifie_ns")):
+                version[champ] = dict(contenu, octets_stockes=contenu["octets_stockes"] if version is derniere else 0)
+    return bool(remplacements)
+
+def assurer_version_initiale(doc):
+    if not CONFIG["versions_actives"]:
+        return
+    with VERROU_VERSIONS:
+        if not os.path.exists(fichier_versions(doc['id'])):
+            sauvegarder_donnees(fichier_versions(doc['id']), [creer_version(doc, "initiale")])
+            return
+        versions = charger_versions(doc['id'])
+        if versions and materialiser_versions(doc, versions):
+            sauvegarder_donnees(fichier_versions(doc['id']), versions)
+
+def historiser_document(doc, motif):
+    if not CONFIG["versions_actives"]:
+        return None
+    with VERROU_VERSIONS:
+        versions = charger_versions(doc['id'])
+        versions.append(creer_version(doc, motif, versions[-1] if versions else None))
+        sauvegarder_donnees(fichier_versions(doc['id']), versions)
+    return versions[-1]
+
+def historiser_documents(modifications, motif):
+    if not CONFIG["versions_actives"]:
+        return
+    os.makedirs(DOSSIER_VERSIONS, exist_ok=True)
+    with VERROU_VERSIONS:
+        for ancien, doc in modifications:
+            versions = charger_versions(doc['id']) or [creer_version(ancien, "initiale", reference=True)]
+            versions.append(creer_version(doc, motif, versions[-1], reference=True))
+            sauvegarder_donnees(fichier_versions(doc['id']), versions)
+
+def restaurer_fichier_precedent(chemin, precedent):
+    versions = charger_versions(precedent['id']) if precedent and CONFIG["versions_actives"] else []
+    fichier = versions[-1].get("fichier") if versions else None
+    if fichier and fichier["blocs"] is not None:
+        ecrire_fichier_atomique(chemin, lire_contenu(fichier))
+        os.utime(chemin, ns=(fichier["modifie_ns"], fichier["modifie_ns"]))
+    elif precedent:
+        logger.error(f"Impossible de restaurer {chemin}: aucune copie de la version précédente")
+    elif os.path.exists(chemin):
+        os.remove(chemin)
+
+def resume_version(version):
+    fichier = version.get("fichier") or {}
+    return {
+        "version": version["version"],
+        "date": version["date"],
+        "motif": version["motif"],
+        "nom": version["metadonnees"].get("nom"),
+        "taille": fichier.get("taille"),
+        "sha256": fichier.get("sha256"),
+        "octets_stockes": fichier.get("octets_stockes", 0) + version["texte"].get("octets_stockes", 0),
+        "metadonnees": version["metadonnees"]
+    }
+
+def contenu_version(document_id, version, champ):
+    contenu = version[champ]
+    if contenu["blocs"] is not None:
+        return lire_contenu(contenu)
+    doc = obtenir_catalogue_par_id().get(document_id) or {}
+    if champ == "texte":
+        texte = (doc.get('contenu_textuel') or '').encode('utf-8')
+        if hashlib.sha256(texte).hexdigest() == contenu["sha256"]:
+            return texte
+    elif doc.get('chemin'):
+        try:
+            etat = os.stat(doc['chemin'])
+            if etat.st_size == contenu["taille"] and etat.st_mtime_ns == contenu["modifie_ns"]:
+                with open(doc['chemin'], 'rb') as f:
+                    return f.read()
+        except OSError:
+            pass
+    raise ContenuNonConserve(f"Contenu de la version {version['version']} non conservé (modifié hors de l'application)")
+
+def differences_versions(document_id, ancienne, nouvelle):
+    metadonnees = {
+        champ: [ancienne["metadonnees"].get(champ), nouvelle["metadonnees"].get(champ)]
+        for champ in sorted(set(ancienne["metadonnees"]) | set(nouvelle["metadonnees"]))
+        if ancienne["metadonnees"].get(champ) != nouvelle["metadonnees"].get(champ)
+    }
+    if ancienne["texte"]["sha256"] == nouvelle["texte"]["sha256"]:
+        lignes = []
+    else:
+        lignes = list(difflib.unified_diff(
+            contenu_version(document_id, ancienne, "texte").decode('utf-8').splitlines(),
+            contenu_version(document_id, nouvelle, "texte").decode('utf-8').splitlines(),
+            fromfile=f"version {ancienne['version']}",
+            tofile=f"version {nouvelle['version']}",
+            lineterm=''
+        ))
+    return metadonnees, lignes
+
+class ProfileurEchantillonnage:
+    def __init__(self, thread_id, intervalle):
+        self.thread_id = thread_id
+        self.intervalle = intervalle
+        self.piles = {}
+        self.echantillons = 0
+        self.actif = True
+        self.debut = time.perf_counter()
+        self.thread = threading.Thread(target=self.echantillonner, daemon=True)
+    
+    def demarrer(self):
+        self.thread.start()
+    
+    def echantillonner(self):
+        while self.actif:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                pile = []
+                while frame is not None:
+                    code = frame.f_code
+                    pile.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                cle = ';'.join(reversed(pile))
+                self.piles[cle] = self.piles.get(cle, 0) + 1
+                self.echantillons += 1
+            time.sleep(self.intervalle)
+    
+    def arreter(self):
+        self.actif = False
+        self.thread.join()
+        
+        fonctions = {}
+        for pile, nombre in self.piles.items():
+            cadres = pile.split(';')
+            for cadre in set(cadres):
+                fonctions.setdefault(cadre, [0, 0])[1] += nombre
+            fonctions[cadres[-1]][0] += nombre
+        
+        return {
+            "duree_ms": round((time.perf_counter() - self.debut) * 1000, 2),
+            "echantillons": self.echantillons,
+            "intervalle_ms": self.intervalle * 1000,
+            "fonctions": [
+                {"fonction": cadre, "propre": propre, "cumule": cumule}
+                for cadre, (propre, cumule) in sorted(fonctions.items(), key=lambda x: x[1][0], reverse=True)[:40]
+            ],
+            "piles": sorted(self.piles.items(), key=lambda x: x[1], reverse=True)
+        }
+
+ETAT_PROFILAGE = {"actif": False, "restant": 0, "profils": OrderedDict()}
+VERROU_PROFILAGE = threading.Lock()
+
+def doit_profiler():
+    if request.path.startswith('/api/profilage') or request.path == '/metrics':
+        return False
+    with VERROU_PROFILAGE:
+        if ETAT_PROFILAGE["restant"] > 0:
+            ETAT_PROFILAGE["restant"] -= 1
+            return True
+        return ETAT_PROFILAGE["actif"] and (request.args.get('profil') == '1' or request.headers.get('X-Profilage') == '1')
+
+@app.before_request
+def demarrer_mesure_requete():
+    g.debut_requete = time.perf_counter()
+    g.profileur = None
+    if doit_profiler():
+        g.profileur = ProfileurEchantillonnage(threading.get_ident(), CONFIG["profilage_intervalle_ms"] / 1000)
+        g.profileur.demarrer()
+
+@app.after_request
+def enregistrer_mesure_requete(response):
+    route = request.url_rule.rule if request.url_rule else "inconnue"
+    etiquettes = {"route": route, "methode": request.method, "statut": response.status_code}
+    METRIQUE_HTTP_DUREE.observer(time.perf_counter() - g.get('debut_requete', time.perf_counter()), **etiquettes)
+    METRIQUE_HTTP_TOTAL.inc(**etiquettes)
+    
+    profileur = g.get('profileur')
+    if profileur is not None:
+        profil = profileur.arreter()
+        profil.update({
+            "id": str(uuid.uuid4())[:8],
+            "route": route,
+            "url": request.full_path,
+            "methode": request.method,
+            "statut": response.status_code,
+            "date": datetime.now().isoformat()
+        })
+        with VERROU_PROFILAGE:
+            ETAT_PROFILAGE["profils"][profil["id"]] = profil
+            while len(ETAT_PROFILAGE["profils"]) > CONFIG["profilage_conserves"]:
+                ETAT_PROFILAGE["profils"].popitem(last=False)
+        response.headers['X-Profil-Id'] = profil["id"]
+    
+    return response
+
+CHEMINS_PUBLICS = ('/', '/api/status', '/api/connexion', '/metrics')
+ROUTES_ADMINISTRATION = (
+    '/indexer/lancer', '/api/utilisateurs', '/api/acces', '/api/entites/extraire',
+    '/api/profilage', '/api/debug-search', '/api/ordonnanceur'
+)
+ROUTES_REFERENTIELS = ('/api/specialites', '/api/avocats')
+
+@app.before_request
+def verifier_acces():
+    g.utilisateur = None
+    if not CONFIG["acces_actif"]:
+        if request.path.startswith(('/api/connexion', '/api/deconnexion', '/api/session', '/api/utilisateurs', '/api/acces')):
+            return jsonify({"success": False, "erreur": "Contrôle d'accès désactivé (acces_actif)"}), 404
+        return None
+    if request.method == 'OPTIONS' or request.path in CHEMINS_PUBLICS:
+        return None
+    
+    session = lire_session()
+    if session is None:
+        return jsonify({"success": False, "erreur": "Authentification requise"}), 401
+    g.utilisateur = session
+    if session["changement_mot_de_passe"] and request.path not in ('/api/session', '/api/session/mot_de_passe', '/api/deconnexion'):
+        return jsonify({"success": False, "erreur": "Changement de mot de passe requis (POST /api/session/mot_de_passe)", "changement_mot_de_passe": True}), 403
+    if session["role"] == "admin":
+        return None
+    
+    if request.path.startswith(ROUTES_ADMINISTRATION) or (request.method != 'GET' and request.path.startswith(ROUTES_REFERENTIELS)):
+        return jsonify({"success": False, "erreur": "Accès réservé aux administrateurs"}), 403
+    
+    arguments = request.view_args or {}
+    document_id = arguments.get('document_id') or arguments.get('fichier_id')
+    if document_id is not None:
+        doc = obtenir_catalogue_par_id().get(document_id)
+        if doc is None or not document_visible(doc, session["principaux"]):
+            return jsonify({"success": False, "erreur": "Document non trouvé"}), 404
+    return None
+
+@app.route('/api/connexion', methods=['POST'])
+def connexion():
+    data = request.get_json(silent=True) or {}
+    identifiant = str(data.get('identifiant', '')).strip()
+    utilisateur = next((u for u in charger_utilisateurs() if u['identifiant'] == identifiant), None)
+    if utilisateur is None or not verifier_mot_de_passe(str(data.get('mot_de_passe', '')), utilisateur.get('mot_de_passe')):
+        logger.warning(f"Échec de connexion pour '{identifiant}' depuis {request.remote_addr}")
+        return jsonify({"success": False, "erreur": "Identifiant ou mot de passe incorrect"}), 401
+    
+    session = ouvrir_session(utilisateur)
+    reponse = jsonify({
+        "success": True,
+        "jeton": session["jeton"],
+        "expire": datetime.fromtimestamp(session["expire"]).isoformat(),
+        "utilisateur": presenter_utilisateur(utilisateur)
+    })
+    reponse.set_cookie(COOKIE_SESSION, session["jeton"], max_age=CONFIG["acces_duree_session"], httponly=True, samesite='Lax')
+    return reponse
+
+@app.route('/api/deconnexion', methods=['POST'])
+def deconnexion():
+    fermer_sessions(jeton=g.utilisateur["jeton"])
+    reponse = jsonify({"success": True, "message": "Session fermée"})
+    reponse.delete_cookie(COOKIE_SESSION)
+    return reponse
+
+@app.route('/api/session', methods=['GET'])
+def get_session():
+    session = g.utilisateur
+    return jsonify({
+        "success": True,
+        "identifiant": session["identifiant"],
+        "role": session["role"],
+        "principaux": sorted(session["principaux"]),
+        "changement_mot_de_passe": session["changement_mot_de_passe"],
+        "expire": datetime.fromtimestamp(session["expire"]).isoformat()
+    })
+
+@app.route('/api/session/mot_de_passe', methods=['POST'])
+def changer_mot_de_passe():
+    data = request.get_json(silent=True) or {}
+    nouveau = str(data.get('nouveau_mot_de_passe') or '')
+    if len(nouveau) < 8:
+        return jsonify({"success": False, "erreur": "Le nouveau mot de passe doit contenir au moins 8 caractères"}), 400
+    
+    utilisateurs = charger_utilisateurs()
+    utilisateur = next((u for u in utilisateurs if u['identifiant'] == g.utilisateur["identifiant"]), None)
+    if utilisateur is None or not verifier_mot_de_passe(str(data.get('mot_de_passe', '')), utilisateur.get('mot_de_passe')):
+        return jsonify({"success": False, "erreur": "Mot de passe actuel incorrect"}), 403
+    if verifier_mot_de_passe(nouveau, utilisateur['mot_de_passe']):
+        return jsonify({"success": False, "erreur": "Le nouveau mot de passe doit être différent de l'actuel"}), 400
+    
+    utilisateur['mot_de_passe'] = hacher_mot_de_passe(nouveau)
+    initial = utilisateur.pop('changement_mot_de_passe', False)
+    sauvegarder_utilisateurs(utilisateurs)
+    if initial and os.path.exists(FICHIER_MOT_DE_PASSE_INITIAL):
+        os.remove(FICHIER_MOT_DE_PASSE_INITIAL)
+    fermer_sessions(utilisateur['identifiant'])
+    reponse = jsonify({"success": True, "message": "Mot de passe modifié, reconnectez-vous"})
+    reponse.delete_cookie(COOKIE_SESSION)
+    return reponse
+
+def appliquer_donnees_utilisateur(utilisateur, data):
+    for champ in ('nom', 'avocat'):
+        if champ in data:
+            utilisateur[champ] = str(data[champ] or '').strip() or None
+    for champ in ('equipes', 'dossiers'):
+        if champ in data:
+            valeur = data[champ]
+            if not isinstance(valeur, list) or not all(isinstance(element, str) for element in valeur):
+                raise ValueError(f"'{champ}' doit être une liste de chaînes")
+            utilisateur[champ] = [element.strip() for element in valeur if element.strip()]
+    if 'role' in data:
+        if data['role'] not in ROLES_UTILISATEURS:
+            raise ValueError(f"Rôle inconnu: {data['role']} ({', '.join(ROLES_UTILISATEURS)})")
+        utilisateur['role'] = data['role']
+    if data.get('mot_de_passe'):
+        utilisateur['mot_de_passe'] = hacher_mot_de_passe(str(data['mot_de_passe']))
+
+@app.route('/api/utilisateurs', methods=['GET'])
+def get_utilisateurs():
+    return jsonify({"utilisateurs": [presenter_utilisateur(u) for u in charger_utilisateurs()]})
+
+@app.route('/api/utilisateurs', methods=['POST'])
+def ajouter_utilisateur():
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"success": False, "erreur": "Données JSON manquantes"}), 400
+        
+        identifiant = str(data.get('identifiant', '')).strip()
+        if not identifiant or ':' in identifiant:
+            return jsonify({"success": False, "erreur": "Identifiant vide ou invalide"}), 400
+        if not data.get('mot_de_passe'):
+            return jsonify({"success": False, "erreur": "Mot de passe manquant"}), 400
+        
+        utilisateurs = charger_utilisateurs()
+        if any(u['identifiant'] == identifiant for u in utilisateurs):
+            return jsonify({"success": False, "erreur": "Utilisateur déjà existant"}), 409
+        
+        utilisateur = {"identifiant": identifiant, "nom": identifiant, "role": "utilisateur", "avocat": None, "equipes": [], "dossiers": []}
+        appliquer_donnees_utilisateur(utilisateur, data)
+        utilisateurs.append(utilisateur)
+        sauvegarder_utilisateurs(utilisateurs)
+        
+        return jsonify({"success": True, "utilisateur": presenter_utilisateur(utilisateur), "message": "Utilisateur ajouté avec succès"})
+    except ValueError as e:
+        return jsonify({"success": False, "erreur": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erreur ajout utilisateur: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+@app.route('/api/utilisateurs/<identifiant>', methods=['PUT'])
+def modifier_utilisateur(identifiant):
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"success": False, "erreur": "Données JSON manquantes"}), 400
+        
+        utilisateurs = charger_utilisateurs()
+        utilisateur = next((u for u in utilisateurs if u['identifiant'] == identifiant), None)
+        if utilisateur is None:
+            return jsonify({"success": False, "erreur": "Utilisateur non trouvé"}), 404
+        
+        appliquer_donnees_utilisateur(utilisateur, data)
+        if not any(u.get('role') == 'admin' for u in utilisateurs):
+            return jsonify({"success": False, "erreur": "Au moins un administrateur est nécessaire"}), 400
+        sauvegarder_utilisateurs(utilisateurs)
+        fermer_sessions(identifiant)
+        
+        return jsonify({"success": True, "utilisateur": presenter_utilisateur(utilisateur), "message": "Utilisateur modifié (sessions fermées)"})
+    except ValueError as e:
+        return jsonify({"success": False, "erreur": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erreur modification utilisateur: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+@app.route('/api/utilisateurs/<identifiant>', methods=['DELETE'])
+def supprimer_utilisateur(identifiant):
+    try:
+        utilisateurs = charger_utilisateurs()
+        restants = [u for u in utilisateurs if u['identifiant'] != identifiant]
+        if len(restants) == len(utilisateurs):
+            return jsonify({"success": False, "erreur": "Utilisateur non trouvé"}), 404
+        if not any(u.get('role') == 'admin' for u in restants):
+            return jsonify({"success": False, "erreur": "Au moins un administrateur est nécessaire"}), 400
+        
+        sauvegarder_utilisateurs(restants)
+        fermer_sessions(identifiant)
+        return jsonify({"success": True, "message": "Utilisateur supprimé avec succès"})
+    except Exception as e:
+        logger.error(f"Erreur suppression utilisateur: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+@app.route('/api/acces/synchroniser', methods=['POST'])
+def synchroniser_acces():
+    return jsonify({"success": True, "elasticsearch": synchroniser_acl_elasticsearch()})
+
+@app.route('/metrics')
+def metrics():
+    return Response(exposer_metriques(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/ordonnanceur', methods=['GET'])
+def get_ordonnanceur():
+    return jsonify({"success": True, **ORDONNANCEUR.etat()})
+
+@app.route('/api/semantique', methods=['GET'])
+def get_semantique():
+    with VERROU_SEMANTIQUE:
+        index = ETAT_SEMANTIQUE["index"]
+        return jsonify({
+            "success": True,
+            "actif": CONFIG["semantique_active"],
+            "disponible": semantique_disponible(),
+            "modele": CONFIG["semantique_modele"],
+            "erreur": ETAT_SEMANTIQUE["erreur"],
+            "moteur": ("elasticsearch" if es else index.moteur()) if index is not None else None,
+            "segments": index.actives() if index is not None else 0,
+            "documents": len(index.documents) if index is not None else 0,
+            "en_attente": ETAT_SEMANTIQUE["en_attente"],
+            "derniere_synchronisation": ETAT_SEMANTIQUE["derniere_synchronisation"],
+            "mode_defaut": CONFIG["semantique_mode_defaut"]
+        })
+
+@app.route('/api/extraction/pdf', methods=['GET'])
+def get_moteurs_pdf():
+    with VERROU_PERFORMANCES_PDF:
+        return jsonify({
+            "success": True,
+            "moteur": CONFIG["pdf_moteur"],
+            "sous_processus": CONFIG["pdf_sous_processus"],
+            "disponibles": MOTEURS_PDF,
+            "performances": {
+                moteur: dict(performance, pages_par_seconde=round(1 / performance["secondes_par_page"], 2) if performance["secondes_par_page"] else None)
+                for moteur, performance in PERFORMANCES_PDF.items()
+            }
+        })
 
-def sauvegarder_specialites(specialites):
-    with open(FICHIER_SPECIALITES, 'w', encoding='utf-8') as f:
-        json.dump(specialites, f, ensure_ascii=False, indent=2)
+@app.route('/api/profilage', methods=['GET'])
+def get_profilage():
+    with VERROU_PROFILAGE:
+        return jsonify({
+            "actif": ETAT_PROFILAGE["actif"],
+            "prochaines_requetes": ETAT_PROFILAGE["restant"],
+            "intervalle_ms": CONFIG["profilage_intervalle_ms"],
+            "profils": [
+                {cle: profil[cle] for cle in ['id', 'route', 'url', 'methode', 'statut', 'date', 'duree_ms', 'echantillons']}
+                for profil in reversed(ETAT_PROFILAGE["profils"].values())
+            ]
+        })
 
-def charger_avocats():
+@app.route('/api/profilage', methods=['POST'])
+def configurer_profilage():
     try:
-        with open(FICHIER_AVOCATS, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return ["Maître Dupont", "Maître Martin", "Maître Dubois"]
+        if not request.is_json:
+            return jsonify({"success": False, "erreur": "Content-Type must be application/json"}), 400
+        
+        data = request.get_json() or {}
+        with VERROU_PROFILAGE:
+            if 'actif' in data:
+                ETAT_PROFILAGE["actif"] = bool(data['actif'])
+            if 'prochaines_requetes' in data:
+                ETAT_PROFILAGE["restant"] = max(0, int(data['prochaines_requetes']))
+            if 'intervalle_ms' in data:
+                CONFIG["profilage_intervalle_ms"] = max(0.5, float(data['intervalle_ms']))
+            
+            return jsonify({
+                "success": True,
+                "actif": ETAT_PROFILAGE["actif"],
+                "prochaines_requetes": ETAT_PROFILAGE["restant"],
+                "intervalle_ms": CONFIG["profilage_intervalle_ms"]
+            })
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "erreur": f"Paramètre invalide: {e}"}), 400
 
-def sauvegarder_avocats(avocats):
-    with open(FICHIER_AVOCATS, 'w', encoding='utf-8') as f:
-        json.dump(avocats, f, ensure_ascii=False, indent=2)
+@app.route('/api/profilage/<profil_id>')
+def get_profil(profil_id):
+    with VERROU_PROFILAGE:
+        profil = ETAT_PROFILAGE["profils"].get(profil_id)
+    
+    if not profil:
+        return jsonify({"success": False, "erreur": "Profil non trouvé"}), 404
+    
+    if request.args.get('format') == 'collapsed':
+        return Response('\n'.join(f"{pile} {nombre}" for pile, nombre in profil["piles"]) + '\n', mimetype='text/plain; charset=utf-8')
+    
+    return jsonify({**profil, "piles": profil["piles"][:200]})
 
 @app.route('/')
 def index():
@@ -687,12 +4991,23 @@ def modifier_avocat_detail(nom_avocat):
             avocats[index] = nouveau_nom
             
             index_documents = charger_donnees(FICHIER_INDEX)
+            modifies = []
             for doc in index_documents:
                 if doc.get('avocat') == nom_avocat:
                     doc['avocat'] = nouveau_nom
+                    modifies.append(doc)
             
             sauvegarder_donnees(FICHIER_INDEX, index_documents)
             sauvegarder_avocats(avocats)
+            mettre_a_jour_elasticsearch_en_masse(modifies, ['avocat'])
+            
+            utilisateurs = charger_utilisateurs()
+            concernes = [u for u in utilisateurs if u.get('avocat') == nom_avocat]
+            if concernes:
+                for utilisateur in concernes:
+                    utilisateur['avocat'] = nouveau_nom
+                    fermer_sessions(utilisateur['identifiant'])
+                sauvegarder_utilisateurs(utilisateurs)
             
             return jsonify({
                 "success": True, 
@@ -750,11 +5065,20 @@ def lancer_indexation():
         dossiers_a_indexer = data.get('dossiers', CONFIG["dossiers_a_indexer"])
         specialite = data.get('specialite', 'Non spécifiée')
         avocat = data.get('avocat', 'Non attribué')
+        explicites = {champ for champ in ('specialite', 'avocat') if champ in data}
         
         if not dossiers_a_indexer:
             return jsonify({"success": False, "erreur": "Aucun dossier configuré"}), 400
         
-        index_complet = []
+        options = {cle: data[cle] for cle in ("inclure", "exclure", "taille_max", "fichiers_caches", "suivre_liens", "concurrence") if cle in data}
+        for cle in ("inclure", "exclure"):
+            if cle in options and not (isinstance(options[cle], list) and all(isinstance(motif, str) for motif in options[cle])):
+                return jsonify({"success": False, "erreur": f"{cle} doit être une liste de motifs"}), 400
+        for cle in ("taille_max", "concurrence"):
+            if options.get(cle) is not None and (not isinstance(options[cle], int) or isinstance(options[cle], bool) or options[cle] < 1):
+                return jsonify({"success": False, "erreur": f"{cle} doit être un entier positif"}), 400
+        
+        documents_connus = ContenusConnus(CONFIG["indexation_lot"])
         statistiques = {
             "date_indexation": datetime.now().isoformat(),
             "dossiers_indexes": [],
@@ -766,30 +5090,38 @@ def lancer_indexation():
         }
         
         for dossier in dossiers_a_indexer:
-            if os.path.exists(dossier):
-                index_dossier, total = indexer_fichiers(dossier, specialite, avocat)
-                index_complet.extend(index_dossier)
+            if os.path.isdir(dossier):
+                total, ocr_utilise, lot, chemins_vus = 0, False, [], set()
+                for fichier_info in indexer_fichiers(dossier, specialite, avocat, documents_connus, options, chemins_vus):
+                    lot.append(fichier_info)
+                    total += 1
+                    ocr_utilise = ocr_utilise or fichier_info.get('type_fichier') == 'OCR'
+                    if len(lot) >= CONFIG["indexation_lot"]:
+                        enregistrer_lot_indexation(lot, explicites)
+                        lot = []
+                if lot:
+                    enregistrer_lot_indexation(lot, explicites)
+                retires = retirer_documents_disparus(dossier, chemins_vus)
                 
-                ocr_utilise = any(doc.get('type_fichier') == 'OCR' for doc in index_dossier)
                 if ocr_utilise:
                     statistiques["ocr_utilise"] = True
                 
                 statistiques["dossiers_indexes"].append({
                     "chemin": dossier,
                     "fichiers_indexes": total,
+                    "documents_retires": retires,
                     "specialite": specialite,
                     "avocat": avocat,
                     "ocr_utilise": ocr_utilise
                 })
                 statistiques["total_fichiers"] += total
         
-        sauvegarder_donnees(FICHIER_INDEX, index_complet)
         sauvegarder_donnees(FICHIER_STATS, statistiques)
         
         return jsonify({
             "success": True,
             "statistiques": statistiques,
-            "fichiers_indexes": len(index_complet)
+            "fichiers_indexes": statistiques["total_fichiers"]
         })
         
     except Exception as e:
@@ -803,90 +5135,645 @@ def recherche_avancee():
         specialite = request.args.get('specialite', '')
         avocat = request.args.get('avocat', '')
         categorie = request.args.get('categorie', '')
+        regrouper = request.args.get('regrouper', '').lower() in ('1', 'true', 'oui')
+        filtres_entites = lire_filtres_entites(request.args)
+        mode = request.args.get('mode', CONFIG["semantique_mode_defaut"] if semantique_disponible() else "mots_cles")
+        if mode not in ("mots_cles", "semantique", "hybride"):
+            return jsonify({"erreur": f"Mode inconnu: {mode}"}), 400
+        if mode != "mots_cles" and not semantique_disponible():
+            mode = "mots_cles"
         
         logger.info(f"Recherche: '{terme}' - Spécialité: {specialite} - Avocat: {avocat} - Catégorie: {categorie}")
+        principaux = principaux_acces()
         
-        if es:
-            resultats_es = rechercher_dans_elasticsearch(terme, specialite, avocat, categorie)
+        if es and CONFIG["index_pages"]:
+            resultats_es = rechercher_pages_dans_elasticsearch(terme, specialite, avocat, categorie, filtres_entites, principaux)
+            catalogue = obtenir_catalogue_par_id() if resultats_es else {}
+            resultats = []
+            for hit in resultats_es:
+                local = catalogue.get(hit['_source']['document_id'])
+                if not local:
+                    continue
+                pages = hit.get('inner_hits', {}).get('pages', {}).get('hits', {}).get('hits', [])
+                passages = [
+                    {"page": page['_source']['page'], "texte": ' '.join(fragment.split())}
+                    for page in pages
+                    for fragment in page.get('highlight', {}).get('contenu_textuel', [])[:1]
+                ]
+                doc = presenter_document(local, passages[:CONFIG["passages_max"]])
+                doc['pages'] = [{"page": page['_source']['page'], "score": page['_score']} for page in pages]
+                doc['score'] = hit['_score']
+                surlignage = {champ: valeur for champ, valeur in hit.get('highlight', {}).items() if champ != 'contenu_textuel'}
+                if surlignage:
+                    doc['highlight'] = surlignage
+                resultats.append(doc)
+        elif es:
+            resultats_es = rechercher_dans_elasticsearch(terme, specialite, avocat, categorie, filtres_entites, principaux)
+            catalogue = obtenir_catalogue_par_id() if resultats_es else {}
             resultats = []
             for hit in resultats_es:
-                doc = hit['_source']
+                local = catalogue.get(hit['_source'].get('id'), {})
+                surlignage = hit.get('highlight', {})
+                passages = passages_depuis_fragments(
+                    surlignage.pop('contenu_textuel', []),
+                    local.get('contenu_textuel', ''),
+                    local.get('reperes_pages') or reperes_pages(local.get('contenu_textuel', ''))
+                )
+                doc = presenter_document({**hit['_source'], 'contenu_textuel': local.get('contenu_textuel', '')}, passages)
                 doc['score'] = hit['_score']
-                if 'highlight' in hit:
-                    doc['highlight'] = hit['highlight']
+                if surlignage:
+                    doc['highlight'] = surlignage
                 resultats.append(doc)
         else:
-            index = charger_donnees(FICHIER_INDEX)
+            index = documents_visibles()
+            ids_entites = documents_par_entites(filtres_entites) if filtres_entites else None
+            motif = compiler_motif_termes(termes_surlignage(terme))
             resultats = []
-            
-            for fichier in index:
-                if specialite and fichier.get('specialite') != specialite:
-                    continue
-                if avocat and fichier.get('avocat') != avocat:
-                    continue
-                if categorie and fichier.get('categorie') != categorie:
-                    continue
-                
-                score = 0
-                
-                if terme:
-                    termes_recherche = terme.lower().split()
-                    termes_trouves = 0
-                    
-                    nom_lower = fichier.get('nom', '').lower()
-                    for mot in termes_recherche:
-                        if mot in nom_lower:
-                            score += 3
-                            termes_trouves += 1
-                    
-                    mots_cles = [mot.lower() for mot in fichier.get('mots_cles', [])]
-                    for mot in termes_recherche:
-                        if any(mot in mot_cle for mot_cle in mots_cles):
-                            score += 2
-                            termes_trouves += 1
-                    
-                    contenu_lower = fichier.get('contenu_textuel', '').lower()
-                    for mot in termes_recherche:
-                        if mot in contenu_lower:
-                            score += 1
-                            termes_trouves += 1
-                    
-                    if termes_trouves == len(termes_recherche):
-                        score += 5
-                    elif termes_trouves >= len(termes_recherche) / 2:
-                        score += 2
-                        
-                    if score == 0:
-                        continue
-                else:
-                    score = 1
-                
-                fichier['score'] = score
-                resultats.append(fichier)
-            
-            resultats.sort(key=lambda x: x.get('score', 0), reverse=True)
+            for doc in rechercher_localement(index, terme, specialite, avocat, categorie, ids_entites):
+                texte = doc.get('contenu_textuel', '')
+                reperes = doc.get('reperes_pages') or reperes_pages(texte)
+                resultat = presenter_document(doc, generer_passages(texte, reperes, motif))
+                if CONFIG["index_pages"]:
+                    resultat['pages'] = pages_correspondantes(texte, reperes, motif)
+                resultats.append(resultat)
+        
+        if mode != "mots_cles" and terme:
+            ids_autorises = documents_autorises(obtenir_catalogue_par_id(), specialite, avocat, categorie, filtres_entites)
+            if principaux is not None:
+                visibles = visibilite(principaux)[0]
+                ids_autorises = visibles if ids_autorises is None else ids_autorises & visibles
+            semantiques = rechercher_semantique(terme, ids_autorises)
+            resultats = fusionner_resultats_semantiques(resultats, semantiques, terme, mode)
+        
+        if regrouper:
+            resultats = regrouper_quasi_doublons(resultats)
         
         logger.info(f"{len(resultats)} résultats trouvés")
         return jsonify({
             "terme": terme,
             "resultats": resultats,
             "total": len(resultats),
-            "moteur_recherche": "elasticsearch" if es else "basique"
+            "regroupe": regrouper,
+            "moteur_recherche": "elasticsearch" if es else "basique",
+            "mode_pages": CONFIG["index_pages"],
+            "mode": mode
         })
         
     except Exception as e:
         logger.error(f"Erreur recherche: {e}")
         return jsonify({"erreur": str(e)}), 500
 
+@app.route('/api/suggestions')
+def suggestions():
+    debut = time.perf_counter()
+    try:
+        terme = request.args.get('q', '')
+        prefixe = normaliser_suggestion(terme).lstrip()
+        
+        try:
+            maximum = max(1, min(int(request.args.get('max', CONFIG["suggestions_max"])), 50))
+        except ValueError:
+            return jsonify({"erreur": "Paramètre max invalide"}), 400
+        
+        if not prefixe.strip():
+            return jsonify({"terme": terme, "suggestions": [], "total": 0})
+        
+        utilisateur = g.utilisateur["identifiant"] if g.get('utilisateur') else request.remote_addr or "anonyme"
+        resultats, moteur, source = obtenir_suggestions(prefixe, maximum, utilisateur, principaux_acces())
+        
+        return jsonify({
+            "terme": terme,
+            "suggestions": resultats,
+            "total": len(resultats),
+            "moteur": moteur,
+            "source": source,
+            "duree_ms": round((time.perf_counter() - debut) * 1000, 2)
+        })
+        
+    except Exception as e:
+        logger.error(f"Erreur suggestions: {e}")
+        return jsonify({"erreur": str(e)}), 500
+
 @app.route('/api/documents')
 def get_all_documents():
     try:
-        index = charger_donnees(FICHIER_INDEX)
-        return jsonify({"documents": index})
+        index = documents_visibles()
+        return jsonify({"documents": [presenter_document(doc) for doc in index]})
     except Exception as e:
         logger.error(f"Erreur chargement documents: {e}")
         return jsonify({"erreur": str(e)}), 500
 
+@app.route('/api/entites/facettes')
+def get_facettes_entites():
+    try:
+        types_demandes = [t for t in request.args.get('type', '').split(',') if t] or TYPES_ENTITES
+        inconnus = [t for t in types_demandes if t not in TYPES_ENTITES]
+        if inconnus:
+            return jsonify({"erreur": f"Type d'entité inconnu: {', '.join(inconnus)}"}), 400
+        
+        try:
+            taille = max(1, min(int(request.args.get('taille', 20)), 500))
+        except ValueError:
+            return jsonify({"erreur": "Paramètre taille invalide"}), 400
+        
+        facettes = {}
+        principaux = principaux_acces()
+        if es:
+            resultat = es.search(index=CONFIG["index_name"], body={
+                "size": 0,
+                **({"query": {"bool": {"filter": [{"terms": {"acl": sorted(principaux)}}]}}} if principaux is not None else {}),
+                "aggs": {
+                    type_entite: {"terms": {"field": f"entites.{type_entite}", "size": taille}}
+                    for type_entite in types_demandes
+                }
+            })
+            for type_entite in types_demandes:
+                facettes[type_entite] = [
+                    {"valeur": bucket['key'], "nombre": bucket['doc_count']}
+                    for bucket in resultat['aggregations'][type_entite]['buckets']
+                ]
+        else:
+            _, compteurs = obtenir_index_entites()
+            if principaux is not None:
+                compteurs = {type_entite: {} for type_entite in types_demandes}
+                for doc in visibilite(principaux)[1]:
+                    entites = doc.get('entites') or {}
+                    for type_entite in types_demandes:
+                        for valeur in entites.get(type_entite, []):
+                            compteurs[type_entite][valeur] = compteurs[type_entite].get(valeur, 0) + 1
+            for type_entite in types_demandes:
+                meilleurs = heapq.nlargest(taille, compteurs[type_entite].items(), key=lambda x: x[1])
+                facettes[type_entite] = [{"valeur": valeur, "nombre": nombre} for valeur, nombre in meilleurs]
+        
+        return jsonify({"facettes": facettes, "moteur_recherche": "elasticsearch" if es else "basique"})
+        
+    except Exception as e:
+        logger.error(f"Erreur facettes entités: {e}")
+        return jsonify({"erreur": str(e)}), 500
+
+@app.route('/api/entites/recherche')
+def rechercher_par_entites():
+    try:
+        filtres = lire_filtres_entites(request.args)
+        if not filtres:
+            return jsonify({"erreur": f"Aucune entité fournie. Types disponibles: {', '.join(TYPES_ENTITES)}"}), 400
+        
+        champs = ['id', 'nom', 'chemin', 'extension', 'taille', 'date_modification', 'categorie', 'specialite', 'avocat', 'entites']
+        
+        if es:
+            clauses = [{"term": {f"entites_normalisees.{type_entite}": normaliser_suggestion(valeur)}} for type_entite, valeur in filtres.items()]
+            principaux = principaux_acces()
+            if principaux is not None:
+                clauses.append({"terms": {"acl": sorted(principaux)}})
+            resultat = es.search(index=CONFIG["index_name"], body={
+                "_source": champs,
+                "query": {"bool": {"filter": clauses}},
+                "size": 1000
+            })
+            documents = [hit['_source'] for hit in resultat['hits']['hits']]
+        else:
+            ids = documents_par_entites(filtres)
+            documents = [
+                {champ: doc.get(champ) for champ in champs}
+                for doc in documents_visibles() if doc.get('id') in ids
+            ]
+        
+        return jsonify({
+            "filtres": filtres,
+            "documents": documents,
+            "total": len(documents),
+            "moteur_recherche": "elasticsearch" if es else "basique"
+        })
+        
+    except Exception as e:
+        logger.error(f"Erreur recherche par entités: {e}")
+        return jsonify({"erreur": str(e)}), 500
+
+@app.route('/api/entites/extraire', methods=['POST'])
+def reextraire_entites():
+    try:
+        data = request.get_json(silent=True) or {}
+        tout = bool(data.get('tout', False))
+        
+        index = charger_donnees(FICHIER_INDEX)
+        mis_a_jour = []
+        for doc in index:
+            if tout or 'entites' not in doc:
+                doc['entites'] = extraire_entites(doc.get('contenu_textuel', ''))
+                mis_a_jour.append(doc)
+        
+        if mis_a_jour:
+            sauvegarder_donnees(FICHIER_INDEX, index)
+            for doc in mis_a_jour:
+                indexer_dans_elasticsearch(doc)
+        
+        return jsonify({"success": True, "documents_mis_a_jour": len(mis_a_jour), "total": len(index)})
+        
+    except Exception as e:
+        logger.error(f"Erreur extraction entités: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+@app.route('/api/doublons')
+def get_doublons():
+    try:
+        index_similarite, groupe_de = obtenir_index_similarite()
+        documents = {doc['id']: doc for doc in documents_visibles() if doc.get('id') in groupe_de}
+        
+        groupes = {}
+        for doc_id, groupe in groupe_de.items():
+            if doc_id in documents:
+                groupes.setdefault(groupe, []).append(doc_id)
+        
+        resultats = []
+        for groupe, membres in groupes.items():
+            if len(membres) < 2:
+                continue
+            reference = index_similarite.signatures[groupe]
+            resultats.append({
+                "id_groupe": groupe,
+                "taille": len(membres),
+                "documents": sorted([
+                    {
+                        "id": doc_id,
+                        "nom": documents.get(doc_id, {}).get('nom'),
+                        "chemin": documents.get(doc_id, {}).get('chemin'),
+                        "taille": documents.get(doc_id, {}).get('taille'),
+                        "similarite": round(estimer_similarite(reference, index_similarite.signatures[doc_id]), 3)
+                    }
+                    for doc_id in membres
+                ], key=lambda d: d['similarite'], reverse=True)
+            })
+        
+        resultats.sort(key=lambda g: g['taille'], reverse=True)
+        
+        return jsonify({
+            "groupes": resultats,
+            "total_groupes": len(resultats),
+            "documents_concernes": sum(groupe['taille'] for groupe in resultats),
+            "seuil": CONFIG["similarite_seuil"]
+        })
+        
+    except Exception as e:
+        logger.error(f"Erreur détection doublons: {e}")
+        return jsonify({"erreur": str(e)}), 500
+
+@app.route('/api/document/<document_id>/similaires')
+def get_documents_similaires(document_id):
+    try:
+        try:
+            seuil = float(request.args.get('seuil', CONFIG["similarite_seuil"]))
+        except ValueError:
+            return jsonify({"success": False, "erreur": "Seuil invalide"}), 400
+        
+        index_similarite, _ = obtenir_index_similarite()
+        if document_id not in index_similarite.signatures:
+            return jsonify({"success": False, "erreur": "Document non trouvé ou sans contenu textuel"}), 404
+        
+        documents = {doc['id']: doc for doc in documents_visibles()}
+        similaires = [
+            {
+                "id": doc_id,
+                "nom": documents.get(doc_id, {}).get('nom'),
+                "chemin": documents.get(doc_id, {}).get('chemin'),
+                "similarite": round(similarite, 3)
+            }
+            for doc_id, similarite in index_similarite.similaires(document_id, seuil)
+            if doc_id in documents
+        ]
+        
+        return jsonify({"success": True, "document_id": document_id, "similaires": similaires, "total": len(similaires)})
+        
+    except Exception as e:
+        logger.error(f"Erreur documents similaires: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+def lire_selection_pages(selection, disponibles):
+    pages = set()
+    for morceau in selection.split(','):
+        morceau = morceau.strip()
+        if not morceau:
+            continue
+        if '-' in morceau:
+            debut, fin = (int(borne) for borne in morceau.split('-', 1))
+            if fin < debut or fin - debut >= CONFIG["pages_selection_max"]:
+                raise ValueError(f"Intervalle de pages invalide: {morceau}")
+            pages.update(range(debut, fin + 1))
+        else:
+            pages.add(int(morceau))
+        if len(pages) > CONFIG["pages_selection_max"]:
+            raise ValueError(f"Au plus {CONFIG['pages_selection_max']} pages par demande")
+    inconnues = sorted(page for page in pages if page not in disponibles)
+    if inconnues:
+        raise ValueError(f"Pages inexistantes: {', '.join(map(str, inconnues[:10]))}")
+    return sorted(pages)
+
+def nombre_pages_fichier(document):
+    if PYPDF2_DISPONIBLE and document.get('extension') == '.pdf' and os.path.exists(document['chemin']):
+        try:
+            return len(PyPDF2.PdfReader(document['chemin']).pages)
+        except Exception:
+            pass
+    return None
+
+VERROU_APERCU = threading.Lock()
+
+def rendre_apercu_page(chemin, extension, numero):
+    from PIL import Image
+    if extension in ('.png', '.jpg', '.jpeg', '.tiff', '.bmp'):
+        image = Image.open(chemin)
+        image.seek(numero - 1)
+        return image.copy()
+    if extension != '.pdf':
+        raise ValueError("Aperçu disponible uniquement pour les PDF et les images")
+    if 'pypdfium2' in MOTEURS_PDF:
+        import pypdfium2
+        with VERROU_APERCU:
+            document = pypdfium2.PdfDocument(chemin)
+            try:
+                if not 1 <= numero <= len(document):
+                    raise ValueError(f"Page {numero} inexistante")
+                return document[numero - 1].render(scale=CONFIG["apercu_dpi"] / 72).to_pil()
+            finally:
+                document.close()
+    if PDF2IMAGE_DISPONIBLE:
+        return convert_from_path(chemin, dpi=CONFIG["apercu_dpi"], first_page=numero, last_page=numero)[0]
+    raise RuntimeError("Aucun moteur de rendu PDF disponible")
+
+@app.route('/api/document/<document_id>/pages')
+def get_pages_document(document_id):
+    try:
+        document = obtenir_catalogue_par_id().get(document_id)
+        if not document:
+            return jsonify({"success": False, "erreur": "Document non trouvé"}), 404
+        
+        texte = document.get('contenu_textuel', '')
+        pages = decouper_pages(texte, document.get('reperes_pages') or reperes_pages(texte))
+        selection = request.args.get('pages', '').strip()
+        
+        if not selection:
+            return jsonify({
+                "success": True,
+                "document_id": document_id,
+                "total_pages": nombre_pages_fichier(document) or len(pages),
+                "pages": [{"page": numero, "caracteres": len(contenu)} for numero, contenu in sorted(pages.items())]
+            })
+        
+        try:
+            numeros = lire_selection_pages(selection, pages)
+        except ValueError as e:
+            return jsonify({"success": False, "erreur": str(e)}), 400
+        
+        return jsonify({
+            "success": True,
+            "document_id": document_id,
+            "pages": [{"page": numero, "texte": pages[numero]} for numero in numeros]
+        })
+        
+    except Exception as e:
+        logger.error(f"Erreur lecture des pages: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+@app.route('/api/document/<document_id>/pages/<int:numero>/apercu')
+def get_apercu_page(document_id, numero):
+    try:
+        document = obtenir_catalogue_par_id().get(document_id)
+        if not document or not os.path.exists(document.get('chemin', '')):
+            return jsonify({"success": False, "erreur": "Document non trouvé"}), 404
+        
+        try:
+            image = rendre_apercu_page(document['chemin'], document.get('extension', ''), numero)
+        except (ValueError, IndexError, EOFError) as e:
+            return jsonify({"success": False, "erreur": str(e) or f"Page {numero} inexistante"}), 400
+        
+        tampon = io.BytesIO()
+        image.save(tampon, 'PNG', optimize=True)
+        tampon.seek(0)
+        return send_file(tampon, mimetype='image/png', max_age=3600)
+        
+    except Exception as e:
+        logger.error(f"Erreur aperçu de page: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+@app.route('/api/document/<document_id>/pages.pdf')
+def get_extrait_pdf(document_id):
+    try:
+        document = obtenir_catalogue_par_id().get(document_id)
+        if not document or not os.path.exists(document.get('chemin', '')):
+            return jsonify({"success": False, "erreur": "Document non trouvé"}), 404
+        if document.get('extension') != '.pdf':
+            return jsonify({"success": False, "erreur": "Extraction de pages disponible uniquement pour les PDF"}), 400
+        if not PYPDF2_DISPONIBLE:
+            return jsonify({"success": False, "erreur": "PyPDF2 non disponible"}), 501
+        
+        lecteur = PyPDF2.PdfReader(document['chemin'])
+        try:
+            numeros = lire_selection_pages(request.args.get('pages', ''), range(1, len(lecteur.pages) + 1))
+        except ValueError as e:
+            return jsonify({"success": False, "erreur": str(e)}), 400
+        if not numeros:
+            return jsonify({"success": False, "erreur": "Paramètre pages manquant"}), 400
+        
+        redacteur = PyPDF2.PdfWriter()
+        for numero in numeros:
+            redacteur.add_page(lecteur.pages[numero - 1])
+        tampon = io.BytesIO()
+        redacteur.write(tampon)
+        tampon.seek(0)
+        
+        nom = os.path.splitext(secure_filename(document.get('nom', document_id)) or document_id)[0]
+        return send_file(tampon, mimetype='application/pdf', as_attachment=True, download_name=f"{nom}_pages_{numeros[0]}-{numeros[-1]}.pdf")
+        
+    except Exception as e:
+        logger.error(f"Erreur extraction de pages PDF: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+@app.route('/api/document/<document_id>/versions')
+def get_versions(document_id):
+    try:
+        if not re.fullmatch(r'[\w-]+', document_id) or not os.path.exists(fichier_versions(document_id)):
+            return jsonify({"success": False, "erreur": "Aucun historique pour ce document"}), 404
+        versions = charger_versions(document_id)
+        return jsonify({
+            "success": True,
+            "document_id": document_id,
+            "existe": document_id in obtenir_catalogue_par_id(),
+            "versions": [resume_version(version) for version in reversed(versions)],
+            "total": len(versions)
+        })
+    except Exception as e:
+        logger.error(f"Erreur historique des versions: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+def trouver_version(versions, numero):
+    return next((version for version in versions if version["version"] == numero), None)
+
+@app.route('/api/document/<document_id>/versions/<int:numero>/fichier')
+def get_fichier_version(document_id, numero):
+    try:
+        if not re.fullmatch(r'[\w-]+', document_id) or not os.path.exists(fichier_versions(document_id)):
+            return jsonify({"success": False, "erreur": "Aucun historique pour ce document"}), 404
+        version = trouver_version(charger_versions(document_id), numero)
+        if version is None:
+            return jsonify({"success": False, "erreur": f"Version {numero} inexistante"}), 404
+        if not version.get("fichier"):
+            return jsonify({"success": False, "erreur": f"Fichier absent de la version {numero}"}), 404
+        
+        metadonnees = version["metadonnees"]
+        nom, extension = os.path.splitext(os.path.basename(metadonnees.get('chemin', '')) or document_id)
+        return send_file(
+            io.BytesIO(contenu_version(document_id, version, "fichier")),
+            mimetype=metadonnees.get('type_mime') if metadonnees.get('type_mime') not in (None, "inconnu") else 'application/octet-stream',
+            as_attachment=True,
+            download_name=f"{nom}_v{numero}{extension or metadonnees.get('extension', '')}"
+        )
+    except ContenuNonConserve as e:
+        return jsonify({"success": False, "erreur": str(e)}), 410
+    except Exception as e:
+        logger.error(f"Erreur lecture de version: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+@app.route('/api/document/<document_id>/versions/diff')
+def get_diff_versions(document_id):
+    try:
+        if not re.fullmatch(r'[\w-]+', document_id) or not os.path.exists(fichier_versions(document_id)):
+            return jsonify({"success": False, "erreur": "Aucun historique pour ce document"}), 404
+        versions = charger_versions(document_id)
+        try:
+            numero_a = int(request.args.get('a', versions[-1]["version"]))
+            numero_de = int(request.args.get('de', numero_a - 1))
+        except ValueError:
+            return jsonify({"success": False, "erreur": "Numéros de version invalides"}), 400
+        ancienne, nouvelle = trouver_version(versions, numero_de), trouver_version(versions, numero_a)
+        if ancienne is None or nouvelle is None:
+            return jsonify({"success": False, "erreur": "Version inexistante"}), 404
+        
+        metadonnees, lignes = differences_versions(document_id, ancienne, nouvelle)
+        limite = CONFIG["versions_diff_lignes_max"]
+        return jsonify({
+            "success": True,
+            "de": numero_de,
+            "a": numero_a,
+            "metadonnees": metadonnees,
+            "fichier_identique": (ancienne.get("fichier") or {}).get("sha256") == (nouvelle.get("fichier") or {}).get("sha256"),
+            "texte_identique": ancienne["texte"]["sha256"] == nouvelle["texte"]["sha256"],
+            "diff": lignes[:limite],
+            "tronque": len(lignes) > limite
+        })
+    except ContenuNonConserve as e:
+        return jsonify({"success": False, "erreur": str(e)}), 410
+    except Exception as e:
+        logger.error(f"Erreur comparaison de versions: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
+@app.route('/api/documents/lot', methods=['POST'])
+def modifier_documents_en_lot():
+    try:
+        if not request.is_json:
+            return jsonify({"success": False, "erreur": "Content-Type must be application/json"}), 400
+            
+        data = request.get_json()
+        if not data:
+            return jsonify({"success": False, "erreur": "Données JSON manquantes"}), 400
+        
+        debut = time.perf_counter()
+        
+        modifications = {}
+        for champ in ['avocat', 'specialite', 'categorie']:
+            valeur = (data.get('modifications') or {}).get(champ)
+            if isinstance(valeur, str) and valeur.strip():
+                modifications[champ] = valeur.strip()
+        
+        if not modifications:
+            return jsonify({"success": False, "erreur": "Aucune modification fournie (avocat, specialite, categorie)"}), 400
+        
+        ids = data.get('ids')
+        requete = data.get('requete')
+        if (ids is None) == (requete is None):
+            return jsonify({"success": False, "erreur": "Fournir soit 'ids', soit 'requete'"}), 400
+        
+        index = charger_donnees(FICHIER_INDEX)
+        principaux = principaux_acces()
+        
+        if ids is not None:
+            if not isinstance(ids, list):
+                return jsonify({"success": False, "erreur": "'ids' doit être une liste"}), 400
+            ids_selectionnes = set(str(doc_id) for doc_id in ids)
+        else:
+            if not isinstance(requete, dict):
+                return jsonify({"success": False, "erreur": "'requete' doit être un objet"}), 400
+            invalides = [cle for cle in ('q', 'specialite', 'avocat', 'categorie') + tuple(TYPES_ENTITES) if not isinstance(requete.get(cle, ''), str)]
+            if invalides:
+                return jsonify({"success": False, "erreur": f"Paramètres de requête invalides (texte attendu): {', '.join(invalides)}"}), 400
+            terme = requete.get('q', '').strip()
+            filtres_entites = lire_filtres_entites(requete)
+            if not (terme or filtres_entites or any(requete.get(champ, '').strip() for champ in ('specialite', 'avocat', 'categorie'))) and requete.get('tous') is not True:
+                return jsonify({"success": False, "erreur": "Requête sans terme ni filtre : ajouter \"tous\": true pour modifier tout le catalogue"}), 400
+            
+            if es:
+                query = construire_requete_elasticsearch(
+                    terme, requete.get('specialite'), requete.get('avocat'), requete.get('categorie'), filtres_entites, principaux
+                )
+                ids_selectionnes = set(
+                    hit['_id'] for hit in helpers.scan(es, index=CONFIG["index_name"], query={"query": query, "_source": False}, size=1000)
+                )
+            else:
+                ids_entites = documents_par_entites(filtres_entites) if filtres_entites else None
+                ids_selectionnes = set(
+                    doc['id'] for doc in rechercher_localement(
+                        documents_visibles(), terme, requete.get('specialite', ''), requete.get('avocat', ''), requete.get('categorie', ''), ids_entites
+                    )
+                )
+        
+        if principaux is not None:
+            ids_selectionnes &= visibilite(principaux)[0]
+        
+        simulation = bool(data.get('simulation', False))
+        maintenant = datetime.now().isoformat()
+        modifies = []
+        anciens = []
+        inchanges = 0
+        
+        for doc in index:
+            if doc.get('id') not in ids_selectionnes:
+                continue
+            if all(doc.get(champ) == valeur for champ, valeur in modifications.items()):
+                inchanges += 1
+                continue
+            if not simulation:
+                anciens.append(dict(doc))
+                doc.update(modifications)
+                doc['date_modification'] = maintenant
+            modifies.append(doc)
+        
+        trouves = len(modifies) + inchanges
+        resultat_es = {"mis_a_jour": 0, "erreurs": 0}
+        
+        if modifies and not simulation:
+            sauvegarder_donnees(FICHIER_INDEX, index)
+            historiser_documents(zip(anciens, modifies), "modification en lot")
+            resultat_es = mettre_a_jour_elasticsearch_en_masse(modifies, list(modifications))
+        
+        duree = time.perf_counter() - debut
+        ids_trouves = set(doc['id'] for doc in index if doc.get('id') in ids_selectionnes)
+        
+        return jsonify({
+            "success": True,
+            "simulation": simulation,
+            "modifications": modifications,
+            "selectionnes": len(ids_selectionnes),
+            "modifies": len(modifies),
+            "inchanges": inchanges,
+            "non_trouves": sorted(ids_selectionnes - ids_trouves)[:100],
+            "elasticsearch": resultat_es,
+            "duree_ms": round(duree * 1000, 1),
+            "documents_par_seconde": round(trouves / duree) if duree > 0 else None,
+            "message": f"{len(modifies)} document(s) modifié(s)" + (" (simulation)" if simulation else "")
+        })
+        
+    except Exception as e:
+        logger.error(f"Erreur modification en lot: {e}")
+        return jsonify({"success": False, "erreur": str(e)}), 500
+
 @app.route('/api/document/<document_id>', methods=['PUT'])
 def modifier_document(document_id):
     try:
@@ -903,6 +5790,7 @@ def modifier_document(document_id):
         if not document:
             return jsonify({"success": False, "erreur": "Document non trouvé"}), 404
         
+        assurer_version_initiale(document)
         modifications = []
         if 'titre' in data and data['titre'] and data['titre'].strip():
             document['nom'] = data['titre'].strip()
@@ -916,22 +5804,29 @@ def modifier_document(document_id):
             document['specialite'] = data['specialite'].strip()
             modifications.append("spécialité")
         
+        if 'acces' in data:
+            if principaux_acces() is not None:
+                return jsonify({"success": False, "erreur": "Seul un administrateur peut modifier les accès"}), 403
+            try:
+                document['acces'] = lire_liste_acces(data['acces'])
+            except ValueError as e:
+                return jsonify({"success": False, "erreur": str(e)}), 400
+            modifications.append("accès")
+        
         if not modifications:
             return jsonify({"success": False, "erreur": "Aucune modification fournie"}), 400
         
         document['date_modification'] = datetime.now().isoformat()
         
         sauvegarder_donnees(FICHIER_INDEX, index)
+        version = historiser_document(document, "modification")
         
-        if es:
-            try:
-                es.index(index=CONFIG["index_name"], id=document_id, body=document)
-            except Exception as e:
-                logger.warning(f"Erreur mise à jour Elasticsearch: {e}")
+        indexer_dans_elasticsearch(document)
         
         return jsonify({
             "success": True, 
-            "message": f"Document modifié: {', '.join(modifications)}"
+            "message": f"Document modifié: {', '.join(modifications)}",
+            "version": version["version"] if version else None
         })
         
     except Exception as e:
@@ -959,6 +5854,8 @@ def supprimer_document(document_id):
         if es:
             try:
                 es.delete(index=CONFIG["index_name"], id=document_id)
+                if CONFIG["index_pages"]:
+                    es.delete_by_query(index=INDEX_PAGES, query={"term": {"document_id": document_id}}, conflicts="proceed")
             except Exception as e:
                 logger.warning(f"Impossible de supprimer d'Elasticsearch: {e}")
         
@@ -993,52 +5890,77 @@ def upload_file():
             }), 400
         
         filepath = os.path.join(CONFIG["dossier_donnees"], filename)
-        file.save(filepath)
-        
-        contenu_textuel = ""
-        type_fichier = "standard"
-        
-        contenu_textuel = extraire_texte_ocr(filepath)
-        
-        if contenu_textuel and not contenu_textuel.startswith("["):
-            if OCR_DISPONIBLE and extension in ['.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.bmp']:
-                type_fichier = "OCR"
+        index = charger_donnees(FICHIER_INDEX)
+        precedent = next((doc for doc in index if doc.get('chemin') == filepath), None)
+        principaux = principaux_acces()
+        if precedent and not document_visible(precedent, principaux):
+            return jsonify({"success": False, "erreur": "Un document portant ce nom existe déjà"}), 409
+        if precedent:
+            assurer_version_initiale(precedent)
+        temporaire = os.path.join(CONFIG["dossier_donnees"], f".{uuid.uuid4().hex[:8]}.{filename}")
+        file.save(temporaire)
+        remplace = False
+        try:
+            contenu = ORDONNANCEUR.executer(f"upload {filename}", extraire_contenu_fichier, temporaire, extension, index_par_empreinte(index))
+            contenu_textuel = contenu['contenu_textuel']
+            type_fichier = contenu['type_fichier']
+            
+            fichier_info = {
+                "id": precedent['id'] if precedent else str(uuid.uuid4())[:8],
+                "nom": titre,
+                "chemin": filepath,
+                "dossier": CONFIG["dossier_donnees"],
+                "extension": extension,
+                "taille": os.path.getsize(temporaire),
+                "date_modification": datetime.now().isoformat(),
+                "date_indexation": datetime.now().isoformat(),
+                "type_mime": mimetypes.guess_type(filename)[0] or "inconnu",
+                "mots_cles": extraire_mots_cles(filepath, filename),
+                "categorie": deviner_categorie(CONFIG["dossier_donnees"], filename),
+                "specialite": specialite,
+                "avocat": avocat,
+                "statut": "uploadé",
+                **contenu
+            }
+            
+            if precedent and precedent.get('acces'):
+                fichier_info['acces'] = precedent['acces']
+            elif not precedent and principaux is not None:
+                fichier_info['acces'] = [f"utilisateur:{g.utilisateur['identifiant']}"]
+            
+            if precedent:
+                index[index.index(precedent)] = fichier_info
             else:
-                type_fichier = "texte"
-        
-        fichier_info = {
-            "id": str(uuid.uuid4())[:8],
-            "nom": titre,
-            "chemin": filepath,
-            "dossier": CONFIG["dossier_donnees"],
-            "extension": extension,
-            "taille": os.path.getsize(filepath),
-            "date_modification": datetime.now().isoformat(),
-            "date_indexation": datetime.now().isoformat(),
-            "type_mime": mimetypes.guess_type(filename)[0] or "inconnu",
-            "mots_cles": extraire_mots_cles(filepath, filename),
-            "categorie": deviner_categorie(CONFIG["dossier_donnees"], filename),
-            "specialite": specialite,
-            "avocat": avocat,
-            "statut": "uploadé",
-            "contenu_textuel": contenu_textuel,
-            "type_fichier": type_fichier
-        }
+                index.append(fichier_info)
+            os.replace(temporaire, filepath)
+            remplace = True
+            sauvegarder_donnees(FICHIER_INDEX, index)
+        except BaseException:
+            if not remplace:
+                os.remove(temporaire)
+            else:
+                restaurer_fichier_precedent(filepath, precedent)
+            raise
         
-        index = charger_donnees(FICHIER_INDEX)
-        index.append(fichier_info)
-        sauvegarder_donnees(FICHIER_INDEX, index)
+        try:
+            version = historiser_document(fichier_info, "upload")
+        except Exception as e:
+            logger.error(f"Version non enregistrée pour {fichier_info['id']}: {e}")
+            version = None
         
         indexer_dans_elasticsearch(fichier_info)
         
         return jsonify({
             "success": True,
-            "message": "Fichier uploadé avec succès" + (" (OCR appliqué)" if type_fichier == "OCR" else " (texte extrait)" if contenu_textuel and not contenu_textuel.startswith("[") else ""),
-            "fichier": fichier_info,
+            "message": ("Nouvelle version enregistrée" if precedent else "Fichier uploadé avec succès") + (" (OCR appliqué)" if type_fichier == "OCR" else " (texte extrait)" if contenu_textuel and not contenu_textuel.startswith("[") else ""),
+            "fichier": presenter_document(fichier_info),
+            "version": version["version"] if version else None,
             "ocr_used": type_fichier == "OCR",
             "texte_extrait": bool(contenu_textuel and not contenu_textuel.startswith("["))
         })
         
+    except FileSaturee as e:
+        return jsonify({"success": False, "erreur": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         logger.error(f"Erreur upload: {e}")
         return jsonify({"success": False, "erreur": str(e)}), 500
@@ -1046,8 +5968,7 @@ def upload_file():
 @app.route('/download/<fichier_id>')
 def download_file(fichier_id):
     try:
-        index = charger_donnees(FICHIER_INDEX)
-        fichier = next((f for f in index if f['id'] == fichier_id), None)
+        fichier = lire_document(fichier_id)
         
         if fichier and os.path.exists(fichier['chemin']):
             return send_from_directory(
@@ -1064,7 +5985,20 @@ def download_file(fichier_id):
 @app.route('/statistiques')
 def statistiques():
     try:
-        index = charger_donnees(FICHIER_INDEX)
+        champs = {
+            'categorie': 'Inconnu',
+            'extension': 'sans',
+            'specialite': 'Non spécifiée',
+            'avocat': 'Non attribué',
+            'type_fichier': 'standard',
+            'taille': 0,
+            'dossier': None
+        }
+        if principaux_acces() is None:
+            colonnes = lire_colonnes_catalogue(champs)
+        else:
+            index = documents_visibles()
+            colonnes = {nom: [fichier.get(nom, defaut) for fichier in index] for nom, defaut in champs.items()}
         stats = charger_donnees(FICHIER_STATS)
         
         categories = {}
@@ -1072,25 +6006,23 @@ def statistiques():
         specialites = {}
         avocats = {}
         types_fichier = {}
-        tailles_total = 0
         
-        for fichier in index:
-            cat = fichier.get('categorie', 'Inconnu')
+        for cat in colonnes['categorie']:
             categories[cat] = categories.get(cat, 0) + 1
-            
-            ext = fichier.get('extension', 'sans')
+        
+        for ext in colonnes['extension']:
             extensions[ext] = extensions.get(ext, 0) + 1
-            
-            spec = fichier.get('specialite', 'Non spécifiée')
+        
+        for spec in colonnes['specialite']:
             specialites[spec] = specialites.get(spec, 0) + 1
-            
-            avocat = fichier.get('avocat', 'Non attribué')
+        
+        for avocat in colonnes['avocat']:
             avocats[avocat] = avocats.get(avocat, 0) + 1
-            
-            type_fichier = fichier.get('type_fichier', 'standard')
+        
+        for type_fichier in colonnes['type_fichier']:
             types_fichier[type_fichier] = types_fichier.get(type_fichier, 0) + 1
-            
-            tailles_total += fichier.get('taille', 0)
+        
+        tailles_total = sum(taille for taille in colonnes['taille'] if taille)
         
         return jsonify({
             "indexation": stats,
@@ -1100,8 +6032,8 @@ def statistiques():
             "avocats": avocats,
             "types_fichier": types_fichier,
             "tailles_total": f"{tailles_total / (1024*1024):.1f} Mo",
-            "fichiers_total": len(index),
-            "dossiers_uniques": len(set(f.get('dossier') for f in index)),
+            "fichiers_total": len(colonnes['taille']),
+            "dossiers_uniques": len(set(colonnes['dossier'])),
             "elasticsearch": "connecté" if es else "non disponible",
             "ocr": OCR_MESSAGE
         })
@@ -1113,12 +6045,24 @@ def statistiques():
 @app.route('/api/debug-search')
 def debug_search():
     terme = request.args.get('q', '')
-    query = analyser_requete_avancee(terme)
+    ast = obtenir_plan_requete(terme, "ast")
+    
+    with VERROU_REQUETES:
+        cache = {
+            "plans": len(ETAT_REQUETES["plans"]),
+            "taille_max": CONFIG["requetes_cache_plans"],
+            "succes": ETAT_REQUETES["succes"],
+            "echecs": ETAT_REQUETES["echecs"]
+        }
     
     return jsonify({
         "terme": terme,
-        "query_elasticsearch": query,
-        "has_operators": any(op in terme for op in [':', '"', '-']) or ' OR ' in terme.upper() or ' AND ' in terme.upper()
+        "jetons": decouper_requete(terme),
+        "ast": ast,
+        "query_elasticsearch": obtenir_plan_requete(terme, "elasticsearch"),
+        "plan_local": obtenir_plan_requete(terme, "local")[2],
+        "has_operators": ast["type"] not in ("tout", "mots"),
+        "cache_plans": cache
     })
 
 if __name__ == '__main__':
@@ -0,0 +1,70 @@
+import pytest
+
+import extraction_pdf
+
+PAGES = ["Bonjour page un", "Contrat page deux"]
+
+
+def ecrire_pdf(chemin, pages):
+    objets = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    enfants = " ".join(f"{3 + 2 * rang} 0 R" for rang in range(len(pages)))
+    objets.append(f"<< /Type /Pages /Kids [{enfants}] /Count {len(pages)} >>".encode('ascii'))
+    police = 3 + 2 * len(pages)
+    for rang, texte in enumerate(pages):
+        contenu = f"BT /F1 24 Tf 72 700 Td ({texte}) Tj ET".encode('latin-1')
+        objets.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 {police} 0 R >> >> /Contents {4 + 2 * rang} 0 R >>".encode('ascii')
+        )
+        objets.append(b"<< /Length %d >>\nstream\n" % len(contenu) + contenu + b"\nendstream")
+    objets.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    sortie = bytearray(b"%PDF-1.4\n")
+    positions = []
+    for numero, objet in enumerate(objets, 1):
+        positions.append(len(sortie))
+        sortie += b"%d 0 obj\n" % numero + objet + b"\nendobj\n"
+    debut_xref = len(sortie)
+    sortie += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objets) + 1)
+    sortie += b"".join(b"%010d 00000 n \n" % position for position in positions)
+    sortie += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objets) + 1, debut_xref)
+    with open(chemin, 'wb') as f:
+        f.write(sortie)
+    return str(chemin)
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    return ecrire_pdf(tmp_path / "contrat.pdf", PAGES)
+
+
+@pytest.mark.parametrize("moteur", list(extraction_pdf.MOTEURS))
+def test_moteur_extrait_chaque_page(moteur, pdf):
+    if moteur not in extraction_pdf.moteurs_disponibles():
+        pytest.skip(f"{moteur} non installé")
+    messages = list(extraction_pdf.iterer_pages(moteur, pdf))
+    assert [message["type"] for message in messages] == ["page", "page"]
+    assert [message["numero"] for message in messages] == [0, 1]
+    for message, texte in zip(messages, PAGES):
+        assert " ".join(message["texte"].split()) == texte
+
+
+@pytest.mark.parametrize("moteur", list(extraction_pdf.MOTEURS))
+def test_moteur_reprend_a_la_page_demandee(moteur, pdf):
+    if moteur not in extraction_pdf.moteurs_disponibles():
+        pytest.skip(f"{moteur} non installé")
+    messages = list(extraction_pdf.iterer_pages(moteur, pdf, depart=1))
+    assert [message["numero"] for message in messages] == [1]
+
+
+def test_extraction_isolee_dans_un_processus(pdf):
+    moteurs = extraction_pdf.moteurs_disponibles()
+    if not moteurs:
+        pytest.skip("aucun moteur PDF installé")
+    reserve = extraction_pdf.ReserveTravailleurs(1)
+    try:
+        pages, incidents = extraction_pdf.extraire_pages_isolees(reserve, moteurs[0], pdf, delai_page=30)
+    finally:
+        while not reserve.libres.empty():
+            reserve.libres.get().arreter()
+    assert incidents == []
+    assert [" ".join(page["texte"].split()) for page in pages] == PAGES
@@ -0,0 +1,215 @@
+import json
+import os
+
+import pytest
+
+import server
+
+
+def documents(nombre):
+    return [
+        {
+            "id": f"d{numero:03d}",
+            "nom": f"document {numero}.txt",
+            "chemin": f"/partage/dossier/document{numero}.txt",
+            "avocat": "Maître Dupont" if numero % 2 else "Non attribué",
+            "taille": numero * 100,
+            "score": numero / 3,
+            "mots_cles": ["bail", str(numero)],
+            "entites": {"parties": [f"Société {numero}"]} if numero % 3 else {},
+            "contenu_textuel": f"texte du document {numero} " * 40,
+            "acces": None if numero % 4 else ["utilisateur:paul"]
+        }
+        for numero in range(nombre)
+    ]
+
+
+@pytest.fixture(params=[True, False], ids=["binaire", "json"])
+def catalogue(request, tmp_path, monkeypatch):
+    fichier = str(tmp_path / ("index.catb" if request.param else "index.json"))
+    monkeypatch.setitem(server.CONFIG, "catalogue_binaire", request.param)
+    monkeypatch.setitem(server.CONFIG, "stockage_compactage_operations", 1000)
+    monkeypatch.setattr(server, "FICHIER_INDEX", fichier)
+    monkeypatch.setattr(server, "FICHIERS_JOURNALISES", {fichier})
+    yield fichier
+    server.ETAT_JOURNAUX.pop(fichier, None)
+    server.fermer_catalogue_binaire(fichier)
+    server.fermer_catalogue_binaire(server.fichier_precedent(fichier))
+
+
+def redemarrer(fichier):
+    server.ETAT_JOURNAUX.pop(fichier, None)
+    server.fermer_catalogue_binaire(fichier)
+    server.fermer_catalogue_binaire(server.fichier_precedent(fichier))
+    return server.charger_donnees(fichier)
+
+
+def lignes_journal(fichier):
+    with open(server.fichier_journal(fichier), 'rb') as f:
+        return f.read().splitlines(keepends=True)
+
+
+def test_aller_retour_par_le_journal(catalogue):
+    docs = documents(20)
+    server.sauvegarder_donnees(catalogue, docs)
+    assert server.est_catalogue_binaire(catalogue) == server.CONFIG["catalogue_binaire"]
+
+    docs[3]["nom"] = "renommé"
+    docs[7]["acces"] = ["equipe:social", "dossier:/partage"]
+    del docs[5]
+    docs.append({"id": "nouveau", "nom": "ajouté.pdf", "contenu_textuel": ""})
+    server.sauvegarder_donnees(catalogue, docs)
+
+    enregistrements = [json.loads(ligne.split(b" ", 1)[1]) for ligne in lignes_journal(catalogue)]
+    assert [len(e["ecrire"]) for e in enregistrements] == [3]
+    assert enregistrements[0]["supprimer"] == ["d005"]
+    assert redemarrer(catalogue) == docs
+
+
+def test_compactage_conserve_le_catalogue(catalogue, monkeypatch):
+    monkeypatch.setitem(server.CONFIG, "stockage_compactage_operations", 2)
+    docs = documents(10)
+    server.sauvegarder_donnees(catalogue, docs)
+    for numero in range(5):
+        docs[numero]["nom"] = f"version {numero}"
+        server.sauvegarder_donnees(catalogue, docs)
+
+    assert os.path.exists(server.fichier_precedent(catalogue))
+    assert redemarrer(catalogue) == docs
+
+
+def test_journaliser_documents_sans_relire_le_catalogue(catalogue):
+    docs = documents(10)
+    server.sauvegarder_donnees(catalogue, docs)
+
+    modifie = dict(docs[2], nom="modifié")
+    ajoute = {"id": "lot1", "nom": "lot.txt", "chemin": "/partage/lot.txt", "contenu_textuel": "lot"}
+    server.journaliser_documents(catalogue, [modifie, ajoute], supprimer=["d004", "inconnu"])
+    attendu = [modifie if doc["id"] == "d002" else doc for doc in docs if doc["id"] != "d004"] + [ajoute]
+
+    colonnes = server.lire_colonnes_catalogue({"id": None, "nom": None})
+    assert colonnes["id"] == [doc["id"] for doc in attendu]
+    assert colonnes["nom"] == [doc["nom"] for doc in attendu]
+    assert server.lire_document("d002")["nom"] == "modifié"
+    assert server.lire_document("d004") is None
+
+    courant = server.charger_donnees(catalogue)
+    assert courant == attendu
+    courant[0]["nom"] = "ensuite"
+    server.sauvegarder_donnees(catalogue, courant)
+    assert len(json.loads(lignes_journal(catalogue)[-1].split(b" ", 1)[1])["ecrire"]) == 1
+    assert redemarrer(catalogue) == courant
+
+
+def test_vue_binaire_lit_seulement_la_suite_du_journal(catalogue):
+    if not server.CONFIG["catalogue_binaire"]:
+        pytest.skip("vue par colonnes réservée au catalogue binaire")
+    server.sauvegarder_donnees(catalogue, documents(5))
+    server.lire_colonnes_catalogue({"id": None})
+    vue = server.ETAT_CATALOGUE_BINAIRE["vue"]
+
+    for numero in range(3):
+        server.journaliser_documents(catalogue, [{"id": f"lot{numero}", "nom": f"lot {numero}"}])
+        ids = server.lire_colonnes_catalogue({"id": None})["id"]
+        assert ids[-(numero + 1):] == [f"lot{rang}" for rang in range(numero + 1)]
+        assert server.ETAT_CATALOGUE_BINAIRE["vue"] is vue
+    assert vue.fin == os.path.getsize(server.fichier_journal(catalogue))
+
+
+def test_derniere_ecriture_incomplete_ignoree(catalogue):
+    docs = documents(8)
+    server.sauvegarder_donnees(catalogue, docs)
+    docs[1]["nom"] = "première modification"
+    server.sauvegarder_donnees(catalogue, docs)
+    attendu = json.loads(json.dumps(docs))
+    docs[2]["nom"] = "écriture interrompue"
+    server.sauvegarder_donnees(catalogue, docs)
+
+    journal = server.fichier_journal(catalogue)
+    with open(journal, 'r+b') as f:
+        f.truncate(os.path.getsize(journal) - 25)
+
+    assert redemarrer(catalogue) == attendu
+
+
+def test_ligne_corrompue_au_milieu_du_journal(catalogue):
+    docs = documents(8)
+    server.sauvegarder_donnees(catalogue, docs)
+    attendu = json.loads(json.dumps(docs))
+    for numero in range(2):
+        docs[numero]["nom"] = f"modification {numero}"
+        server.sauvegarder_donnees(catalogue, docs)
+
+    lignes = lignes_journal(catalogue)
+    lignes[0] = lignes[0].replace(b"modification 0", b"modification X")
+    with open(server.fichier_journal(catalogue), 'wb') as f:
+        f.writelines(lignes)
+
+    enregistrements, _, complet, _ = server.lire_journal(server.fichier_journal(catalogue), 1)
+    assert enregistrements == [] and not complet
+    assert redemarrer(catalogue) == attendu
+
+
+def test_instantane_corrompu_repris_depuis_le_precedent(catalogue, monkeypatch):
+    monkeypatch.setitem(server.CONFIG, "stockage_compactage_operations", 2)
+    docs = documents(12)
+    server.sauvegarder_donnees(catalogue, docs)
+    for numero in range(3):
+        docs[numero]["nom"] = f"modification {numero}"
+        server.sauvegarder_donnees(catalogue, docs)
+    assert os.path.exists(server.fichier_precedent(server.fichier_journal(catalogue)))
+    assert os.path.exists(server.fichier_journal(catalogue))
+
+    server.fermer_catalogue_binaire(catalogue)
+    with open(catalogue, 'r+b') as f:
+        f.truncate(os.path.getsize(catalogue) // 2)
+
+    assert redemarrer(catalogue) == docs
+
+
+def test_aucune_version_lisible(catalogue, monkeypatch):
+    monkeypatch.setitem(server.CONFIG, "stockage_compactage_operations", 1)
+    docs = documents(4)
+    server.sauvegarder_donnees(catalogue, docs)
+    docs[0]["nom"] = "compacté"
+    server.sauvegarder_donnees(catalogue, docs)
+
+    server.fermer_catalogue_binaire(catalogue)
+    server.fermer_catalogue_binaire(server.fichier_precedent(catalogue))
+    for fichier in (catalogue, server.fichier_precedent(catalogue)):
+        with open(fichier, 'r+b') as f:
+            f.truncate(os.path.getsize(fichier) // 2)
+
+    with pytest.raises(server.ErreurStockage):
+        redemarrer(catalogue)
+
+
+def test_migration_laisse_index_json_intact(tmp_path, monkeypatch):
+    ancien = str(tmp_path / "index.json")
+    binaire = str(tmp_path / "index.catb")
+    docs = documents(6)
+    with open(ancien, 'w', encoding='utf-8') as f:
+        json.dump(docs, f, ensure_ascii=False, indent=2)
+    with open(ancien, 'rb') as f:
+        contenu = f.read()
+
+    monkeypatch.setitem(server.CONFIG, "catalogue_binaire", True)
+    monkeypatch.setattr(server, "FICHIER_INDEX_JSON", ancien)
+    monkeypatch.setattr(server, "FICHIER_INDEX_BINAIRE", binaire)
+    monkeypatch.setattr(server, "FICHIER_INDEX", binaire)
+    monkeypatch.setattr(server, "FICHIERS_JOURNALISES", {binaire})
+    try:
+        server.migrer_catalogue()
+        assert server.est_catalogue_binaire(binaire)
+        assert redemarrer(binaire) == docs
+        docs[0]["nom"] = "après migration"
+        server.sauvegarder_donnees(binaire, docs)
+        server.migrer_catalogue()
+        assert redemarrer(binaire) == docs
+    finally:
+        server.ETAT_JOURNAUX.pop(binaire, None)
+        server.fermer_catalogue_binaire(binaire)
+
+    with open(ancien, 'rb') as f:
+        assert f.read() == contenu
+    assert sorted(os.listdir(tmp_path)) == ["index.catb", "index.catb.journal", "index.json"]